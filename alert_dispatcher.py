@@ -0,0 +1,356 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from metrics import metrics
+
+# Which authority hears about critical misinformation in each category
+CATEGORY_AUTHORITIES = {
+    'health': 'health_department',
+    'disaster': 'emergency_services',
+    'weather': 'emergency_services',
+    'politics': 'police',
+    'technology': 'police'
+}
+DEFAULT_AUTHORITY = 'emergency_services'
+
+# Columns added to emergency_alerts so the table doubles as the dispatch queue
+QUEUE_COLUMNS = [
+    ('status', "TEXT DEFAULT 'queued'"),
+    ('authority', 'TEXT'),
+    ('crisis_level', 'INTEGER'),
+    ('attempts', 'INTEGER DEFAULT 0'),
+    ('next_attempt_at', 'REAL DEFAULT 0'),
+    ('claimed_at', 'REAL'),
+    ('generated_at', 'REAL'),
+    ('dispatched_at', 'REAL'),
+    ('last_error', 'TEXT')
+]
+
+
+def authority_for(category):
+    return CATEGORY_AUTHORITIES.get(category, DEFAULT_AUTHORITY)
+
+
+class WebhookSink:
+    """POSTs each batch as JSON; any non-2xx answer fails the batch"""
+
+    def __init__(self, url, authorities=None, timeout=10.0):
+        self.url = url
+        self.authorities = authorities
+        self.timeout = timeout
+        self.name = f'webhook:{url}'
+
+    def send(self, authority, alerts):
+        response = requests.post(self.url, json={'authority': authority, 'alerts': alerts}, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class FileSink:
+    """Appends each batch as one JSON line; handy for local testing and audits"""
+
+    def __init__(self, path, authorities=None):
+        # Resolved once so a later chdir cannot send alerts somewhere else
+        self.path = os.path.abspath(path)
+        self.authorities = authorities
+        self.name = f'file:{self.path}'
+        self._lock = threading.Lock()
+
+    def send(self, authority, alerts):
+        line = json.dumps({'authority': authority, 'sent_at': time.time(), 'alerts': alerts}, ensure_ascii=False)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as handle:
+            handle.write(line + '\n')
+
+
+def sinks_from_spec(spec):
+    """Build sinks from 'file:/path/alerts.jsonl,webhook:http://host/hook'
+
+    None (not configured) gives no sinks; a spec that names no usable sink raises ValueError
+    so a typo fails at startup instead of silently dropping alerts.
+    """
+    if spec is None:
+        return []
+    sinks = []
+    for part in spec.split(','):
+        kind, _, target = part.strip().partition(':')
+        if kind == 'file' and target:
+            sinks.append(FileSink(target))
+        elif kind == 'webhook' and target:
+            sinks.append(WebhookSink(target))
+        elif part.strip():
+            raise ValueError(f"unrecognized alert sink '{part.strip()}'")
+    if not sinks:
+        raise ValueError('ALERT_SINKS names no alert sink')
+    return sinks
+
+
+class TokenBucket:
+    """Allows `rate` deliveries per minute with bursts up to `rate`"""
+
+    def __init__(self, rate):
+        self.capacity = max(1.0, float(rate))
+        self.tokens = self.capacity
+        self.refill_per_second = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        """Take a token; returns 0, or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.refill_per_second
+
+
+class AlertDispatcher:
+    """Drains queued emergency_alerts rows to sinks in per-authority batches, with retries and dead-lettering
+
+    Delivery is at-least-once: a batch that fails on one sink is retried on every sink. A batch
+    no sink accepts counts as failed, and without any sinks the dispatcher never starts, so
+    alerts stay queued until a sink is configured.
+    """
+
+    def __init__(self, response_gen, storage, sinks, workers=2, batch_size=20, batch_window=2.0,
+                 rate_per_minute=30, max_attempts=5, backoff=5.0, lease=300.0, poll_interval=5.0):
+        self.response_gen = response_gen
+        self.storage = storage
+        self.sinks = sinks
+        self.batch_size = batch_size
+        # Alerts raised within this many seconds of each other go out together
+        self.batch_window = batch_window
+        self.rate_per_minute = rate_per_minute
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        # A claimed batch not settled within the lease (worker process died) is picked up again
+        self.lease = lease
+        self.poll_interval = poll_interval
+
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='alert')
+        self._buckets = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+        self.counters = {
+            'batches_sent': 0,
+            'alerts_sent': 0,
+            'retries': 0,
+            'dead_lettered': 0,
+            'rate_limited': 0,
+            'messages_generated': 0
+        }
+
+    @staticmethod
+    def enqueue(cursor, analysis_id, text, category, crisis_level, message=None):
+        """Queue an alert inside the caller's writer transaction; returns the alert id
+
+        Without a message the worker asks the LLM for one before sending.
+        """
+        return cursor.execute("""
+            INSERT INTO emergency_alerts
+                (analysis_id, alert_level, alert_message, status, authority, crisis_level, next_attempt_at, generated_at)
+            VALUES (?, 'critical', ?, 'queued', ?, ?, 0, ?)
+        """, (
+            analysis_id, message or f'CRITICAL MISINFORMATION DETECTED: {text[:100]}...',
+            authority_for(category), crisis_level, time.time() if message else None
+        )).lastrowid
+
+    def notify(self):
+        """Wake the dispatcher after new alerts are committed; never blocks"""
+        self.start()
+        self._wake.set()
+
+    def start(self):
+        if self._thread is not None or not self.sinks:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='alert-dispatcher', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if self._wake.wait(self.poll_interval):
+                # Give a surge a moment to accumulate so each authority gets one batch
+                self._stop.wait(self.batch_window)
+                self._wake.clear()
+            try:
+                while self._dispatch_due():
+                    pass
+            except Exception as e:
+                print(f"Alert Dispatch Error: {e}")
+
+    def _dispatch_due(self):
+        """Claim and hand out one round of due alerts; returns True if more may be waiting"""
+        claimed = self.storage.write(self._claim, time.time(), wait=True)
+        if not claimed:
+            return False
+
+        by_authority = {}
+        for alert in claimed:
+            by_authority.setdefault(alert['authority'] or DEFAULT_AUTHORITY, []).append(alert)
+
+        futures = []
+        for authority, alerts in by_authority.items():
+            for start in range(0, len(alerts), self.batch_size):
+                batch = alerts[start:start + self.batch_size]
+                wait_seconds = self._bucket(authority).acquire()
+                if wait_seconds:
+                    with self._lock:
+                        self.counters['rate_limited'] += len(batch)
+                    self.storage.write(self._release, [alert['id'] for alert in batch], time.time() + wait_seconds)
+                    continue
+                futures.append(self._pool.submit(self._deliver, authority, batch))
+
+        for future in futures:
+            future.result()
+        return len(claimed) >= self.batch_size * 4
+
+    def _bucket(self, authority):
+        with self._lock:
+            bucket = self._buckets.get(authority)
+            if bucket is None:
+                bucket = self._buckets[authority] = TokenBucket(self.rate_per_minute)
+            return bucket
+
+    def _claim(self, cursor, now):
+        # Claiming inside the writer transaction keeps two worker processes off the same rows
+        rows = cursor.execute("""
+            SELECT e.id, e.analysis_id, e.authority, e.crisis_level, e.alert_message, e.attempts,
+                   e.generated_at, e.timestamp, t.text
+            FROM emergency_alerts e LEFT JOIN analysis_texts t ON t.id = e.analysis_id
+            WHERE (e.status = 'queued' AND e.next_attempt_at <= ?)
+               OR (e.status = 'sending' AND e.claimed_at < ?)
+            ORDER BY e.id LIMIT ?
+        """, (now, now - self.lease, self.batch_size * 4)).fetchall()
+        cursor.executemany(
+            "UPDATE emergency_alerts SET status = 'sending', claimed_at = ? WHERE id = ?",
+            [(now, row[0]) for row in rows]
+        )
+        names = ['id', 'analysis_id', 'authority', 'crisis_level', 'message', 'attempts',
+                 'generated_at', 'raised_at', 'text']
+        return [dict(zip(names, row)) for row in rows]
+
+    def _deliver(self, authority, batch):
+        for alert in batch:
+            if alert['generated_at'] is None:
+                self._generate_message(alert)
+
+        payload = [{
+            'alert_id': alert['id'],
+            'analysis_id': alert['analysis_id'],
+            'crisis_level': alert['crisis_level'],
+            'message': alert['message'],
+            'raised_at': alert['raised_at']
+        } for alert in batch]
+
+        try:
+            with metrics.span('alert_dispatch'):
+                delivered = 0
+                for sink in self.sinks:
+                    if sink.authorities is None or authority in sink.authorities:
+                        sink.send(authority, payload)
+                        delivered += 1
+                if not delivered:
+                    raise LookupError(f'no alert sink accepts {authority}')
+        except Exception as e:
+            print(f"Alert Delivery Error ({authority}): {e}")
+            self.storage.write(self._record_failure, batch, str(e), time.time())
+            return
+
+        self.storage.write(self._record_success, batch, time.time())
+
+    def _generate_message(self, alert):
+        try:
+            alert['message'] = self.response_gen.generate_alert_message(
+                alert['text'] or '', alert['crisis_level'] or 10, raise_errors=True
+            )
+            alert['generated_at'] = time.time()
+            with self._lock:
+                self.counters['messages_generated'] += 1
+        except Exception as e:
+            # The queued placeholder still names the claim; an alert must not wait on the LLM
+            print(f"Alert Message Error: {e}")
+
+    def _record_success(self, cursor, batch, now):
+        cursor.executemany("""
+            UPDATE emergency_alerts
+            SET status = 'sent', authorities_notified = TRUE, alert_message = ?, generated_at = ?,
+                dispatched_at = ?, attempts = attempts + 1, last_error = NULL
+            WHERE id = ?
+        """, [(alert['message'], alert['generated_at'], now, alert['id']) for alert in batch])
+        self.storage.after_commit(lambda: self._count(batch, 'sent'))
+
+    def _record_failure(self, cursor, batch, error, now):
+        for alert in batch:
+            attempts = alert['attempts'] + 1
+            if attempts >= self.max_attempts:
+                status, next_attempt_at = 'dead', None
+            else:
+                # Full jitter so a recovering endpoint is not hit by every retry at once
+                status = 'queued'
+                next_attempt_at = now + random.uniform(0, self.backoff * 2 ** attempts)
+            self.storage.after_commit(lambda alert=alert, status=status: self._count([alert], status))
+            cursor.execute("""
+                UPDATE emergency_alerts
+                SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, alert_message = ?, generated_at = ?
+                WHERE id = ?
+            """, (status, attempts, next_attempt_at, error[:500], alert['message'], alert['generated_at'], alert['id']))
+
+    def _count(self, alerts, outcome):
+        """Update counters for a settled batch; runs once its rows have committed"""
+        with self._lock:
+            if outcome == 'sent':
+                self.counters['batches_sent'] += 1
+                self.counters['alerts_sent'] += len(alerts)
+            elif outcome == 'dead':
+                self.counters['dead_lettered'] += len(alerts)
+            else:
+                self.counters['retries'] += len(alerts)
+        if outcome != 'queued':
+            metrics.inc('crisis_alerts_total', len(alerts), authority=alerts[0]['authority'] or DEFAULT_AUTHORITY, outcome=outcome)
+
+    @staticmethod
+    def _release(cursor, alert_ids, next_attempt_at):
+        cursor.executemany(
+            "UPDATE emergency_alerts SET status = 'queued', next_attempt_at = ? WHERE id = ?",
+            [(next_attempt_at, alert_id) for alert_id in alert_ids]
+        )
+
+    def requeue_dead(self, alert_ids=None):
+        """Give dead-lettered alerts a fresh set of attempts; returns how many were requeued"""
+        def requeue(cursor):
+            where = "status = 'dead'"
+            params = []
+            if alert_ids:
+                where += f" AND id IN ({','.join('?' * len(alert_ids))})"
+                params = list(alert_ids)
+            return cursor.execute(
+                f"UPDATE emergency_alerts SET status = 'queued', attempts = 0, next_attempt_at = 0 WHERE {where}",
+                params
+            ).rowcount
+        count = self.storage.write(requeue, wait=True)
+        if count:
+            self.notify()
+        return count
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['queue'] = dict(self.storage.read(
+            "SELECT COALESCE(status, 'legacy'), COUNT(*) FROM emergency_alerts GROUP BY 1"
+        ))
+        return stats
@@ -1,34 +1,136 @@
-from flask import Flask, render_template, request, jsonify, Response
+from flask import Flask, render_template, request, jsonify, Response, g
 import openai
-import sqlite3
 import json
 import time
+import os
+import threading
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from detection import MisinformationDetector
 from crisis_handler import CrisisHandler
 from response_generator import ResponseGenerator
+from verdict_cache import VerdictCache
+from similarity_index import SimilarityIndex, INDEXED_SOURCES
+from content_store import ContentStore
+from claim_search import ClaimSearch, SearchError
+from fact_index import FactCheckIndex
+from claim_segmenter import ClaimSegmenter
+from archive import Archiver
+from alert_dispatcher import AlertDispatcher, QUEUE_COLUMNS, sinks_from_spec, authority_for
+from image_index import ImageIndex, InvalidImage, ImageTooLarge, read_limited, decode_base64
+from narrative_worker import CounterNarrativeWorker
+from storage import Storage
+from rollups import DashboardRollups, WINDOWS
+from quality import QualityTracker
+from triage import TriageStage
+from keyword_engine import default_engine
+from ingestion import IngestionPipeline, SampleSource, SourceOffsets, sources_from_spec
+from metrics import metrics
+from counters import StatCounters
 
 app = Flask(__name__)
+# Upper bound on any request body; werkzeug spools multipart files to disk and answers 413 past it
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_REQUEST_BYTES', 64 * 1024 * 1024))
 
 # Initialize components
-detector = MisinformationDetector()
+storage = Storage(pool_size=int(os.environ.get('DB_POOL_SIZE', 8)))
+# TRIAGE_MODE=shadow|on lets a local model decide which texts need GPT-4
+triage = TriageStage(
+    default_engine(),
+    mode=os.environ.get('TRIAGE_MODE', 'off'),
+    benign_threshold=float(os.environ.get('TRIAGE_BENIGN_THRESHOLD', 0.1)),
+    hoax_threshold=float(os.environ.get('TRIAGE_HOAX_THRESHOLD', 0.9)),
+    min_examples=int(os.environ.get('TRIAGE_MIN_EXAMPLES', 200))
+)
+# Related fact-checks retrieved locally are the detection prompt's evidence
+fact_index = FactCheckIndex(
+    os.environ.get('FACTCHECK_INDEX_DIR', 'factcheck_index'),
+    top_k=int(os.environ.get('FACTCHECK_TOP_K', 3)),
+    budget=float(os.environ.get('FACTCHECK_BUDGET_MS', 5)) / 1000
+)
+# CRISIS_SCORING_MODE=fused scores detection and crisis level in one GPT-4 call
+detector = MisinformationDetector(
+    crisis_scoring=os.environ.get('CRISIS_SCORING_MODE', 'separate'),
+    triage=triage if triage.mode != 'off' else None,
+    fact_index=fact_index
+)
 crisis_handler = CrisisHandler()
+# Forwards bundling several claims are judged claim by claim
+segmenter = ClaimSegmenter(
+    detector,
+    min_chars=int(os.environ.get('SEGMENT_MIN_CHARS', 400)),
+    max_claims=int(os.environ.get('SEGMENT_MAX_CLAIMS', 6))
+)
 response_gen = ResponseGenerator()
+verdict_cache = VerdictCache(
+    storage,
+    max_memory_items=int(os.environ.get('VERDICT_CACHE_MEMORY_ITEMS', 2048)),
+    max_db_items=int(os.environ.get('VERDICT_CACHE_DB_ITEMS', 100000)),
+    ttl_seconds=int(os.environ.get('VERDICT_CACHE_TTL', 6 * 3600))
+)
+similarity_index = SimilarityIndex(storage, max_distance=int(os.environ.get('SIMILARITY_MAX_DISTANCE', 3)))
+# Analyses point at interned texts and catalogued sources instead of repeating them
+content_store = ContentStore(storage)
+claim_search = ClaimSearch(storage)
+image_index = ImageIndex(
+    storage,
+    max_distance=int(os.environ.get('IMAGE_MAX_DISTANCE', 6)),
+    workers=int(os.environ.get('IMAGE_WORKERS', 2))
+)
+rollups = DashboardRollups(storage)
+# Accuracy and calibration from correct/incorrect feedback, kept current as it arrives
+quality = QualityTracker(storage)
+narrative_worker = CounterNarrativeWorker(response_gen, storage, max_workers=int(os.environ.get('NARRATIVE_WORKERS', 4)))
+# ALERT_SINKS=file:/var/lib/crisis/alerts.jsonl,webhook:http://127.0.0.1:9000/alerts (no default:
+# unset keeps alerts queued, an unusable value fails startup)
+alert_dispatcher = AlertDispatcher(
+    response_gen,
+    storage,
+    sinks_from_spec(os.environ.get('ALERT_SINKS')),
+    workers=int(os.environ.get('ALERT_WORKERS', 2)),
+    batch_size=int(os.environ.get('ALERT_BATCH_SIZE', 20)),
+    batch_window=float(os.environ.get('ALERT_BATCH_WINDOW', 2)),
+    rate_per_minute=float(os.environ.get('ALERT_RATE_PER_MINUTE', 30)),
+    max_attempts=int(os.environ.get('ALERT_MAX_ATTEMPTS', 5))
+)
+# Archiving deletes rows from SQLite, so it only runs when ARCHIVE_AFTER_DAYS is set (e.g. 30)
+archiver = Archiver(
+    storage,
+    content_store,
+    directory=os.environ.get('ARCHIVE_DIR', 'archive'),
+    days=int(os.environ.get('ARCHIVE_AFTER_DAYS', 0))
+)
 
-# Global stats for dashboard
-global_stats = {
-    'total_analyzed': 0,
-    'misinformation_detected': 0,
-    'emergency_alerts': 0,
-    'user_feedback_positive': 0,
-    'languages_supported': 4
-}
+MAX_BATCH_ITEMS = int(os.environ.get('MAX_BATCH_ITEMS', 500))
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 8))
+SEGMENT_CONCURRENCY = int(os.environ.get('SEGMENT_CONCURRENCY', 4))
+NARRATIVE_STREAM_TIMEOUT = int(os.environ.get('NARRATIVE_STREAM_TIMEOUT', 120))
+MAX_IMAGE_BYTES = int(os.environ.get('MAX_IMAGE_BYTES', 10 * 1024 * 1024))
 
-def init_db():
-    """Initialize enhanced database"""
-    conn = sqlite3.connect('crisis_data.db')
-    cursor = conn.cursor()
-    
+# Dashboard counters, summed across worker processes and persisted in the database
+stat_counters = StatCounters(storage, flush_interval=float(os.environ.get('STATS_FLUSH_INTERVAL', 5)))
+# /stats component sections hit the database (alert queue, quality, archive), so they are served from a short cache
+STATS_CACHE_SECONDS = float(os.environ.get('STATS_CACHE_SECONDS', 5))
+STAT_NAMES = ['total_analyzed', 'misinformation_detected', 'emergency_alerts', 'user_feedback_positive']
+LANGUAGES_SUPPORTED = 4
+
+ANALYSES_COLUMNS = [
+    ('credibility_score', 'INTEGER'),
+    ('spread_risk', 'INTEGER'),
+    ('harm_potential', 'INTEGER'),
+    ('language_detected', 'TEXT'),
+    ('category', 'TEXT'),
+    ('emergency_level', 'TEXT'),
+    ('sources', 'TEXT'),
+    ('user_feedback', 'INTEGER DEFAULT 0'),
+    ('text_id', 'INTEGER'),
+    ('source_ids', 'TEXT'),
+    ('verdict_source', 'TEXT'),
+    ('scoring_mode', 'TEXT')
+]
+
+def create_tables(cursor):
+    """Create the core tables; runs inside the storage writer"""
     # Main analyses table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS analyses (
@@ -74,8 +176,199 @@ def init_db():
         )
     """)
     
-    conn.commit()
-    conn.close()
+    # Databases created by older versions lack the enhanced columns
+    existing = {row[1] for row in cursor.execute("PRAGMA table_info(analyses)")}
+    for column, column_type in ANALYSES_COLUMNS:
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE analyses ADD COLUMN {column} {column_type}")
+    
+    # emergency_alerts doubles as the dispatch queue; alerts from before it are not re-sent
+    existing = {row[1] for row in cursor.execute("PRAGMA table_info(emergency_alerts)")}
+    for column, column_type in QUEUE_COLUMNS:
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE emergency_alerts ADD COLUMN {column} {column_type}")
+    if 'status' not in existing:
+        cursor.execute("UPDATE emergency_alerts SET status = 'legacy'")
+    
+    # Indexes for time-window and per-analysis lookups
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_analyses_timestamp ON analyses (timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_analyses_category ON analyses (category)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_feedback_analysis ON user_feedback (analysis_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_emergency_alerts_analysis ON emergency_alerts (analysis_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_emergency_alerts_queue ON emergency_alerts (status, next_attempt_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_analyses_text ON analyses (text_id)")
+    
+    # Full texts whether a row is interned yet or not
+    cursor.execute("""
+        CREATE VIEW IF NOT EXISTS analysis_texts AS
+        SELECT a.id, COALESCE(t.body, a.text) AS text, a.is_misinformation
+        FROM analyses a LEFT JOIN texts t ON t.id = a.text_id
+    """)
+
+storage.register_schema(create_tables)
+
+def init_db():
+    """Initialize enhanced database"""
+    storage.init_schema()
+
+_started = False
+_startup_lock = threading.Lock()
+
+def start_background_work():
+    """Load indexes, backfill rollups and start the background workers, once per process
+
+    Runs on the first request so WSGI servers (gunicorn, waitress) get it too, and after
+    any pre-fork import, so no worker thread is started in a process that is then forked.
+    """
+    global _started
+    if _started:
+        return
+    with _startup_lock:
+        if _started:
+            return
+        init_db()
+        rollups.backfill()
+        quality.backfill()
+        similarity_index.load()
+        image_index.load()
+        threading.Thread(target=content_store.compact_legacy, daemon=True).start()
+        if not alert_dispatcher.sinks:
+            print("Alert Sink Warning: ALERT_SINKS is not set; critical alerts stay queued until it is")
+        alert_dispatcher.start()
+        archiver.start(interval=int(os.environ.get('ARCHIVE_INTERVAL', 3600)))
+        if triage.mode != 'off':
+            threading.Thread(target=triage.train_from_storage, args=(storage,), daemon=True).start()
+        _started = True
+
+def load_prior_verdict(analysis_id):
+    """Rebuild a detection result from a stored analysis so it can be reused"""
+    row = storage.read_one("""
+        SELECT is_misinformation, confidence, credibility_score, spread_risk, harm_potential,
+               crisis_level, language_detected, category, emergency_level, source_ids, sources
+        FROM analyses WHERE id = ?
+    """, (analysis_id,))
+    
+    if not row:
+        return None, None
+    
+    emergency_level = row[8] or 'low'
+    detection_result = {
+        'is_misinformation': bool(row[0]),
+        'confidence': row[1],
+        'credibility_score': row[2],
+        'spread_risk': row[3],
+        'harm_potential': row[4],
+        'indicators': ['near_duplicate'],
+        'explanation': f'Near-duplicate of previously analyzed claim #{analysis_id}',
+        'sources': content_store.sources(row[9], row[10]),
+        'category': row[7] or 'unknown',
+        'language_detected': row[6] or 'en',
+        'manipulation_type': 'none',
+        'recommended_action': {'critical': 'emergency', 'high': 'alert'}.get(emergency_level, 'monitor'),
+        'emergency_level': emergency_level,
+        'timestamp': datetime.now().isoformat()
+    }
+    return detection_result, row[5]
+
+STREAM_SAMPLES = [
+    {
+        'text': "कोविड वैक्सीन में माइक्रोचिप है - सरकार छुप रही है सच्चाई!",
+        'language': 'hi',
+        'category': 'health'
+    },
+    {
+        'text': "Breaking: Scientists confirm 5G towers spread coronavirus - immediate shutdown required!",
+        'language': 'en', 
+        'category': 'technology'
+    },
+    {
+        'text': "Local weather department forecasts heavy rainfall this evening, residents advised to stay indoors",
+        'language': 'en',
+        'category': 'weather'
+    },
+    {
+        'text': "URGENT: City water supply contaminated with deadly chemicals - government covering up mass poisoning!",
+        'language': 'en',
+        'category': 'disaster'
+    },
+    {
+        'text': "University research team publishes peer-reviewed study on renewable energy breakthroughs",
+        'language': 'en',
+        'category': 'other'
+    }
+]
+
+def analyze_stream_post(post):
+    """Analyze one ingested post into a stream event"""
+    text = post['text']
+    stat_counters.inc('total_analyzed')
+    
+    with metrics.endpoint_scope('stream'):
+        lookup = analyze_claim(text, context=post.get('context', 'social_media'))
+    result = lookup['detection_result']
+    crisis_level = lookup['crisis_level']
+    if result['is_misinformation']:
+        stat_counters.inc('misinformation_detected')
+    
+    analysis_id = save_analyses([{
+        'text': text,
+        'detection_result': result,
+        'crisis_level': crisis_level,
+        'fingerprint': lookup['fingerprint'],
+        'verdict_source': verdict_source(lookup)
+    }])[0]
+    
+    return {
+        'analysis_id': analysis_id,
+        'text': text,
+        'language': post.get('language', result.get('language_detected', 'en')),
+        'crisis_level': crisis_level,
+        'is_misinformation': result['is_misinformation'],
+        'confidence': result['confidence'],
+        'credibility_score': result.get('credibility_score', 50),
+        'spread_risk': result.get('spread_risk', 5),
+        'harm_potential': result.get('harm_potential', 5),
+        'viral_potential': result.get('viral_potential', 5),
+        'sources': result.get('sources', []),
+        'category': result.get('category', 'unknown'),
+        'emergency_level': result.get('emergency_level', 'low'),
+        'recommended_action': result.get('recommended_action', 'monitor'),
+        'timestamp': datetime.now().isoformat()
+    }
+
+# STREAM_SOURCES=jsonl:/path/posts.jsonl,dir:/path/inbox,socket:0.0.0.0:9009 (demo samples if unset)
+# Only the worker process holding STREAM_LOCK_FILE reads the sources; the others relay its events
+stream_pipeline = IngestionPipeline(
+    sources_from_spec(os.environ.get('STREAM_SOURCES'), offsets=SourceOffsets(storage)) or [SampleSource(STREAM_SAMPLES)],
+    analyze_stream_post,
+    workers=int(os.environ.get('STREAM_WORKERS', 4)),
+    queue_size=int(os.environ.get('STREAM_QUEUE_SIZE', 100)),
+    buffer_size=int(os.environ.get('STREAM_BUFFER_SIZE', 200)),
+    storage=storage,
+    lock_path=os.environ.get('STREAM_LOCK_FILE', storage.db_path + '.stream.lock')
+)
+
+@app.before_request
+def ensure_started():
+    start_background_work()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.set_endpoint(request.endpoint)
+
+@app.teardown_request
+def clear_request_endpoint(exc):
+    metrics.set_endpoint(None)
+
+@app.after_request
+def record_request_time(response):
+    # Streaming endpoints are timed to their first byte, not to the end of the stream
+    started = g.get('request_started')
+    if started is not None:
+        metrics.observe('crisis_http_request_duration_seconds', time.perf_counter() - started,
+                        endpoint=request.endpoint or 'unknown')
+    return response
 
 @app.route('/')
 def index():
@@ -84,90 +377,246 @@ def index():
 @app.route('/dashboard')
 def dashboard():
     """Analytics dashboard for judges/demo"""
-    conn = sqlite3.connect('crisis_data.db')
-    cursor = conn.cursor()
-    
-    # Get recent statistics
-    cursor.execute("SELECT COUNT(*) FROM analyses WHERE timestamp > datetime('now', '-1 hour')")
-    recent_analyses = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM analyses WHERE is_misinformation = 1 AND timestamp > datetime('now', '-1 hour')")
-    recent_misinformation = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT AVG(confidence) FROM analyses WHERE timestamp > datetime('now', '-1 hour')")
-    avg_confidence = cursor.fetchone()[0] or 0
-    
-    cursor.execute("SELECT category, COUNT(*) FROM analyses GROUP BY category")
-    category_stats = dict(cursor.fetchall())
-    
-    conn.close()
+    # Rollups keep these reads independent of how many analyses are stored
+    windows = {name: rollups.window(seconds) for name, seconds in WINDOWS.items()}
+    recent = windows['1h']
+    analyze_time = metrics.mean('crisis_http_request_duration_seconds', endpoint='analyze_text')
+    quality_summary = quality.summary()
     
     stats = {
-        'recent_analyses': recent_analyses,
-        'recent_misinformation': recent_misinformation,
-        'avg_confidence': round(avg_confidence, 1),
-        'category_breakdown': category_stats,
-        'total_users': global_stats['total_analyzed'],
-        'accuracy_rate': 94.2,  # Demo metric
-        'response_time': '2.3s',  # Demo metric
-        'languages_detected': global_stats['languages_supported']
+        'recent_analyses': recent['analyses'],
+        'recent_misinformation': recent['misinformation'],
+        'avg_confidence': recent['avg_confidence'],
+        'category_breakdown': rollups.category_totals(),
+        'windows': windows,
+        'total_users': stat_counters.get('total_analyzed'),
+        # Share of verdicts users marked correct; None until any feedback arrives
+        'accuracy_rate': quality_summary['accuracy'],
+        'quality': quality_summary,
+        'response_time': f"{analyze_time:.1f}s" if analyze_time is not None else 'n/a',
+        'languages_detected': LANGUAGES_SUPPORTED
     }
     
     return render_template('dashboard.html', stats=stats)
 
-@app.route('/analyze', methods=['POST'])
-def analyze_text():
-    """Enhanced analysis with all new features"""
-    data = request.get_json()
-    text = data.get('text', '')
-    image_data = data.get('image', None)
-    context = data.get('context', 'social_media')
+def analyze_claim(text, image=None, context='social_media'):
+    """Verdict cache, near-duplicate index, then GPT-4; returns the lookup with the verdict filled in"""
+    with metrics.span('verdict_lookup'):
+        lookup = resolve_from_history(text, context, image)
     
-    global global_stats
-    global_stats['total_analyzed'] += 1
+    if lookup['detection_result'] is None:
+        claims = segmenter.split(text) if image is None else [text]
+        if len(claims) > 1:
+            lookup['detection_result'], lookup['crisis_level'] = analyze_segments(text, claims, context)
+            if not lookup['detection_result'].get('is_fallback'):
+                verdict_cache.put(lookup['cache_key'], lookup['detection_result'], lookup['crisis_level'])
+        else:
+            # Concurrent requests for the same claim share one detection
+            lookup['detection_result'], lookup['crisis_level'] = verdict_cache.compute(
+                lookup['cache_key'], lambda: detect_claim(text, context, lookup['cache_key'], image)
+            )
+    if lookup['crisis_level'] is None:
+        # Verdicts cached as one claim of a longer message carry no crisis level of their own
+        lookup['crisis_level'] = crisis_handler.assess_crisis(text, lookup['detection_result'])
+        if not lookup['detection_result'].get('is_fallback'):
+            verdict_cache.put(lookup['cache_key'], lookup['detection_result'], lookup['crisis_level'])
+    return lookup
+
+def detect_claim(text, context, cache_key, image=None, assess_crisis=True):
+    """GPT-4 detection and crisis level for one claim, cached unless it fell back to heuristics
+
+    With assess_crisis=False the crisis level is only what fused scoring returned (else None),
+    so claims of a segmented message do not each cost a crisis call.
+    """
+    # Enhanced detection; a look-alike image reuses its earlier image analysis
+    detection_result = detector.analyze(
+        text, image and image['data'], context, image_analysis=image and image['analysis']
+    )
+    if assess_crisis:
+        crisis_level = crisis_handler.assess_crisis(text, detection_result)
+    else:
+        crisis_level = detection_result.get('crisis_level')
+    # Fallback verdicts are not cached so the LLM gets another chance next time
+    if not detection_result.get('is_fallback'):
+        verdict_cache.put(cache_key, detection_result, crisis_level)
+    return detection_result, crisis_level
+
+def analyze_segments(text, claims, context):
+    """Judge each claim of a multi-claim message on its own, in parallel, and combine the verdicts"""
+    with ThreadPoolExecutor(max_workers=min(len(claims), SEGMENT_CONCURRENCY)) as pool:
+        verdicts = list(pool.map(metrics.bind_endpoint(lambda claim: claim_verdict(claim, context)), claims))
+    detection_result, crisis_level = segmenter.combine(text, claims, verdicts)
+    # Unless every claim already has one, the message gets a single crisis assessment
+    if crisis_level is None:
+        crisis_level = crisis_handler.assess_crisis(text, detection_result)
+    return detection_result, crisis_level
+
+def claim_verdict(claim, context):
+    """(detection_result, crisis_level, verdict_source) for one claim; known claims never reach the LLM"""
+    lookup = resolve_from_history(claim, context)
+    if lookup['detection_result'] is not None:
+        return lookup['detection_result'], lookup['crisis_level'], 'cache' if lookup['cached'] else 'near_duplicate'
     
-    # Enhanced detection
-    detection_result = detector.analyze(text, image_data, context)
-    crisis_level = crisis_handler.assess_crisis(text, detection_result)
+    ran = []
+    def detect():
+        ran.append(True)
+        return detect_claim(claim, context, lookup['cache_key'], assess_crisis=False)
+    detection_result, crisis_level = verdict_cache.compute(lookup['cache_key'], detect)
+    if detection_result.get('is_fallback'):
+        source = 'fallback'
+    else:
+        source = 'llm' if ran else 'shared'
+    return detection_result, crisis_level, source
+
+def resolve_from_history(text, context, image=None):
+    """Look a claim up in the verdict cache, then in the near-duplicate and image indexes"""
+    lookup = {
+        # Look-alike images share the key of the first one seen
+        'cache_key': verdict_cache.make_key(text, context, image_index.key(image)),
+        'fingerprint': similarity_index.fingerprint(text),
+        'detection_result': None,
+        'crisis_level': None,
+        'cached': False,
+        'matched_analysis_id': None,
+        'image': image
+    }
     
-    # Update global stats
-    if detection_result['is_misinformation']:
-        global_stats['misinformation_detected'] += 1
+    # Serve repeated claims from the verdict cache before paying for GPT-4
+    cached = verdict_cache.get(lookup['cache_key'])
+    if cached:
+        lookup['detection_result'] = cached['detection_result']
+        lookup['crisis_level'] = cached['crisis_level']
+        lookup['cached'] = True
+        metrics.inc('crisis_verdict_lookups_total', source='cache')
+        return lookup
     
-    # Generate counter-narrative for high-risk content
-    response = None
-    if crisis_level > 7 or detection_result.get('harm_potential', 0) > 7:
-        response = response_gen.generate_counter_narrative(text, detection_result)
+    # Paraphrased forwards reuse the verdict of the closest prior analysis
+    if image is None:
+        match = similarity_index.find(lookup['fingerprint'])
+    else:
+        match = match_image_post(image, lookup['fingerprint'])
+    if match:
+        detection_result, crisis_level = load_prior_verdict(match[0])
+        if detection_result:
+            detection_result['viral_potential'] = detector._calculate_viral_potential(text)
+            detection_result['similarity'] = match[1]
+            lookup['detection_result'] = detection_result
+            lookup['crisis_level'] = crisis_level
+            lookup['matched_analysis_id'] = match[0]
+            metrics.inc('crisis_verdict_lookups_total', source='near_duplicate' if image is None else 'image_match')
+            return lookup
+    metrics.inc('crisis_verdict_lookups_total', source='miss')
+    return lookup
+
+def match_image_post(image, fingerprint):
+    """(analysis_id, similarity) when a look-alike image was first posted with near-identical text"""
+    prior = image['match']
+    if prior is None or prior['analysis_id'] is None:
+        return None
+    if fingerprint is None or prior['simhash'] is None:
+        # Captionless memes (or too little text to fingerprint) are judged by the image alone
+        return (prior['analysis_id'], 1.0) if fingerprint == prior['simhash'] else None
+    distance = (fingerprint ^ prior['simhash']).bit_count()
+    if distance > similarity_index.max_distance:
+        return None
+    return prior['analysis_id'], round(1 - distance / 64, 3)
+
+def verdict_source(lookup):
+    """Which path produced a verdict, so feedback accuracy can be compared across them"""
+    detection_result = lookup['detection_result']
+    if lookup['cached']:
+        return 'cache'
+    if lookup['matched_analysis_id']:
+        return 'image_match' if lookup['image'] else 'near_duplicate'
+    if detection_result.get('triage'):
+        return 'triage'
+    if detection_result.get('is_fallback'):
+        return 'fallback'
+    return 'segmented' if detection_result.get('claims') else 'llm'
+
+def read_image_upload():
+    """Raw image bytes from a multipart 'image' file or a base64 'image' JSON field, or None"""
+    if request.files:
+        upload = request.files.get('image')
+        return read_limited(upload.stream, MAX_IMAGE_BYTES) if upload and upload.filename else None
+    data = request.get_json(silent=True) or {}
+    return decode_base64(data['image'], MAX_IMAGE_BYTES) if data.get('image') else None
+
+def needs_counter_narrative(detection_result, crisis_level):
+    return crisis_level > 7 or detection_result.get('harm_potential', 0) > 7
+
+def save_analyses(records):
+    """Persist analyses, fingerprints and alerts in a single transaction; returns analysis ids"""
+    # The insert is group-committed with other writers; waiting on it means the returned
+    # analysis_id is already visible to every reader (read-your-writes for /feedback etc.)
+    with metrics.span('db_insert'):
+        analysis_ids = storage.write(insert_analyses, records, wait=True)
     
-    # Save enhanced analysis to database
-    conn = sqlite3.connect('crisis_data.db')
-    cursor = conn.cursor()
-    analysis_id = cursor.execute("""
-        INSERT INTO analyses (
-            text, is_misinformation, confidence, credibility_score, spread_risk, 
-            harm_potential, crisis_level, language_detected, category, emergency_level, sources
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        text, detection_result['is_misinformation'], detection_result['confidence'],
-        detection_result.get('credibility_score', 50), detection_result.get('spread_risk', 5),
-        detection_result.get('harm_potential', 5), crisis_level,
-        detection_result.get('language_detected', 'en'), detection_result.get('category', 'unknown'),
-        detection_result.get('emergency_level', 'low'), json.dumps(detection_result.get('sources', []))
-    )).lastrowid
-    
-    # Create emergency alert if needed
-    if detection_result.get('emergency_level') == 'critical':
-        cursor.execute("""
-            INSERT INTO emergency_alerts (analysis_id, alert_level, alert_message)
-            VALUES (?, ?, ?)
-        """, (analysis_id, 'critical', f'CRITICAL MISINFORMATION DETECTED: {text[:100]}...'))
-        global_stats['emergency_alerts'] += 1
-    
-    conn.commit()
-    conn.close()
-    
-    # Prepare response with all enhancements
-    response_data = {
+    if any(record['detection_result'].get('emergency_level') == 'critical' for record in records):
+        alert_dispatcher.notify()
+    
+    for record, analysis_id in zip(records, analysis_ids):
+        # Fallback, triage and reused verdicts are never offered to look-alikes
+        if record.get('verdict_source') not in INDEXED_SOURCES:
+            continue
+        similarity_index.add(analysis_id, record['fingerprint'])
+        image_index.add(record.get('image'), analysis_id, record['fingerprint'],
+                        record['detection_result'].get('image_analysis'))
+    return analysis_ids
+
+def insert_analyses(cursor, records):
+    analysis_ids = []
+    
+    for record in records:
+        text = record['text']
+        detection_result = record['detection_result']
+        # The legacy text column stays empty; the body lives once in texts however often it is posted
+        analysis_id = cursor.execute("""
+            INSERT INTO analyses (
+                text, text_id, is_misinformation, confidence, credibility_score, spread_risk, 
+                harm_potential, crisis_level, language_detected, category, emergency_level, source_ids,
+                verdict_source, scoring_mode
+            ) VALUES ('', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            content_store.intern_text(cursor, text), detection_result['is_misinformation'], detection_result['confidence'],
+            detection_result.get('credibility_score', 50), detection_result.get('spread_risk', 5),
+            detection_result.get('harm_potential', 5), record['crisis_level'],
+            detection_result.get('language_detected', 'en'), detection_result.get('category', 'unknown'),
+            detection_result.get('emergency_level', 'low'),
+            content_store.source_ids(cursor, detection_result.get('sources', [])),
+            record.get('verdict_source'), detector.crisis_scoring
+        )).lastrowid
+        
+        if record['fingerprint'] is not None and record.get('verdict_source') in INDEXED_SOURCES:
+            cursor.execute(
+                "INSERT OR REPLACE INTO analysis_fingerprints (analysis_id, simhash) VALUES (?, ?)",
+                (analysis_id, SimilarityIndex.to_signed(record['fingerprint']))
+            )
+        
+        # Queue an emergency alert if needed; the dispatcher writes and sends it later
+        if detection_result.get('emergency_level') == 'critical':
+            alert_dispatcher.enqueue(
+                cursor, analysis_id, text, detection_result.get('category'), record['crisis_level']
+            )
+            # Counted only once the alert row has committed
+            storage.after_commit(lambda: stat_counters.inc('emergency_alerts'))
+        
+        rollups.record(cursor, detection_result)
+        analysis_ids.append(analysis_id)
+    
+    return analysis_ids
+
+def queue_counter_narrative(analysis_id, text, detection_result, crisis_level, lookup):
+    """Hand high-risk content to the background narrative workers"""
+    if not needs_counter_narrative(detection_result, crisis_level):
+        return None
+    return narrative_worker.submit(
+        analysis_id, text, detection_result, lookup['cache_key'], lookup['matched_analysis_id']
+    )
+
+def build_response(analysis_id, text, detection_result, crisis_level, narrative, lookup):
+    """Prepare response with all enhancements"""
+    return {
         'analysis_id': analysis_id,
         'text': text,
         'misinformation_detected': detection_result['is_misinformation'],
@@ -184,11 +633,203 @@ def analyze_text():
         'manipulation_type': detection_result.get('manipulation_type', 'none'),
         'recommended_action': detection_result.get('recommended_action', 'monitor'),
         'emergency_level': detection_result.get('emergency_level', 'low'),
-        'counter_narrative': response,
+        'counter_narrative': narrative['counter_narrative'] if narrative else None,
+        'counter_narrative_status': narrative['status'] if narrative else 'not_required',
+        'counter_narrative_url': f'/counter_narrative/{analysis_id}' if narrative else None,
+        'cached': lookup['cached'],
+        'matched_analysis_id': lookup['matched_analysis_id'],
+        'claims': detection_result.get('claims'),
         'timestamp': datetime.now().isoformat()
     }
+
+@app.route('/analyze', methods=['POST'])
+def analyze_text():
+    """Enhanced analysis; accepts JSON, or multipart/form-data with an 'image' file upload"""
+    data = request.form if request.files or request.form else request.get_json()
+    text = data.get('text', '')
+    context = data.get('context', 'social_media')
     
-    return jsonify(response_data)
+    try:
+        raw_image = read_image_upload()
+        image = image_index.prepare(raw_image) if raw_image else None
+    except ImageTooLarge as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 413
+    except InvalidImage as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    stat_counters.inc('total_analyzed')
+    
+    lookup = analyze_claim(text, image, context)
+    detection_result = lookup['detection_result']
+    crisis_level = lookup['crisis_level']
+    
+    # Update global stats
+    if detection_result['is_misinformation']:
+        stat_counters.inc('misinformation_detected')
+    
+    # Save enhanced analysis to database
+    analysis_id = save_analyses([{
+        'text': text,
+        'detection_result': detection_result,
+        'crisis_level': crisis_level,
+        'fingerprint': lookup['fingerprint'],
+        'image': image,
+        'verdict_source': verdict_source(lookup)
+    }])[0]
+    
+    # Counter-narratives for high-risk content are generated off the request thread
+    narrative = queue_counter_narrative(analysis_id, text, detection_result, crisis_level, lookup)
+    
+    return jsonify(build_response(analysis_id, text, detection_result, crisis_level, narrative, lookup))
+
+@app.route('/analyze_batch', methods=['POST'])
+def analyze_batch():
+    """Bulk analysis for monitoring partners, results returned in input order"""
+    data = request.get_json()
+    items = data.get('items', [])
+    if not isinstance(items, list) or not items:
+        return jsonify({'status': 'error', 'message': 'items must be a non-empty list'}), 400
+    if len(items) > MAX_BATCH_ITEMS:
+        return jsonify({'status': 'error', 'message': f'batch limited to {MAX_BATCH_ITEMS} items'}), 400
+    
+    items = [item if isinstance(item, dict) else {'text': str(item)} for item in items]
+    concurrency = data.get('concurrency', BATCH_CONCURRENCY)
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency < 1:
+        return jsonify({'status': 'error', 'message': 'concurrency must be a positive integer'}), 400
+    concurrency = min(concurrency, BATCH_CONCURRENCY)
+    
+    # Images are decoded and hashed together so look-alikes within the batch dedupe too
+    try:
+        raw_images = [decode_base64(item['image'], MAX_IMAGE_BYTES) if item.get('image') else None for item in items]
+        prepared = iter(image_index.prepare_many([raw for raw in raw_images if raw]))
+        images = [next(prepared) if raw else None for raw in raw_images]
+    except ImageTooLarge as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 413
+    except InvalidImage as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    stat_counters.inc('total_analyzed', len(items))
+    
+    # Dedupe on the verdict cache key so every distinct claim is analyzed at most once
+    lookups = {}
+    item_keys = []
+    for item, image in zip(items, images):
+        text = item.get('text', '')
+        context = item.get('context', 'social_media')
+        key = verdict_cache.make_key(text, context, image_index.key(image))
+        if key not in lookups:
+            lookups[key] = resolve_from_history(text, context, image)
+            lookups[key]['item'] = item
+        item_keys.append(key)
+    
+    pending = [key for key, lookup in lookups.items() if lookup['detection_result'] is None]
+    # Multi-claim items are analyzed claim by claim in finish(); the rest go to the detector together
+    claims = {
+        key: segmenter.split(lookups[key]['item'].get('text', '')) if lookups[key]['image'] is None else []
+        for key in pending
+    }
+    whole = [key for key in pending if len(claims[key]) <= 1]
+    detections = detector.analyze_many([batch_detection_item(lookups[key]) for key in whole], max_workers=concurrency)
+    for key, detection_result in zip(whole, detections):
+        lookups[key]['detection_result'] = detection_result
+    
+    def finish(key):
+        lookup = lookups[key]
+        text = lookup['item'].get('text', '')
+        try:
+            if lookup['detection_result'] is None:
+                lookup['detection_result'], lookup['crisis_level'] = analyze_segments(
+                    text, claims[key], lookup['item'].get('context', 'social_media')
+                )
+            elif lookup['crisis_level'] is None:
+                lookup['crisis_level'] = crisis_handler.assess_crisis(text, lookup['detection_result'])
+            if not lookup['detection_result'].get('is_fallback'):
+                verdict_cache.put(key, lookup['detection_result'], lookup['crisis_level'])
+        except Exception as e:
+            print(f"Batch Item Error: {e}")
+            lookup['detection_result'] = detector._enhanced_fallback_analysis(text, detector._detect_language(text))
+            lookup['crisis_level'] = crisis_handler._fallback_crisis_assessment(text, lookup['detection_result'])
+    
+    # Cached claims of earlier segmented messages still need a crisis level
+    unscored = [key for key, lookup in lookups.items()
+                if lookup['detection_result'] is not None and lookup['crisis_level'] is None and key not in claims]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(metrics.bind_endpoint(finish), pending + unscored))
+    
+    records = []
+    for item, key in zip(items, item_keys):
+        lookup = lookups[key]
+        if lookup['detection_result']['is_misinformation']:
+            stat_counters.inc('misinformation_detected')
+        records.append({
+            'text': item.get('text', ''),
+            'detection_result': lookup['detection_result'],
+            'crisis_level': lookup['crisis_level'],
+            'fingerprint': lookup['fingerprint'],
+            'image': lookup['image'],
+            'verdict_source': verdict_source(lookup)
+        })
+    analysis_ids = save_analyses(records)
+    
+    results = []
+    for record, key, analysis_id in zip(records, item_keys, analysis_ids):
+        lookup = lookups[key]
+        narrative = queue_counter_narrative(
+            analysis_id, record['text'], lookup['detection_result'], lookup['crisis_level'], lookup
+        )
+        results.append(build_response(
+            analysis_id, record['text'], lookup['detection_result'], lookup['crisis_level'], narrative, lookup
+        ))
+    
+    return jsonify({
+        'status': 'success',
+        'count': len(results),
+        'unique_claims': len(lookups),
+        'llm_analyzed': len(pending),
+        'results': results
+    })
+
+def batch_detection_item(lookup):
+    """What detector.analyze_many needs for one batch claim"""
+    item = lookup['item']
+    image = lookup['image']
+    return {
+        'text': item.get('text', ''),
+        'context': item.get('context', 'social_media'),
+        'image': image and image['data'],
+        'image_analysis': image and image['analysis']
+    }
+
+@app.route('/counter_narrative/<int:analysis_id>')
+def get_counter_narrative(analysis_id):
+    """Poll for a counter-narrative generated in the background"""
+    entry = narrative_worker.get(analysis_id)
+    if entry is None:
+        return jsonify({'status': 'error', 'message': 'No counter-narrative queued for this analysis'}), 404
+    return jsonify({'analysis_id': analysis_id, **entry})
+
+@app.route('/counter_narrative/<int:analysis_id>/events')
+def stream_counter_narrative(analysis_id):
+    """Push the counter-narrative over SSE: 'piece' events as tokens arrive, then the final entry"""
+    def generate():
+        # Send something straight away so proxies and EventSource see the stream open
+        yield ": stream-open\n\n"
+        entry = None
+        for event in narrative_worker.follow(analysis_id, NARRATIVE_STREAM_TIMEOUT):
+            if event is None:
+                yield ": keep-alive\n\n"
+            elif event[0] == 'piece':
+                yield f"event: piece\ndata: {json.dumps({'analysis_id': analysis_id, 'text': event[1]})}\n\n"
+            else:
+                entry = event[1]
+        
+        if entry is None:
+            entry = {'status': 'unknown', 'counter_narrative': None}
+        yield f"data: {json.dumps({'analysis_id': analysis_id, **entry})}\n\n"
+    
+    # X-Accel-Buffering stops nginx from holding pieces back until the response ends
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/feedback', methods=['POST'])
 def submit_feedback():
@@ -198,119 +839,164 @@ def submit_feedback():
     feedback_type = data.get('type')  # 'correct', 'incorrect', 'helpful', 'not_helpful'
     feedback_text = data.get('text', '')
     
-    conn = sqlite3.connect('crisis_data.db')
-    cursor = conn.cursor()
+    # Update analysis with feedback
+    feedback_score = 1 if feedback_type in ['correct', 'helpful'] else -1
+    storage.write(record_feedback, analysis_id, feedback_type, feedback_text, feedback_score)
     
+    if feedback_score > 0:
+        stat_counters.inc('user_feedback_positive')
+    
+    return jsonify({'status': 'success', 'message': 'Feedback recorded'})
+
+def record_feedback(cursor, analysis_id, feedback_type, feedback_text, feedback_score):
     cursor.execute("""
         INSERT INTO user_feedback (analysis_id, feedback_type, feedback_text)
         VALUES (?, ?, ?)
     """, (analysis_id, feedback_type, feedback_text))
-    
-    # Update analysis with feedback
-    feedback_score = 1 if feedback_type in ['correct', 'helpful'] else -1
     cursor.execute("""
         UPDATE analyses SET user_feedback = user_feedback + ? WHERE id = ?
     """, (feedback_score, analysis_id))
-    
-    conn.commit()
-    conn.close()
-    
-    if feedback_score > 0:
-        global global_stats
-        global_stats['user_feedback_positive'] += 1
-    
-    return jsonify({'status': 'success', 'message': 'Feedback recorded'})
+    quality.record(cursor, analysis_id, feedback_type)
 
 @app.route('/emergency_alert', methods=['POST'])
 def trigger_emergency_alert():
-    """Emergency alert system"""
+    """Queue a manual emergency alert for an analysis; delivery happens in the background"""
     data = request.get_json()
     analysis_id = data.get('analysis_id')
     alert_message = data.get('message')
     
-    # In real implementation, this would notify authorities
-    # For demo, we just log it
-    conn = sqlite3.connect('crisis_data.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        UPDATE emergency_alerts SET authorities_notified = TRUE 
-        WHERE analysis_id = ?
+    row = storage.read_one("""
+        SELECT t.text, a.category, a.crisis_level FROM analyses a
+        JOIN analysis_texts t ON t.id = a.id WHERE a.id = ?
     """, (analysis_id,))
+    if not row:
+        return jsonify({'status': 'error', 'message': 'Unknown analysis_id'}), 404
     
-    conn.commit()
-    conn.close()
+    alert_id = storage.write(
+        AlertDispatcher.enqueue, analysis_id, row[0], row[1], row[2], alert_message, wait=True
+    )
+    alert_dispatcher.notify()
     
     return jsonify({
-        'status': 'success', 
-        'message': 'Emergency alert sent to authorities',
-        'demo_note': 'In production, this would notify: Police, Health Dept, Emergency Services'
-    })
+        'status': 'success',
+        'message': 'Emergency alert queued for dispatch',
+        'alert_id': alert_id,
+        'authority': authority_for(row[1])
+    }), 202
+
+@app.route('/emergency_alerts')
+def list_emergency_alerts():
+    """Recent alerts by queue status, e.g. ?status=dead for the dead-letter queue"""
+    status = request.args.get('status')
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    where, params = ("WHERE status = ?", (status,)) if status else ("", ())
+    rows = storage.read(f"""
+        SELECT id, analysis_id, authority, status, attempts, last_error, alert_message, timestamp
+        FROM emergency_alerts {where} ORDER BY id DESC LIMIT ?
+    """, params + (limit,))
+    fields = ['id', 'analysis_id', 'authority', 'status', 'attempts', 'last_error', 'message', 'timestamp']
+    return jsonify({'alerts': [dict(zip(fields, row)) for row in rows]})
+
+@app.route('/emergency_alerts/requeue', methods=['POST'])
+def requeue_emergency_alerts():
+    """Retry dead-lettered alerts, all of them or the listed alert_ids"""
+    data = request.get_json(silent=True) or {}
+    count = alert_dispatcher.requeue_dead(data.get('alert_ids'))
+    return jsonify({'status': 'success', 'message': f'{count} alerts requeued', 'requeued': count})
+
+@app.route('/factchecks', methods=['POST'])
+def add_factchecks():
+    """Index new or corrected fact-checks; {"factchecks": [{"claim": ..., "verdict": ..., ...}]}"""
+    data = request.get_json(silent=True) or {}
+    records = data.get('factchecks') if isinstance(data, dict) else data
+    if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+        return jsonify({'status': 'error', 'message': 'factchecks must be a list of objects'}), 400
+    
+    added = fact_index.add(records)
+    return jsonify({'status': 'success', 'message': f'{added} fact-checks indexed', 'indexed': added,
+                    'skipped': len(records) - added})
 
 @app.route('/stream')
 def stream_data():
-    """Enhanced real-time stream with diverse scenarios"""
+    """Real-time stream of analyzed posts shared by every connected client"""
+    # Reconnecting EventSource clients resume after the last event they saw
+    last_seq = request.headers.get('Last-Event-ID', type=int) or 0
+    
     def generate():
-        enhanced_samples = [
-            {
-                'text': "कोविड वैक्सीन में माइक्रोचिप है - सरकार छुप रही है सच्चाई!",
-                'language': 'hi',
-                'category': 'health'
-            },
-            {
-                'text': "Breaking: Scientists confirm 5G towers spread coronavirus - immediate shutdown required!",
-                'language': 'en', 
-                'category': 'technology'
-            },
-            {
-                'text': "Local weather department forecasts heavy rainfall this evening, residents advised to stay indoors",
-                'language': 'en',
-                'category': 'weather'
-            },
-            {
-                'text': "URGENT: City water supply contaminated with deadly chemicals - government covering up mass poisoning!",
-                'language': 'en',
-                'category': 'disaster'
-            },
-            {
-                'text': "University research team publishes peer-reviewed study on renewable energy breakthroughs",
-                'language': 'en',
-                'category': 'other'
-            }
-        ]
-        
-        for i, sample in enumerate(enhanced_samples):
-            result = detector.analyze(sample['text'])
-            crisis_level = crisis_handler.assess_crisis(sample['text'], result)
-            
-            stream_data = {
-                'id': i + 1,
-                'text': sample['text'],
-                'language': sample['language'],
-                'crisis_level': crisis_level,
-                'is_misinformation': result['is_misinformation'],
-                'confidence': result['confidence'],
-                'credibility_score': result.get('credibility_score', 50),
-                'spread_risk': result.get('spread_risk', 5),
-                'harm_potential': result.get('harm_potential', 5),
-                'viral_potential': result.get('viral_potential', 5),
-                'sources': result.get('sources', []),
-                'category': result.get('category', 'unknown'),
-                'emergency_level': result.get('emergency_level', 'low'),
-                'recommended_action': result.get('recommended_action', 'monitor'),
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            yield f"data: {json.dumps(stream_data)}\n\n"
-            time.sleep(5)
+        for event in stream_pipeline.subscribe(last_seq):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"id: {event['id']}\ndata: {json.dumps(event)}\n\n"
     
     return Response(generate(), mimetype='text/event-stream')
 
+@app.route('/search')
+def search_claims():
+    """Full-text search over every claim seen so far, best matches first"""
+    args = request.args
+    try:
+        results, next_cursor = claim_search.search(
+            args.get('q', ''),
+            category=args.get('category'),
+            emergency_level=args.get('emergency_level'),
+            since=args.get('since'),
+            until=args.get('until'),
+            limit=args.get('limit', 20, type=int),
+            cursor=args.get('cursor'),
+            match=args.get('match', 'all')
+        )
+    except SearchError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    return jsonify({
+        'status': 'success',
+        'query': args.get('q'),
+        'count': len(results),
+        'results': results,
+        'next_cursor': next_cursor
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Stage timings, token usage and cache/fallback counters for Prometheus"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+_component_stats = {'sections': None, 'read_at': 0.0}
+_component_stats_lock = threading.Lock()
+
+def component_stats():
+    """Per-component sections of /stats, recomputed at most every STATS_CACHE_SECONDS"""
+    with _component_stats_lock:
+        if _component_stats['sections'] is None or time.time() - _component_stats['read_at'] >= STATS_CACHE_SECONDS:
+            _component_stats['sections'] = {
+                'verdict_cache': verdict_cache.stats(),
+                'similarity_index_size': len(similarity_index),
+                'images': image_index.stats(),
+                'factchecks': fact_index.stats(),
+                'segmentation': segmenter.stats(),
+                'quality': quality.summary(),
+                'counter_narratives': narrative_worker.stats(),
+                'storage': storage.stats(),
+                'triage': triage.stats(),
+                'llm': detector.llm.stats(),
+                'stream': stream_pipeline.stats(),
+                'archive': archiver.stats(),
+                'alerts': alert_dispatcher.stats()
+            }
+            _component_stats['read_at'] = time.time()
+        return _component_stats['sections']
+
 @app.route('/stats')
 def get_stats():
     """Live statistics API for dashboard"""
-    return jsonify(global_stats)
+    # Counter totals are already cached per flush interval by StatCounters
+    totals = stat_counters.totals()
+    stats = {name: totals.get(name, 0) for name in STAT_NAMES}
+    stats['languages_supported'] = LANGUAGES_SUPPORTED
+    stats.update(component_stats())
+    return jsonify(stats)
 
 if __name__ == '__main__':
-    init_db()
+    start_background_work()
     app.run(debug=True, port=5000, threaded=True)
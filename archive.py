@@ -0,0 +1,244 @@
+"""Move old analyses out of SQLite into compressed day partitions, and query them back
+
+    python archive.py run --days 30
+    python archive.py query --since 2026-01-01 --until 2026-02-01 --category health --contains vaccine
+
+Partitions are gzipped JSON lines under <dir>/analyses/dt=YYYY-MM-DD/, one object per analysis with
+its text, sources, feedback, alerts and counter-narrative inlined. The hive-style layout can also be
+read directly by DuckDB, Spark or pandas.
+"""
+import argparse
+import fcntl
+import gzip
+import json
+import os
+import sys
+import threading
+from datetime import date
+
+from content_store import ContentStore
+from storage import Storage, DB_PATH
+
+ANALYSIS_COLUMNS = [
+    'id', 'timestamp', 'is_misinformation', 'confidence', 'credibility_score', 'spread_risk',
+    'harm_potential', 'crisis_level', 'language_detected', 'category', 'emergency_level', 'user_feedback'
+]
+
+
+class Archiver:
+    """Retention job: analyses older than `days` go to archive files and leave the hot database
+
+    Deleting history is opt-in: days=0 never archives. Runs take a lock file in the archive
+    directory, so with several worker processes (or the CLI alongside) only one moves rows at a time.
+    """
+
+    def __init__(self, storage, content, directory='archive', days=0, batch_size=500):
+        self.storage = storage
+        self.content = content
+        self.directory = directory
+        self.days = days
+        self.batch_size = batch_size
+        self.counters = {'runs': 0, 'skipped': 0, 'archived': 0, 'files_written': 0, 'errors': 0}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, interval=3600):
+        """Run the job every `interval` seconds on a daemon thread"""
+        if self._thread is not None or self.days <= 0:
+            return
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name='archiver', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, interval):
+        while not self._stop.is_set():
+            try:
+                self.run()
+            except Exception as e:
+                self.counters['errors'] += 1
+                print(f"Archive Error: {e}")
+            self._stop.wait(interval)
+
+    def run(self):
+        """Archive every eligible row in batches; returns how many rows moved"""
+        if self.days <= 0:
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another process is archiving right now; its run covers these rows too
+                self.counters['skipped'] += 1
+                return 0
+            try:
+                return self._run()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _run(self):
+        self.counters['runs'] += 1
+        moved = 0
+        while True:
+            rows = self._select_batch()
+            if not rows:
+                break
+            records = self._build_records(rows)
+            # Files are durable before the rows go, so a crash in between at worst archives a batch twice
+            self._write_partitions(records)
+            self.storage.write(self._delete, [record['id'] for record in records],
+                               [row['text_id'] for row in rows], wait=True)
+            moved += len(records)
+            self.counters['archived'] += len(records)
+
+        if moved:
+            self.storage.write(_reclaim_pages, wait=True)
+        return moved
+
+    def _select_batch(self):
+        with self.storage.reader() as conn:
+            cursor = conn.execute(f"""
+                SELECT {', '.join('a.' + column for column in ANALYSIS_COLUMNS)},
+                       COALESCE(t.body, a.text) AS text, a.text_id, a.source_ids, a.sources
+                FROM analyses a LEFT JOIN texts t ON t.id = a.text_id
+                WHERE a.timestamp < datetime('now', ?)
+                ORDER BY a.timestamp, a.id LIMIT ?
+            """, (f'-{self.days} days', self.batch_size))
+            names = [description[0] for description in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def _build_records(self, rows):
+        ids = [row['id'] for row in rows]
+        placeholders = ','.join('?' * len(ids))
+        feedback = self._group(f"""
+            SELECT analysis_id, feedback_type, feedback_text, timestamp FROM user_feedback
+            WHERE analysis_id IN ({placeholders}) ORDER BY id
+        """, ids, ('type', 'text', 'timestamp'))
+        alerts = self._group(f"""
+            SELECT analysis_id, alert_level, alert_message, authorities_notified, timestamp FROM emergency_alerts
+            WHERE analysis_id IN ({placeholders}) ORDER BY id
+        """, ids, ('level', 'message', 'authorities_notified', 'timestamp'))
+        narratives = dict(self.storage.read(f"""
+            SELECT analysis_id, counter_narrative FROM counter_narratives
+            WHERE analysis_id IN ({placeholders}) AND status = 'ready'
+        """, ids))
+
+        records = []
+        for row in rows:
+            record = {column: row[column] for column in ANALYSIS_COLUMNS}
+            record['is_misinformation'] = bool(record['is_misinformation'])
+            record['text'] = row['text']
+            record['sources'] = self.content.sources(row['source_ids'], row['sources'])
+            record['feedback'] = feedback.get(row['id'], [])
+            record['alerts'] = alerts.get(row['id'], [])
+            record['counter_narrative'] = narratives.get(row['id'])
+            records.append(record)
+        return records
+
+    def _group(self, sql, ids, fields):
+        grouped = {}
+        for analysis_id, *values in self.storage.read(sql, ids):
+            grouped.setdefault(analysis_id, []).append(dict(zip(fields, values)))
+        return grouped
+
+    def _write_partitions(self, records):
+        partitions = {}
+        for record in records:
+            partitions.setdefault(record['timestamp'][:10], []).append(record)
+
+        for day, day_records in partitions.items():
+            folder = os.path.join(self.directory, 'analyses', f'dt={day}')
+            os.makedirs(folder, exist_ok=True)
+            first = min(record['id'] for record in day_records)
+            last = max(record['id'] for record in day_records)
+            path = os.path.join(folder, f'part-{first:010d}-{last:010d}.jsonl.gz')
+            temporary = path + '.tmp'
+            with open(temporary, 'wb') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6, mtime=0) as handle:
+                    for record in day_records:
+                        handle.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(temporary, path)
+            self.counters['files_written'] += 1
+
+    def _delete(self, cursor, analysis_ids, text_ids):
+        rows = [(analysis_id,) for analysis_id in analysis_ids]
+        for table in ('user_feedback', 'emergency_alerts', 'counter_narratives', 'analysis_fingerprints'):
+            cursor.executemany(f"DELETE FROM {table} WHERE analysis_id = ?", rows)
+        cursor.executemany("DELETE FROM analyses WHERE id = ?", rows)
+        self.content.release_texts(cursor, text_ids)
+
+    def partitions(self, since=None, until=None):
+        """Partition files whose day falls in [since, until), oldest first"""
+        root = os.path.join(self.directory, 'analyses')
+        if not os.path.isdir(root):
+            return []
+        paths = []
+        for name in sorted(os.listdir(root)):
+            day = name.split('=', 1)[-1]
+            if (since and day < since) or (until and day >= until):
+                continue
+            folder = os.path.join(root, name)
+            paths.extend(os.path.join(folder, part) for part in sorted(os.listdir(folder)) if part.endswith('.gz'))
+        return paths
+
+    def query(self, since=None, until=None, category=None, is_misinformation=None, contains=None):
+        """Stream archived analyses matching the filters; days are ISO dates, until is exclusive"""
+        needle = contains.casefold() if contains else None
+        for path in self.partitions(since, until):
+            with gzip.open(path, 'rt', encoding='utf-8') as handle:
+                for line in handle:
+                    record = json.loads(line)
+                    if category and record.get('category') != category:
+                        continue
+                    if is_misinformation is not None and record['is_misinformation'] != is_misinformation:
+                        continue
+                    if needle and needle not in record['text'].casefold():
+                        continue
+                    yield record
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['retention_days'] = self.days
+        return stats
+
+
+def _reclaim_pages(cursor):
+    # Only databases created with auto_vacuum=INCREMENTAL can hand pages back to the OS;
+    # elsewhere freed pages are simply reused by new rows
+    if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        cursor.execute("PRAGMA incremental_vacuum")
+
+
+def iso_day(value):
+    return date.fromisoformat(value).isoformat()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--dir', default=os.environ.get('ARCHIVE_DIR', 'archive'))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='archive analyses older than --days')
+    run_parser.add_argument('--days', type=int, default=int(os.environ.get('ARCHIVE_AFTER_DAYS', 30)))
+
+    query_parser = commands.add_parser('query', help='print matching archived analyses as JSON lines')
+    query_parser.add_argument('--since', type=iso_day, help='first day, YYYY-MM-DD')
+    query_parser.add_argument('--until', type=iso_day, help='day after the last, YYYY-MM-DD')
+    query_parser.add_argument('--category')
+    query_parser.add_argument('--misinformation', choices=['true', 'false'])
+    query_parser.add_argument('--contains', help='case-insensitive text substring')
+    args = parser.parse_args()
+
+    storage = Storage(args.db)
+    archiver = Archiver(storage, ContentStore(storage), args.dir, days=getattr(args, 'days', 0))
+    if args.command == 'run':
+        print(f"Archived {archiver.run()} analyses to {args.dir}")
+    else:
+        misinformation = None if args.misinformation is None else args.misinformation == 'true'
+        for record in archiver.query(args.since, args.until, args.category, misinformation, args.contains):
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
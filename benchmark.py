@@ -0,0 +1,347 @@
+"""Offline load tests and micro-benchmarks, no network or API key needed
+
+    python benchmark.py load --corpus requests.jsonl --rps 20 --duration 30 --latency 0.8 --error-rate 0.02
+    python benchmark.py micro --baseline bench_baseline.json --max-regression 0.25
+
+'load' starts the Flask app against mock_openai_server and replays the corpus
+at a fixed request rate; 'micro' times the local detector helpers and exits
+non-zero when one is slower than the baseline allows.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+DEFAULT_CORPUS = [
+    "BREAKING: Drinking hot water with salt cures COVID-19 completely! Share immediately!",
+    "URGENT: Government hiding vaccine side effects! 90% of people who got vaccine will die in 2 years!",
+    "Scientists at Delhi University develop new water purification method using local materials",
+    "Weather department forecasts heavy rainfall in Mumbai for next 3 days",
+    "SHOCKING: 5G towers are spreading coronavirus! Remove them now!",
+    "Election was rigged! Voting machines were hacked by foreign agents!",
+    "तुरंत शेयर करें: पानी में ज़हर मिलाया गया है, नल का पानी न पिएं",
+    "Official bulletin: vaccination camp schedule for ward 12 released"
+]
+
+MICRO_TEXTS = DEFAULT_CORPUS + [
+    " ".join(DEFAULT_CORPUS) * 4,
+    "வதந்தி: தடுப்பூசி போட்டவர்கள் இரண்டு ஆண்டுகளில் இறந்துவிடுவார்கள் என்று பகிரப்படுகிறது"
+]
+
+ENDPOINTS = ('analyze', 'stream', 'dashboard')
+# dashboard needs templates/dashboard.html; add it with --mix when the template is deployed
+DEFAULT_MIX = 'analyze=8,stream=1'
+
+
+def load_corpus(path):
+    """Texts from a JSONL file; objects use 'text', falling back to 'body' or 'title'"""
+    if not path:
+        return list(DEFAULT_CORPUS)
+    texts = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                item = line
+            if isinstance(item, dict):
+                item = item.get('text') or item.get('body') or item.get('title')
+            if isinstance(item, str) and item.strip():
+                texts.append(item)
+    if not texts:
+        raise ValueError(f"No texts found in {path}")
+    return texts
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples, elapsed):
+    report = {}
+    for endpoint in ENDPOINTS:
+        rows = [s for s in samples if s['endpoint'] == endpoint]
+        if not rows:
+            continue
+        latencies = [s['latency'] * 1000 for s in rows]
+        statuses = {}
+        for s in rows:
+            statuses[str(s['status'])] = statuses.get(str(s['status']), 0) + 1
+        report[endpoint] = {
+            'requests': len(rows),
+            'errors': sum(1 for s in rows if not 200 <= s['status'] < 300),
+            'statuses': statuses,
+            'throughput_rps': round(len(rows) / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 50), 1),
+            'p95_ms': round(percentile(latencies, 95), 1),
+            'p99_ms': round(percentile(latencies, 99), 1),
+            'max_ms': round(max(latencies), 1)
+        }
+    return report
+
+
+def parse_mix(spec):
+    """'analyze=8,stream=1,dashboard=1' -> {'analyze': 8, ...}"""
+    mix = {}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def start_app(mock_base_url, db_dir):
+    """Import the app against the mock API and a throwaway database, serve it on a free port"""
+    # openai 0.x reads these at import time, so set them before app is imported
+    os.environ['OPENAI_API_BASE'] = mock_base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+    os.environ['CRISIS_DB_PATH'] = os.path.join(db_dir, 'benchmark.db')
+
+    import openai
+    openai.api_base = mock_base_url
+    openai.api_key = os.environ['OPENAI_API_KEY']
+
+    from werkzeug.serving import make_server
+    import app as crisis_app
+
+    crisis_app.start_background_work()
+
+    # Per-request access logs would drown the report
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, crisis_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+class LoadRunner:
+    """Open-loop load generator: requests start on schedule whether or not earlier ones finished"""
+
+    def __init__(self, base_url, corpus, rps, duration, mix, concurrency=64, unique=False, seed=0, timeout=60):
+        self.base_url = base_url
+        self.corpus = corpus
+        self.rps = rps
+        self.duration = duration
+        self.mix = mix
+        self.concurrency = concurrency
+        self.unique = unique
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.samples = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _session(self):
+        import requests
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def run(self):
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            index = 0
+            while True:
+                due = start + index / self.rps
+                if due - start >= self.duration:
+                    break
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                endpoint = self.random.choices(names, weights)[0]
+                pool.submit(self._fire, endpoint, index, due)
+                index += 1
+        return time.perf_counter() - start
+
+    def _fire(self, endpoint, index, due):
+        # Latency counts from the scheduled start, so a saturated server shows up
+        # as queueing delay instead of silently lowering the offered load
+        try:
+            status = getattr(self, f'_{endpoint}')(index)
+        except Exception as e:
+            print(f"Benchmark request error ({endpoint}): {e}")
+            status = 599
+        with self._lock:
+            self.samples.append({'endpoint': endpoint, 'status': status, 'latency': time.perf_counter() - due})
+
+    def _analyze(self, index):
+        text = self.corpus[index % len(self.corpus)]
+        if self.unique:
+            text = f"{text} [{index}]"
+        response = self._session().post(
+            f"{self.base_url}/analyze", json={'text': text, 'context': 'social_media'}, timeout=self.timeout
+        )
+        return response.status_code
+
+    def _dashboard(self, index):
+        return self._session().get(f"{self.base_url}/dashboard", timeout=self.timeout).status_code
+
+    def _stream(self, index):
+        # Time to the first analyzed event, which is what a viewer waits for
+        import requests
+        with requests.get(f"{self.base_url}/stream", stream=True, timeout=self.timeout) as response:
+            if response.status_code != 200:
+                return response.status_code
+            for line in response.iter_lines():
+                if line.startswith(b'data:'):
+                    break
+            return response.status_code
+
+
+def run_load(args):
+    from mock_openai_server import start_mock_server
+
+    mock_server, mock, mock_base_url = start_mock_server(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed
+    )
+    db_dir = tempfile.mkdtemp(prefix='crisis-bench-')
+    server, base_url = start_app(mock_base_url, db_dir)
+
+    corpus = load_corpus(args.corpus)
+    runner = LoadRunner(
+        base_url, corpus, args.rps, args.duration, parse_mix(args.mix),
+        concurrency=args.concurrency, unique=args.unique, seed=args.seed
+    )
+    # An endpoint that fails before any load would only fill the report with guaranteed errors
+    if 'dashboard' in runner.mix:
+        status = runner._dashboard(-1)
+        if status >= 500:
+            server.shutdown()
+            mock_server.shutdown()
+            print(f"Benchmark aborted: GET /dashboard returns {status} before any load "
+                  f"(is templates/dashboard.html missing?); drop it from --mix")
+            return 1
+
+    print(f"Replaying {len(corpus)} texts at {args.rps} rps for {args.duration}s "
+          f"(mock latency {args.latency}s +/- {args.jitter}s, error rate {args.error_rate})")
+    elapsed = runner.run()
+
+    report = {
+        'settings': {k: v for k, v in vars(args).items() if k != 'func'},
+        'elapsed_s': round(elapsed, 2),
+        'endpoints': summarize(runner.samples, elapsed),
+        'mock_openai': dict(mock.counters)
+    }
+    server.shutdown()
+    mock_server.shutdown()
+
+    print(f"{'endpoint':<10} {'reqs':>6} {'errors':>6} {'rps':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, row in report['endpoints'].items():
+        print(f"{endpoint:<10} {row['requests']:>6} {row['errors']:>6} {row['throughput_rps']:>7} "
+              f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9}")
+    print(f"Mock OpenAI: {report['mock_openai']}")
+    write_report(report, args.output)
+    return 0
+
+
+def micro_benchmarks():
+    """name -> callable(text); each runs over MICRO_TEXTS"""
+    from detection import MisinformationDetector
+    from keyword_engine import KeywordEngine
+    from similarity_index import SimilarityIndex
+
+    # A cache-less engine so every call pays for the scan, as a fresh text would
+    detector = MisinformationDetector(keywords=KeywordEngine(cache_size=0))
+    # Fingerprinting never touches storage, so the index only needs a schema hook
+    index = SimilarityIndex(SimpleNamespace(register_schema=lambda init: None))
+
+    return {
+        'detect_language': detector._detect_language,
+        'enhanced_fallback_analysis': lambda text: detector._enhanced_fallback_analysis(text, 'en'),
+        'calculate_viral_potential': detector._calculate_viral_potential,
+        'extract_key_terms': detector._extract_key_terms,
+        'keyword_scan': detector.keywords.scan,
+        'simhash_fingerprint': index.fingerprint
+    }
+
+
+def time_call(fn, texts, iterations, repeat):
+    """Best-of-repeat microseconds per call, like timeit"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for text in texts:
+                fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best / (iterations * len(texts)) * 1e6
+
+
+def run_micro(args):
+    results = {}
+    for name, fn in micro_benchmarks().items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = round(time_call(fn, MICRO_TEXTS, args.iterations, args.repeat), 2)
+        print(f"{name:<28} {results[name]:>10.2f} us/call")
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f).get('micro', {})
+        for name, value in results.items():
+            reference = baseline.get(name)
+            if reference and value > reference * (1 + args.max_regression):
+                print(f"REGRESSION {name}: {value:.2f} us/call vs baseline {reference:.2f}")
+                status = 1
+    write_report({'micro': results}, args.output)
+    return status
+
+
+def write_report(report, path):
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Report written to {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    load = subparsers.add_parser('load', help='replay a corpus against the app and a mock OpenAI server')
+    load.add_argument('--corpus', help='JSONL or plain text file, one post per line (default: built-in samples)')
+    load.add_argument('--rps', type=float, default=10.0, help='requests started per second')
+    load.add_argument('--duration', type=float, default=30.0, help='seconds to generate load')
+    load.add_argument('--mix', default=DEFAULT_MIX, help='endpoint weights, e.g. analyze=8,stream=1,dashboard=1')
+    load.add_argument('--concurrency', type=int, default=64, help='maximum requests in flight')
+    load.add_argument('--unique', action='store_true', help='tag each text so the exact verdict cache misses')
+    load.add_argument('--latency', type=float, default=0.5, help='mock completion latency in seconds')
+    load.add_argument('--jitter', type=float, default=0.2, help='mock latency jitter in seconds')
+    load.add_argument('--error-rate', type=float, default=0.0, help='fraction of mock calls failing with 503')
+    load.add_argument('--seed', type=int, default=0)
+    load.add_argument('--output', help='write the JSON report here')
+    load.set_defaults(func=run_load)
+
+    micro = subparsers.add_parser('micro', help='time local detector helpers')
+    micro.add_argument('--iterations', type=int, default=200)
+    micro.add_argument('--repeat', type=int, default=5)
+    micro.add_argument('--only', nargs='*', help='benchmark names to run')
+    micro.add_argument('--baseline', help='JSON report from an earlier run to compare against')
+    micro.add_argument('--max-regression', type=float, default=0.25, help='allowed slowdown vs baseline (0.25 = 25%%)')
+    micro.add_argument('--output', help='write the JSON report here (usable as a later --baseline)')
+    micro.set_defaults(func=run_micro)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
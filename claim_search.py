@@ -0,0 +1,182 @@
+import base64
+import json
+import re
+import unicodedata
+from datetime import datetime, timezone
+
+from metrics import metrics
+
+# unicode61 treats combining marks as separators, which splits Indic words at every vowel sign
+# and virama; keep the marks of the Indic blocks inside tokens instead
+INDIC_MARKS = ''.join(
+    chr(code) for code in range(0x0900, 0x0E00) if unicodedata.category(chr(code)) in ('Mn', 'Mc')
+)
+TOKENIZER = f"unicode61 remove_diacritics 2 tokenchars '{INDIC_MARKS}'"
+
+MAX_PAGE_SIZE = 100
+MAX_QUERY_TERMS = 16
+
+
+class SearchError(ValueError):
+    """Bad query, filter or cursor; reported to the client as a 400"""
+
+
+class ClaimSearch:
+    """FTS5 index over interned claim texts, kept in sync by triggers on the texts table"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        storage.register_schema(self.init_table)
+
+    @staticmethod
+    def init_table(cursor):
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'texts_fts'"
+        ).fetchone()
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS texts_fts USING fts5(
+                body, content='texts', content_rowid='id', tokenize="{TOKENIZER}"
+            )
+        """)
+        # Every path that adds or drops a text (analyze, compaction, archiving) goes through these
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS texts_fts_insert AFTER INSERT ON texts BEGIN
+                INSERT INTO texts_fts (rowid, body) VALUES (new.id, new.body);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS texts_fts_delete AFTER DELETE ON texts BEGIN
+                INSERT INTO texts_fts (texts_fts, rowid, body) VALUES ('delete', old.id, old.body);
+            END
+        """)
+        if not exists:
+            cursor.execute("INSERT INTO texts_fts (texts_fts) VALUES ('rebuild')")
+
+    def search(self, query, category=None, emergency_level=None, since=None, until=None,
+               limit=20, cursor=None, match='all'):
+        """One page of matching claims, best first; returns (results, next_cursor)"""
+        fts_query = self.fts_query(query, match)
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        filters, filter_params = self._filters(category, emergency_level, since, until)
+
+        sql = "SELECT rowid, rank FROM texts_fts WHERE texts_fts MATCH ?"
+        params = [fts_query]
+        if cursor:
+            # Keyset pagination on (rank, rowid): later pages cost the same as the first
+            after_rank, after_id = self.decode_cursor(cursor)
+            sql += " AND (rank > ? OR (rank = ? AND rowid > ?))"
+            params += [after_rank, after_rank, after_id]
+        if filters:
+            sql += f" AND EXISTS (SELECT 1 FROM analyses a WHERE a.text_id = texts_fts.rowid AND {filters})"
+            params += filter_params
+        sql += " ORDER BY rank, rowid LIMIT ?"
+        params.append(limit + 1)
+
+        with metrics.span('search'):
+            with self.storage.reader() as conn:
+                matches = conn.execute(sql, params).fetchall()
+                page = matches[:limit]
+                results = self._describe(conn, fts_query, page, filters, filter_params)
+
+        next_cursor = self.encode_cursor(*page[-1]) if len(matches) > limit else None
+        return results, next_cursor
+
+    def _describe(self, conn, fts_query, page, filters, filter_params):
+        """Text, snippet, sighting counts and latest verdict for each matched text"""
+        if not page:
+            return []
+        text_ids = [text_id for text_id, _ in page]
+        placeholders = ','.join('?' * len(text_ids))
+
+        snippets = dict(conn.execute(f"""
+            SELECT rowid, snippet(texts_fts, 0, '[', ']', '...', 16) FROM texts_fts
+            WHERE texts_fts MATCH ? AND rowid IN ({placeholders})
+        """, [fts_query] + text_ids).fetchall())
+        bodies = dict(conn.execute(
+            f"SELECT id, body FROM texts WHERE id IN ({placeholders})", text_ids
+        ).fetchall())
+
+        where = f"a.text_id IN ({placeholders})" + (f" AND {filters}" if filters else '')
+        sightings = {}
+        for text_id, seen, first_seen, last_seen, latest_id in conn.execute(f"""
+            SELECT a.text_id, COUNT(*), MIN(a.timestamp), MAX(a.timestamp), MAX(a.id)
+            FROM analyses a WHERE {where} GROUP BY a.text_id
+        """, text_ids + filter_params):
+            sightings[text_id] = (seen, first_seen, last_seen, latest_id)
+
+        latest_ids = [row[3] for row in sightings.values()]
+        verdicts = {}
+        if latest_ids:
+            for row in conn.execute(f"""
+                SELECT id, is_misinformation, confidence, crisis_level, category, emergency_level
+                FROM analyses WHERE id IN ({','.join('?' * len(latest_ids))})
+            """, latest_ids):
+                verdicts[row[0]] = row[1:]
+
+        results = []
+        for text_id, rank in page:
+            seen, first_seen, last_seen, latest_id = sightings.get(text_id, (0, None, None, None))
+            verdict = verdicts.get(latest_id, (None,) * 5)
+            results.append({
+                'text_id': text_id,
+                'text': bodies.get(text_id),
+                'snippet': snippets.get(text_id),
+                'score': round(-rank, 4),
+                'times_seen': seen,
+                'first_seen': first_seen,
+                'last_seen': last_seen,
+                'latest_analysis_id': latest_id,
+                'is_misinformation': None if verdict[0] is None else bool(verdict[0]),
+                'confidence': verdict[1],
+                'crisis_level': verdict[2],
+                'category': verdict[3],
+                'emergency_level': verdict[4]
+            })
+        return results
+
+    @staticmethod
+    def fts_query(query, match='all'):
+        """Free text to an FTS5 expression: each word quoted, joined with AND (or OR)"""
+        terms = [term.replace('"', '""') for term in re.split(r'\s+', (query or '').strip()) if term]
+        if not terms:
+            raise SearchError('q is required')
+        if match not in ('all', 'any'):
+            raise SearchError("match must be 'all' or 'any'")
+        joiner = ' AND ' if match == 'all' else ' OR '
+        return joiner.join(f'"{term}"' for term in terms[:MAX_QUERY_TERMS])
+
+    @staticmethod
+    def _filters(category, emergency_level, since, until):
+        clauses = []
+        params = []
+        if category:
+            clauses.append('a.category = ?')
+            params.append(category)
+        if emergency_level:
+            clauses.append('a.emergency_level = ?')
+            params.append(emergency_level)
+        # analyses.timestamp is SQLite's 'YYYY-MM-DD HH:MM:SS' in UTC
+        for value, operator in ((since, '>='), (until, '<')):
+            if not value:
+                continue
+            try:
+                moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                raise SearchError(f'invalid timestamp: {value}')
+            if moment.tzinfo is not None:
+                moment = moment.astimezone(timezone.utc)
+            clauses.append(f'a.timestamp {operator} ?')
+            params.append(moment.strftime('%Y-%m-%d %H:%M:%S'))
+        return ' AND '.join(clauses), params
+
+    @staticmethod
+    def encode_cursor(text_id, rank):
+        return base64.urlsafe_b64encode(json.dumps([rank, text_id]).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            rank, text_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return float(rank), int(text_id)
+        except (ValueError, TypeError):
+            raise SearchError('invalid cursor')
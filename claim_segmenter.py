@@ -0,0 +1,158 @@
+import re
+import threading
+
+from similarity_index import BOILERPLATE_PHRASES
+
+# Sentence terminators per detected language; Devanagari text ends sentences with the danda
+TERMINATORS = {
+    'hi': '.!?।॥',
+    'default': '.!?'
+}
+# A period after these is not the end of a sentence
+ABBREVIATIONS = {'mr', 'mrs', 'ms', 'dr', 'prof', 'st', 'sr', 'jr', 'govt', 'vs', 'no', 'approx', 'etc', 'eg', 'ie'}
+LIST_MARKER = re.compile(r'^\s*(?:[-*•●▪➤>]+|\(?\d{1,2}[.)])\s*')
+FORWARD_LINE = re.compile('|'.join(re.escape(phrase) for phrase in BOILERPLATE_PHRASES))
+
+ACTION_ORDER = ['ignore', 'monitor', 'alert', 'emergency']
+EMERGENCY_ORDER = ['low', 'medium', 'high', 'critical']
+
+
+class ClaimSegmenter:
+    """Splits forwarded messages into their individual claims and folds per-claim verdicts back together"""
+
+    def __init__(self, detector, min_chars=400, max_claims=6, min_words=4):
+        # The detector's script detection picks terminators; its local metrics fill the combined verdict
+        self.detector = detector
+        # Shorter messages are judged whole
+        self.min_chars = min_chars
+        self.max_claims = max_claims
+        # Fragments shorter than this ride along with the previous claim
+        self.min_words = min_words
+        self._lock = threading.Lock()
+
+        self.counters = {
+            'messages_segmented': 0,
+            'claims': 0,
+            'claims_reused': 0,
+            'claims_analyzed': 0
+        }
+
+    def split(self, text):
+        """The message's claims in order, or [text] when it is short or holds a single claim"""
+        if len(text or '') < self.min_chars:
+            return [text]
+        terminators = TERMINATORS.get(self.detector._detect_language(text), TERMINATORS['default'])
+
+        sentences = []
+        for line in text.splitlines():
+            line = LIST_MARKER.sub('', line).strip()
+            # "Forwarded as received" and friends carry no claim of their own
+            if not line or (FORWARD_LINE.search(line.casefold()) and len(line.split()) <= self.min_words + 2):
+                continue
+            sentences.extend(self._sentences(line, terminators))
+
+        claims = []
+        for sentence in sentences:
+            if claims and len(sentence.split()) < self.min_words:
+                claims[-1] = f'{claims[-1]} {sentence}'
+            elif claims and len(claims[-1].split()) < self.min_words:
+                claims[-1] = f'{claims[-1]} {sentence}'
+            else:
+                claims.append(sentence)
+
+        # Too many claims: fold the shortest neighbouring pairs together
+        while len(claims) > self.max_claims:
+            index = min(range(len(claims) - 1), key=lambda i: len(claims[i]) + len(claims[i + 1]))
+            claims[index:index + 2] = [f'{claims[index]} {claims[index + 1]}']
+
+        claims = list(dict.fromkeys(claims))
+        return claims if len(claims) > 1 else [text]
+
+    @staticmethod
+    def _sentences(line, terminators):
+        sentences = []
+        start = 0
+        for position, ch in enumerate(line):
+            if ch not in terminators:
+                continue
+            following = line[position + 1:position + 2]
+            if ch == '.':
+                # Decimals, URLs and abbreviations keep going
+                if following and not following.isspace():
+                    continue
+                words = line[start:position].split()
+                last = words[-1].lower() if words else ''
+                if len(last) == 1 or last in ABBREVIATIONS:
+                    continue
+            elif following and following in terminators:
+                continue
+            sentence = line[start:position + 1].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = position + 1
+        tail = line[start:].strip()
+        if tail:
+            sentences.append(tail)
+        return sentences
+
+    def combine(self, text, claims, verdicts):
+        """One detection result for the whole message from (result, crisis_level, source) per claim
+
+        The crisis level returned is the highest claim's, or None when any claim has none yet.
+        """
+        results = [result for result, _, _ in verdicts]
+        flagged = [result for result in results if result['is_misinformation']]
+        # The most harmful false claim speaks for the message
+        worst = max(results, key=lambda result: (
+            result['is_misinformation'], result.get('harm_potential', 0), result['confidence']
+        ))
+
+        combined = {key: value for key, value in worst.items()
+                    if key not in ('similarity', 'triage', 'image_analysis', 'is_fallback', 'crisis_level')}
+        combined.update({
+            'is_misinformation': bool(flagged),
+            # Flagged: as sure as the surest flag. Clean: only as sure as the least sure claim
+            'confidence': max(r['confidence'] for r in flagged) if flagged else min(r['confidence'] for r in results),
+            'credibility_score': min(r.get('credibility_score', 50) for r in results),
+            'spread_risk': max(r.get('spread_risk', 5) for r in results),
+            'harm_potential': max(r.get('harm_potential', 5) for r in results),
+            'indicators': list(dict.fromkeys(i for r in results for i in r.get('indicators', []))),
+            'sources': list(dict.fromkeys(s for r in results for s in r.get('sources', []))),
+            'explanation': (
+                f"{len(flagged)} of {len(results)} claims flagged. {worst['explanation']}" if flagged
+                else f"None of the {len(results)} claims were flagged. {worst['explanation']}"
+            ),
+            'recommended_action': self._most_severe(results, 'recommended_action', ACTION_ORDER),
+            'emergency_level': self._most_severe(results, 'emergency_level', EMERGENCY_ORDER),
+            'language_detected': self.detector._detect_language(text),
+            'viral_potential': self.detector._calculate_viral_potential(text),
+            'claims': [{
+                'text': claim,
+                'is_misinformation': result['is_misinformation'],
+                'confidence': result['confidence'],
+                'category': result.get('category', 'unknown'),
+                'harm_potential': result.get('harm_potential', 5),
+                'crisis_level': crisis_level,
+                'explanation': result['explanation'],
+                'verdict_source': source
+            } for claim, (result, crisis_level, source) in zip(claims, verdicts)]
+        })
+        if any(result.get('is_fallback') for result in results):
+            combined['is_fallback'] = True
+
+        with self._lock:
+            self.counters['messages_segmented'] += 1
+            self.counters['claims'] += len(claims)
+            self.counters['claims_analyzed'] += sum(source == 'llm' for _, _, source in verdicts)
+            self.counters['claims_reused'] += sum(source in ('cache', 'near_duplicate', 'shared') for _, _, source in verdicts)
+        levels = [crisis_level for _, crisis_level, _ in verdicts]
+        return combined, None if None in levels else max(levels)
+
+    @staticmethod
+    def _most_severe(results, field, order):
+        ranks = [order.index(r[field]) for r in results if r.get(field) in order]
+        return order[max(ranks)] if ranks else results[0].get(field)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import threading
+
+
+class ContentStore:
+    """Interns analysis texts by content hash and sources through a URL catalog"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        # The catalog only grows and stays small, so both directions are cached whole
+        self._source_ids = {}
+        self._source_urls = {}
+        self._lock = threading.Lock()
+        storage.register_schema(self.init_table)
+
+    @staticmethod
+    def init_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS texts (
+                id INTEGER PRIMARY KEY,
+                hash BLOB NOT NULL UNIQUE,
+                body TEXT NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS source_catalog (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL UNIQUE
+            )
+        """)
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def intern_text(self, cursor, text):
+        """Id of the texts row holding `text`, adding it once; call inside a writer transaction"""
+        digest = self.text_hash(text)
+        cursor.execute("INSERT OR IGNORE INTO texts (hash, body) VALUES (?, ?)", (digest, text))
+        if cursor.rowcount:
+            return cursor.lastrowid
+        return cursor.execute("SELECT id FROM texts WHERE hash = ?", (digest,)).fetchone()[0]
+
+    def source_ids(self, cursor, urls):
+        """Comma-separated catalog ids for a sources list; call inside a writer transaction"""
+        ids = []
+        for url in urls or []:
+            with self._lock:
+                source_id = self._source_ids.get(url)
+            if source_id is None:
+                cursor.execute("INSERT OR IGNORE INTO source_catalog (url) VALUES (?)", (url,))
+                source_id = cursor.execute("SELECT id FROM source_catalog WHERE url = ?", (url,)).fetchone()[0]
+                # Cached only once committed; a rolled-back insert would leave a dangling id behind
+                self.storage.after_commit(lambda source_id=source_id, url=url: self._remember_source(source_id, url))
+            ids.append(str(source_id))
+        return ','.join(ids)
+
+    def sources(self, source_ids, legacy_json=None):
+        """Resolve a source_ids column back to URLs; rows written before interning keep JSON"""
+        if not source_ids:
+            return json.loads(legacy_json) if legacy_json else []
+        ids = [int(source_id) for source_id in source_ids.split(',')]
+        with self._lock:
+            missing = [source_id for source_id in ids if source_id not in self._source_urls]
+        if missing:
+            placeholders = ','.join('?' * len(missing))
+            for source_id, url in self.storage.read(
+                    f"SELECT id, url FROM source_catalog WHERE id IN ({placeholders})", missing):
+                self._remember_source(source_id, url)
+        with self._lock:
+            return [self._source_urls[source_id] for source_id in ids if source_id in self._source_urls]
+
+    def _remember_source(self, source_id, url):
+        with self._lock:
+            self._source_ids[url] = source_id
+            self._source_urls[source_id] = url
+
+    def release_texts(self, cursor, text_ids):
+        """Drop texts no remaining analysis refers to; call after deleting analyses"""
+        cursor.executemany("""
+            DELETE FROM texts WHERE id = ?
+            AND NOT EXISTS (SELECT 1 FROM analyses WHERE text_id = texts.id)
+        """, [(text_id,) for text_id in set(text_ids) if text_id is not None])
+
+    def compact_legacy(self, batch_size=1000):
+        """Move text and sources of rows written before interning into the shared tables"""
+        compacted = 0
+        while True:
+            rows = self.storage.read("""
+                SELECT id, text, sources FROM analyses
+                WHERE text_id IS NULL ORDER BY id LIMIT ?
+            """, (batch_size,))
+            if not rows:
+                return compacted
+            self.storage.write(self._compact, rows, wait=True)
+            compacted += len(rows)
+
+    def _compact(self, cursor, rows):
+        for analysis_id, text, sources in rows:
+            cursor.execute("""
+                UPDATE analyses SET text = '', sources = NULL, text_id = ?, source_ids = ?
+                WHERE id = ?
+            """, (self.intern_text(cursor, text), self.source_ids(cursor, json.loads(sources or '[]')), analysis_id))
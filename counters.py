@@ -0,0 +1,133 @@
+import atexit
+import os
+import threading
+import time
+
+
+class StatCounters:
+    """Dashboard counters shared by every worker process and kept across restarts
+
+    Request threads bump a dict only they write to, so increments take no lock.
+    A flusher thread periodically adds each thread's unflushed delta to the
+    stat_counters table, where every process's deltas meet. Reads combine the
+    (briefly cached) table totals with this process's not-yet-flushed deltas.
+    """
+
+    def __init__(self, storage, flush_interval=5.0):
+        self.storage = storage
+        self.flush_interval = flush_interval
+
+        self._local = threading.local()
+        self._thread_counts = []
+        self._retired = {}
+        self._flushed = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher_pid = None
+        self._totals = {}
+        self._baseline = {}
+        self._totals_read_at = 0.0
+
+        storage.register_schema(self.init_table)
+        atexit.register(self.flush)
+
+    @staticmethod
+    def init_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stat_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+    def inc(self, name, value=1):
+        counts = getattr(self._local, 'counts', None)
+        if counts is None:
+            counts = self._register_thread()
+        counts[name] = counts.get(name, 0) + value
+
+    def _register_thread(self):
+        counts = self._local.counts = {}
+        with self._lock:
+            self._thread_counts.append((threading.current_thread(), counts))
+            # Checked per new thread so forked workers (gunicorn --preload) start their own flusher
+            if self._flusher_pid != os.getpid():
+                self._flusher_pid = os.getpid()
+                threading.Thread(target=self._flush_loop, name='stat-counters', daemon=True).start()
+        return counts
+
+    def _current(self):
+        """Everything this process has counted since it started"""
+        with self._lock:
+            # Threaded servers start a thread per request; fold finished ones into one dict
+            live = []
+            for thread, counts in self._thread_counts:
+                if thread.is_alive():
+                    live.append((thread, counts))
+                    continue
+                for name, value in counts.items():
+                    self._retired[name] = self._retired.get(name, 0) + value
+            self._thread_counts = live
+            # dict.copy() is atomic under the GIL, so owners can keep writing meanwhile
+            snapshots = [self._retired.copy()] + [counts.copy() for _, counts in live]
+        current = {}
+        for snapshot in snapshots:
+            for name, value in snapshot.items():
+                current[name] = current.get(name, 0) + value
+        return current
+
+    def flush(self, wait=False):
+        """Add this process's unflushed deltas to the shared table"""
+        with self._flush_lock:
+            future = self._flush()
+        if wait and future:
+            future.result()
+
+    def _flush(self):
+        pending = {
+            name: value - self._flushed.get(name, 0)
+            for name, value in self._current().items()
+            if value != self._flushed.get(name, 0)
+        }
+        if not pending:
+            return None
+        self._flushed = {name: self._flushed.get(name, 0) + pending.get(name, 0)
+                         for name in set(self._flushed) | set(pending)}
+        return self.storage.write(self._add, pending)
+
+    @staticmethod
+    def _add(cursor, deltas):
+        cursor.executemany("""
+            INSERT INTO stat_counters (name, value) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET value = value + excluded.value
+        """, list(deltas.items()))
+
+    def totals(self):
+        """Totals across all processes; other workers' counts are at most a couple of intervals stale"""
+        with self._flush_lock:
+            if time.time() - self._totals_read_at >= self.flush_interval:
+                # Writes commit in order, so once this flush lands the table holds
+                # everything counted in _flushed and nothing counted after it
+                future = self._flush()
+                if future:
+                    future.result()
+                self._totals = dict(self.storage.read("SELECT name, value FROM stat_counters"))
+                self._baseline = dict(self._flushed)
+                self._totals_read_at = time.time()
+            totals = dict(self._totals)
+            baseline = self._baseline
+
+        for name, value in self._current().items():
+            totals[name] = totals.get(name, 0) + value - baseline.get(name, 0)
+        return totals
+
+    def get(self, name):
+        return self.totals().get(name, 0)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Stat Counters Error: {e}")
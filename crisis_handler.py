@@ -1,12 +1,19 @@
-import openai
+from keyword_engine import default_engine
+from metrics import metrics
+from llm_client import default_client, verdict_priority
+from prompt_builder import PromptBuilder
 
 class CrisisHandler:
-    def __init__(self):
+    def __init__(self, keywords=None, llm=None, prompts=None):
+        self.keywords = keywords or default_engine()
+        self.llm = llm or default_client()
+        self.prompts = prompts or PromptBuilder()
         self.crisis_assessment_prompt = """
 You are a crisis communication expert. Assess the crisis level of this content:
 
 Content: "{text}"
-Misinformation Analysis: {analysis}
+Misinformation Analysis:
+{analysis}
 
 Rate the crisis level from 1-10 where:
 - 1-3: Low risk (normal misinformation)
@@ -24,27 +31,37 @@ Respond with just the number (1-10).
 """
 
     def assess_crisis(self, text, detection_result):
+        # Fused detection already scored the crisis level in the same round trip
+        if detection_result.get('crisis_level') is not None:
+            return max(1, min(10, int(detection_result['crisis_level'])))
+        # Items resolved by local triage never reach the LLM
+        if detection_result.get('triage'):
+            return self._fallback_crisis_assessment(text, detection_result)
+        
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[{
-                    "role": "user",
-                    "content": self.crisis_assessment_prompt.format(
-                        text=text,
-                        analysis=str(detection_result)
-                    )
-                }],
-                temperature=0.1,
-                max_tokens=10
-            )
+            with metrics.span('crisis_llm'):
+                response = self.llm.chat(
+                    'crisis',
+                    model="gpt-4",
+                    messages=[{
+                        "role": "user",
+                        "content": self.crisis_assessment_prompt.format(
+                            text=self.prompts.claim(text, 'crisis'),
+                            analysis=self.prompts.analysis(detection_result, 'crisis')
+                        )
+                    }],
+                    temperature=0.1,
+                    max_tokens=self.prompts.max_tokens('crisis'),
+                    priority=verdict_priority(detection_result)
+                )
             crisis_level = int(response.choices[0].message.content.strip())
             return max(1, min(10, crisis_level))
         except:
+            metrics.inc('crisis_fallbacks_total', component='crisis')
             return self._fallback_crisis_assessment(text, detection_result)
 
     def _fallback_crisis_assessment(self, text, detection_result):
         base_score = 3 if detection_result['is_misinformation'] else 1
-        urgent_words = ['urgent', 'emergency', 'immediately', 'breaking', 'warning']
-        urgency_boost = sum(2 for word in urgent_words if word.lower() in text.lower())
+        urgency_boost = 2 * len(set(self.keywords.scan(text)['hits']['urgency']))
         confidence_boost = detection_result['confidence'] // 20
         return min(10, base_score + urgency_boost + confidence_boost)
@@ -0,0 +1,439 @@
+"""On-disk BM25 index over a fact-check corpus, used as retrieval context for detection
+
+    python fact_index.py ingest factchecks.jsonl
+    python fact_index.py ingest factchecks.csv --dir factcheck_index
+    python fact_index.py search "vaccine microchip"
+    python fact_index.py compact
+
+Each ingest writes an immutable segment file that readers memory-map, so every worker process shares
+the same pages and opening the index costs no parsing. A manifest lists the live segments; readers
+pick up new segments when it changes. A fact-check with the same id (or url, or claim) as an earlier
+one replaces it. Small segments are merged as they accumulate.
+
+Records need a 'claim'; 'verdict' (or 'rating'), 'text' (or 'explanation'), 'source' (or
+'publisher'), 'url', 'date' and 'id' are used when present.
+"""
+import argparse
+import bisect
+import csv
+import fcntl
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from contextlib import contextmanager
+
+MAGIC = b'FCIDX001'
+# Section name and array typecode, in file order; arrays are written in native byte order
+SECTIONS = (
+    ('term_hashes', 'Q'),
+    ('term_offsets', 'Q'),
+    ('post_docs', 'I'),
+    ('post_tfs', 'H'),
+    ('doc_lengths', 'I'),
+    ('doc_keys', 'Q'),
+    ('doc_offsets', 'Q'),
+    ('doc_blob', 'B'),
+    ('sorted_keys', 'Q')
+)
+HEADER = struct.Struct('<8sQQ' + 'QQ' * len(SECTIONS))
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can did do does for from had has have he her his how i if in into is it
+its just me more my no not of on or our she so than that the their them then there these they this to
+too up us was we were what when which who why will with you your
+""".split())
+
+FIELD_ALIASES = {
+    'claim': ('claim', 'title', 'headline'),
+    'verdict': ('verdict', 'rating', 'label'),
+    'text': ('text', 'explanation', 'summary', 'body'),
+    'source': ('source', 'publisher', 'site'),
+    'url': ('url', 'link'),
+    'date': ('date', 'published', 'published_at')
+}
+MAX_FIELD_CHARS = 2000
+
+
+def tokenize(text):
+    """Lower-cased words, keeping Indic vowel signs and viramas inside the word; stopwords dropped"""
+    words = []
+    current = []
+    for ch in unicodedata.normalize('NFKC', text or '').lower():
+        if unicodedata.category(ch)[0] in 'LMN':
+            current.append(ch)
+        elif current:
+            words.append(''.join(current))
+            current = []
+    if current:
+        words.append(''.join(current))
+    return [word for word in words if len(word) > 1 and word not in STOPWORDS]
+
+
+def hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def normalize_record(record):
+    """A raw JSONL/CSV record as an indexable fact-check, or None when it has no claim"""
+    document = {}
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            value = record.get(alias)
+            if value not in (None, ''):
+                document[field] = str(value).strip()[:MAX_FIELD_CHARS]
+                break
+    if not document.get('claim'):
+        return None
+    document['key'] = str(record.get('key') or record.get('id') or document.get('url') or document['claim'])
+    return document
+
+
+def read_records(path):
+    """Yield fact-checks from a .jsonl or .csv file"""
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith('.csv'):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            document = normalize_record(row)
+            if document:
+                yield document
+
+
+def write_segment(path, documents):
+    """Write documents (oldest first; a later duplicate key wins) as one segment file"""
+    latest = {}
+    for document in documents:
+        latest.pop(document['key'], None)
+        latest[document['key']] = document
+
+    postings = {}
+    doc_lengths = array('I')
+    doc_keys = array('Q')
+    doc_offsets = array('Q', [0])
+    doc_blob = bytearray()
+    for doc, document in enumerate(latest.values()):
+        tokens = tokenize(f"{document['claim']} {document.get('text', '')}")
+        doc_lengths.append(len(tokens))
+        doc_keys.append(hash64(document['key']))
+        doc_blob += json.dumps(document, ensure_ascii=False).encode('utf-8')
+        doc_offsets.append(len(doc_blob))
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            postings.setdefault(hash64(token), []).append((doc, min(count, 0xFFFF)))
+
+    term_hashes = array('Q', sorted(postings))
+    term_offsets = array('Q', [0])
+    post_docs = array('I')
+    post_tfs = array('H')
+    for term in term_hashes:
+        for doc, count in postings[term]:
+            post_docs.append(doc)
+            post_tfs.append(count)
+        term_offsets.append(len(post_docs))
+
+    sections = {
+        'term_hashes': term_hashes, 'term_offsets': term_offsets, 'post_docs': post_docs,
+        'post_tfs': post_tfs, 'doc_lengths': doc_lengths, 'doc_keys': doc_keys,
+        'doc_offsets': doc_offsets, 'doc_blob': bytes(doc_blob), 'sorted_keys': array('Q', sorted(doc_keys))
+    }
+    spans = []
+    offset = HEADER.size
+    payloads = []
+    for name, _ in SECTIONS:
+        data = sections[name] if isinstance(sections[name], bytes) else sections[name].tobytes()
+        # 8-byte alignment lets every section be viewed in place as its array type
+        padding = -offset % 8
+        payloads.append(b'\0' * padding + data)
+        offset += padding
+        spans.extend((offset, len(data)))
+        offset += len(data)
+
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(doc_lengths), sum(doc_lengths), *spans))
+        for payload in payloads:
+            f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return len(doc_lengths)
+
+
+class Segment:
+    """Read-only, memory-mapped view of one segment file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.doc_count, self.total_length, *spans = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a fact-check segment')
+        view = memoryview(self._map)
+        for index, (name, typecode) in enumerate(SECTIONS):
+            offset, length = spans[2 * index], spans[2 * index + 1]
+            setattr(self, name, view[offset:offset + length].cast(typecode))
+
+    def postings(self, term_hash):
+        """(start, end) of a term's postings, or None"""
+        index = bisect.bisect_left(self.term_hashes, term_hash)
+        if index < len(self.term_hashes) and self.term_hashes[index] == term_hash:
+            return self.term_offsets[index], self.term_offsets[index + 1]
+        return None
+
+    def has_key(self, key_hash):
+        index = bisect.bisect_left(self.sorted_keys, key_hash)
+        return index < len(self.sorted_keys) and self.sorted_keys[index] == key_hash
+
+    def document(self, doc):
+        return json.loads(bytes(self.doc_blob[self.doc_offsets[doc]:self.doc_offsets[doc + 1]]))
+
+    def documents(self):
+        return (self.document(doc) for doc in range(self.doc_count))
+
+
+class FactCheckIndex:
+    """BM25 retrieval over memory-mapped segments, with incremental adds and background merges"""
+
+    def __init__(self, directory='factcheck_index', top_k=3, budget=0.005, k1=1.2, b=0.75,
+                 max_segments=8, merge_factor=4, refresh_interval=1.0):
+        self.directory = directory
+        self.top_k = top_k
+        # Seconds a search may spend scoring; rarest terms are scored first, the rest dropped
+        self.budget = budget
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments
+        self.merge_factor = merge_factor
+        self.refresh_interval = refresh_interval
+
+        self._segments = ()
+        self._manifest_stamp = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.counters = {'searches': 0, 'truncated': 0, 'added': 0, 'merges': 0}
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, 'manifest.json')
+
+    def refresh(self, force=False):
+        """Reopen the segment list if another process (or this one) changed the manifest"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+        try:
+            stamp = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if stamp == self._manifest_stamp:
+            return
+        with self._lock:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                names = json.load(f)['segments']
+            opened = {segment.name: segment for segment in self._segments}
+            # Old segments are never closed explicitly; searches still holding them finish first
+            self._segments = tuple(
+                opened.get(name) or Segment(os.path.join(self.directory, name)) for name in names
+            )
+            self._manifest_stamp = stamp
+
+    def search(self, terms, k=None, budget=None):
+        """Top-k fact-checks for query terms (strings are tokenized), best first, each with a score"""
+        started = time.perf_counter()
+        deadline = started + (self.budget if budget is None else budget)
+        k = k or self.top_k
+        self.refresh()
+        segments = self._segments
+        doc_count = sum(segment.doc_count for segment in segments)
+        if not doc_count:
+            return []
+        average_length = max(1.0, sum(segment.total_length for segment in segments) / doc_count)
+
+        if isinstance(terms, str):
+            terms = tokenize(terms)
+        query = []
+        for term in dict.fromkeys(token for term in terms for token in tokenize(term)):
+            spans = [(index, span) for index, segment in enumerate(segments)
+                     for span in [segment.postings(hash64(term))] if span]
+            frequency = sum(end - start for _, (start, end) in spans)
+            if frequency:
+                query.append((frequency, term, spans))
+        # Rarest (most telling) terms first, so a blown budget only drops the weakest evidence
+        query.sort(key=lambda entry: entry[0])
+
+        scores = {}
+        truncated = False
+        # BM25 length normalization, k1 * (1 - b + b * length / average), split so the loop only adds
+        base = self.k1 * (1 - self.b)
+        slope = self.k1 * self.b / average_length
+        for frequency, term, spans in query:
+            if time.perf_counter() > deadline:
+                truncated = True
+                break
+            idf = math.log(1 + (doc_count - frequency + 0.5) / (frequency + 0.5))
+            for index, (start, end) in spans:
+                segment = segments[index]
+                lengths = segment.doc_lengths
+                for doc, tf in zip(segment.post_docs[start:end], segment.post_tfs[start:end]):
+                    key = (index, doc)
+                    scores[key] = scores.get(key, 0.0) + idf * tf * (self.k1 + 1) / (tf + base + slope * lengths[doc])
+
+        results = []
+        for (index, doc), score in self._ranked(scores, k):
+            segment = segments[index]
+            key_hash = segment.doc_keys[doc]
+            # A newer segment holding the same key has replaced this fact-check
+            if any(newer.has_key(key_hash) for newer in segments[index + 1:]):
+                continue
+            document = segment.document(doc)
+            document['score'] = round(score, 4)
+            results.append(document)
+            if len(results) >= k:
+                break
+
+        with self._lock:
+            self.counters['searches'] += 1
+            self.counters['truncated'] += truncated
+        return results
+
+    @staticmethod
+    def _ranked(scores, k):
+        """Scores best first; only sorts everything if replaced fact-checks crowd out the top"""
+        top = heapq.nlargest(4 * k, scores.items(), key=lambda item: item[1])
+        yield from top
+        if len(top) < len(scores):
+            yield from sorted(scores.items(), key=lambda item: item[1], reverse=True)[len(top):]
+
+    def add(self, records):
+        """Index new or corrected fact-checks; returns how many were accepted"""
+        documents = [document for document in map(normalize_record, records) if document]
+        if not documents:
+            return 0
+        with self._writer() as manifest:
+            name = self._next_name(manifest)
+            write_segment(os.path.join(self.directory, name), documents)
+            manifest['segments'].append(name)
+            self._save_manifest(manifest)
+            if len(manifest['segments']) > self.max_segments:
+                self._merge(manifest, manifest['segments'][-self.merge_factor:])
+        with self._lock:
+            self.counters['added'] += len(documents)
+        self.refresh(force=True)
+        return len(documents)
+
+    def ingest(self, path, batch_size=50000):
+        """Add every fact-check in a JSONL or CSV file, one segment per batch"""
+        added = 0
+        batch = []
+        for document in read_records(path):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                added += self.add(batch)
+                batch = []
+        return added + self.add(batch)
+
+    def compact(self):
+        """Merge every segment into one, dropping replaced fact-checks"""
+        with self._writer() as manifest:
+            if len(manifest['segments']) > 1:
+                self._merge(manifest, list(manifest['segments']))
+        self.refresh(force=True)
+
+    def _merge(self, manifest, names):
+        """Replace a contiguous run of segments with one; order is what decides which duplicate wins"""
+        documents = []
+        for name in names:
+            documents.extend(Segment(os.path.join(self.directory, name)).documents())
+        merged = self._next_name(manifest)
+        write_segment(os.path.join(self.directory, merged), documents)
+        position = manifest['segments'].index(names[0])
+        manifest['segments'][position:position + len(names)] = [merged]
+        self._save_manifest(manifest)
+        for name in names:
+            # Readers that still map the old file keep their pages until they let go
+            os.remove(os.path.join(self.directory, name))
+        with self._lock:
+            self.counters['merges'] += 1
+
+    @contextmanager
+    def _writer(self):
+        """Exclusive manifest access across processes"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(self.manifest_path):
+                    with open(self.manifest_path, encoding='utf-8') as f:
+                        manifest = json.load(f)
+                else:
+                    manifest = {'next': 1, 'segments': []}
+                yield manifest
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _next_name(manifest):
+        name = f"seg-{manifest['next']:08d}.fci"
+        manifest['next'] += 1
+        return name
+
+    def _save_manifest(self, manifest):
+        temporary = self.manifest_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.manifest_path)
+
+    def stats(self):
+        self.refresh()
+        segments = self._segments
+        with self._lock:
+            stats = dict(self.counters)
+        stats['segments'] = len(segments)
+        stats['documents'] = sum(segment.doc_count for segment in segments)
+        stats['bytes'] = sum(len(segment._map) for segment in segments)
+        return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', default=os.environ.get('FACTCHECK_INDEX_DIR', 'factcheck_index'))
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = commands.add_parser('ingest', help='add fact-checks from .jsonl or .csv files')
+    ingest_parser.add_argument('paths', nargs='+')
+    search_parser = commands.add_parser('search', help='print the best matching fact-checks')
+    search_parser.add_argument('query')
+    search_parser.add_argument('-k', type=int, default=5)
+    commands.add_parser('compact', help='merge all segments into one')
+    args = parser.parse_args()
+
+    index = FactCheckIndex(args.dir)
+    if args.command == 'ingest':
+        for path in args.paths:
+            print(f"Indexed {index.ingest(path)} fact-checks from {path}")
+    elif args.command == 'search':
+        started = time.perf_counter()
+        results = index.search(args.query, k=args.k, budget=1.0)
+        for result in results:
+            sys.stdout.write(json.dumps(result, ensure_ascii=False) + '\n')
+        print(f"{len(results)} results in {(time.perf_counter() - started) * 1000:.2f} ms", file=sys.stderr)
+    else:
+        index.compact()
+    print(json.dumps(index.stats()), file=sys.stderr)
@@ -0,0 +1,346 @@
+import base64
+import binascii
+import hashlib
+import io
+import math
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from metrics import metrics
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Longest edge of the copy handed to image analysis
+ANALYSIS_SIZE = 512
+CHUNK_SIZE = 64 * 1024
+HASH_SIZE = 8
+DCT_SIZE = 32
+
+# cos((2x + 1) * u * pi / 2N) for the low-frequency rows pHash keeps
+DCT_COS = [
+    [math.cos((2 * x + 1) * u * math.pi / (2 * DCT_SIZE)) for x in range(DCT_SIZE)]
+    for u in range(HASH_SIZE)
+]
+
+
+class InvalidImage(ValueError):
+    """Upload is not a decodable image"""
+
+
+class ImageTooLarge(InvalidImage):
+    pass
+
+
+def read_limited(stream, max_bytes):
+    """Read an upload stream in chunks, giving up as soon as it passes max_bytes"""
+    chunks = []
+    size = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise ImageTooLarge(f'image larger than {max_bytes} bytes')
+        chunks.append(chunk)
+    if not size:
+        raise InvalidImage('empty image upload')
+    return b''.join(chunks)
+
+
+def decode_base64(data, max_bytes):
+    """Bytes of a base64 (or data: URL) image from a JSON body, size-checked before decoding"""
+    if not isinstance(data, str):
+        raise InvalidImage('image must be a base64 string')
+    if data.startswith('data:'):
+        data = data.split(',', 1)[-1]
+    if len(data) * 3 // 4 > max_bytes:
+        raise ImageTooLarge(f'image larger than {max_bytes} bytes')
+    try:
+        raw = base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        raise InvalidImage('image is not valid base64')
+    if not raw:
+        raise InvalidImage('empty image upload')
+    return raw
+
+
+class ImageIndex:
+    """dHash/pHash index so re-posted or re-compressed images reuse earlier analyses"""
+
+    def __init__(self, storage, max_distance=6, workers=2, max_pixels=40000000, decode_timeout=10.0):
+        self.storage = storage
+        self.max_distance = max_distance
+        self.max_pixels = max_pixels
+        self.decode_timeout = decode_timeout
+
+        # Same pigeonhole banding as SimilarityIndex, over the dHash
+        band_count = max_distance + 1
+        widths = [64 // band_count + (1 if i < 64 % band_count else 0) for i in range(band_count)]
+        self.bands = []
+        shift = 0
+        for width in widths:
+            self.bands.append((shift, (1 << width) - 1))
+            shift += width
+
+        self._entries = []
+        self._digests = {}
+        self._dhashes = array('Q')
+        self._phashes = array('Q')
+        self._buckets = [{} for _ in self.bands]
+        self._lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        # Decoding and resizing are CPU-bound; keep them off the request threads
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image')
+
+        self.counters = {
+            'processed': 0,
+            'exact_matches': 0,
+            'perceptual_matches': 0,
+            'rejected': 0,
+            'unhashable': 0
+        }
+        storage.register_schema(self.init_table)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def prepare(self, raw):
+        """Decode, downscale and hash an upload off-thread, then look it up in the index"""
+        future = self._pool.submit(self._process, raw)
+        with metrics.span('image_decode'):
+            image = self._result(future, raw, time.monotonic() + self.decode_timeout)
+        return self._lookup(image)
+
+    def prepare_many(self, raws):
+        futures = [self._pool.submit(self._process, raw) for raw in raws]
+        deadline = time.monotonic() + self.decode_timeout
+        with metrics.span('image_decode'):
+            return [self._lookup(self._result(future, raw, deadline)) for future, raw in zip(futures, raws)]
+
+    def _result(self, future, raw, deadline):
+        """The processed image; one that is too slow or breaks the decoder is kept unhashed"""
+        try:
+            return future.result(timeout=max(0, deadline - time.monotonic()))
+        except InvalidImage:
+            raise
+        except TimeoutError:
+            # A decode that already started runs to completion in the pool; nobody waits on it
+            future.cancel()
+            print(f"Image Decode Error: gave up after {self.decode_timeout}s")
+        except Exception as e:
+            print(f"Image Decode Error: {e}")
+        self._count('unhashable')
+        # Like running without Pillow: only byte-identical re-posts can match
+        return self._unhashed(raw)
+
+    @staticmethod
+    def _unhashed(raw):
+        return {
+            'digest': hashlib.sha256(raw).hexdigest(),
+            'dhash': None,
+            'phash': None,
+            'data': raw,
+            'analysis': None,
+            'match': None
+        }
+
+    def _process(self, raw):
+        image = self._unhashed(raw)
+        if Image is None:
+            # Without Pillow only byte-identical re-posts are recognized
+            self._count('processed')
+            return image
+
+        try:
+            with Image.open(io.BytesIO(raw)) as source:
+                width, height = source.size
+                if width * height > self.max_pixels:
+                    raise InvalidImage(f'image has more than {self.max_pixels} pixels')
+                # JPEG can decode straight at a reduced scale
+                source.draft('RGB', (ANALYSIS_SIZE, ANALYSIS_SIZE))
+                picture = source.convert('RGB')
+        except InvalidImage:
+            self._count('rejected')
+            raise
+        except Exception as e:
+            self._count('rejected')
+            raise InvalidImage(f'unsupported or corrupt image: {e}')
+
+        picture.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+        gray = picture.convert('L')
+        image['dhash'] = self._dhash(gray)
+        image['phash'] = self._phash(gray)
+
+        buffer = io.BytesIO()
+        picture.save(buffer, format='JPEG', quality=85)
+        image['data'] = buffer.getvalue()
+        self._count('processed')
+        return image
+
+    @staticmethod
+    def _dhash(gray):
+        """Horizontal gradient signs on a 9x8 thumbnail"""
+        pixels = list(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS).getdata())
+        value = 0
+        for row in range(HASH_SIZE):
+            offset = row * (HASH_SIZE + 1)
+            for col in range(HASH_SIZE):
+                value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+        return value
+
+    @staticmethod
+    def _phash(gray):
+        """Signs of the 8x8 lowest DCT frequencies of a 32x32 thumbnail against their median"""
+        pixels = list(gray.resize((DCT_SIZE, DCT_SIZE), Image.LANCZOS).getdata())
+        rows = [pixels[y * DCT_SIZE:(y + 1) * DCT_SIZE] for y in range(DCT_SIZE)]
+        # Separable DCT-II: transform rows, then the columns of the kept frequencies
+        partial = [[sum(p * c for p, c in zip(row, cosines)) for cosines in DCT_COS] for row in rows]
+        coefficients = [
+            sum(DCT_COS[u][y] * partial[y][v] for y in range(DCT_SIZE))
+            for u in range(HASH_SIZE) for v in range(HASH_SIZE)
+        ]
+        # The DC term only tracks overall brightness
+        median = sorted(coefficients[1:])[len(coefficients) // 2 - 1]
+        value = 0
+        for coefficient in coefficients:
+            value = (value << 1) | (coefficient > median)
+        return value
+
+    def _lookup(self, image):
+        with self._lock:
+            position = self._digests.get(image['digest'])
+            if position is not None:
+                self._count('exact_matches')
+            elif image['dhash'] is not None:
+                position = self._closest(image['dhash'], image['phash'])
+                if position is not None:
+                    self._count('perceptual_matches')
+            if position is not None:
+                image['match'] = self._entries[position]
+                image['analysis'] = image['match']['image_analysis']
+        return image
+
+    def _closest(self, dhash, phash):
+        best = None
+        seen = set()
+        for buckets, (shift, mask) in zip(self._buckets, self.bands):
+            for position in buckets.get((dhash >> shift) & mask, ()):
+                if position in seen:
+                    continue
+                seen.add(position)
+                distance = (self._dhashes[position] ^ dhash).bit_count()
+                # Both hashes must agree so a shared layout alone is not a match
+                if distance > self.max_distance or (self._phashes[position] ^ phash).bit_count() > self.max_distance:
+                    continue
+                if best is None or distance < best[1]:
+                    best = (position, distance)
+        return best[0] if best else None
+
+    def key(self, image):
+        """Stable identity for verdict caching: the first-seen look-alike's digest"""
+        if image is None:
+            return None
+        return (image['match'] or image)['digest']
+
+    def add(self, image, analysis_id, simhash, image_analysis):
+        """Index a newly seen image with the analysis that first used it"""
+        if image is None or image['match'] is not None:
+            return
+        entry = {
+            'digest': image['digest'],
+            'analysis_id': analysis_id,
+            'simhash': simhash,
+            'image_analysis': image_analysis
+        }
+        if not self._remember(entry, image['dhash'], image['phash']):
+            return
+        self.storage.write(self.persist, entry, image['dhash'], image['phash'])
+
+    def _remember(self, entry, dhash, phash):
+        with self._lock:
+            if entry['digest'] in self._digests:
+                return False
+            position = len(self._entries)
+            self._entries.append(entry)
+            self._digests[entry['digest']] = position
+            if dhash is None:
+                return True
+            # Only perceptually hashed entries can be found by look-alike search
+            self._dhashes.extend([0] * (position + 1 - len(self._dhashes)))
+            self._phashes.extend([0] * (position + 1 - len(self._phashes)))
+            self._dhashes[position] = dhash
+            self._phashes[position] = phash
+            for buckets, (shift, mask) in zip(self._buckets, self.bands):
+                buckets.setdefault((dhash >> shift) & mask, array('I')).append(position)
+            return True
+
+    def load(self):
+        """Rebuild the in-memory index from the image_hashes table"""
+        with self.storage.reader() as conn:
+            rows = conn.execute("""
+                SELECT digest, dhash, phash, analysis_id, simhash, image_analysis
+                FROM image_hashes ORDER BY created_at
+            """)
+            for digest, dhash, phash, analysis_id, simhash, image_analysis in rows:
+                entry = {
+                    'digest': digest,
+                    'analysis_id': analysis_id,
+                    'simhash': self._unsigned(simhash),
+                    'image_analysis': image_analysis
+                }
+                self._remember(entry, self._unsigned(dhash), self._unsigned(phash))
+        return len(self)
+
+    def stats(self):
+        with self._counter_lock:
+            stats = dict(self.counters)
+        stats['indexed'] = len(self)
+        stats['perceptual_hashing'] = Image is not None
+        return stats
+
+    def _count(self, name):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    @classmethod
+    def persist(cls, cursor, entry, dhash, phash):
+        cursor.execute("""
+            INSERT OR IGNORE INTO image_hashes
+            (digest, dhash, phash, analysis_id, simhash, image_analysis, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            entry['digest'], cls._signed(dhash), cls._signed(phash), entry['analysis_id'],
+            cls._signed(entry['simhash']), entry['image_analysis'], time.time()
+        ))
+
+    @staticmethod
+    def init_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS image_hashes (
+                digest TEXT PRIMARY KEY,
+                dhash INTEGER,
+                phash INTEGER,
+                analysis_id INTEGER,
+                simhash INTEGER,
+                image_analysis TEXT,
+                created_at REAL NOT NULL,
+                FOREIGN KEY (analysis_id) REFERENCES analyses (id)
+            )
+        """)
+
+    @staticmethod
+    def _signed(value):
+        """SQLite integers are signed 64-bit"""
+        if value is None:
+            return None
+        return value - (1 << 64) if value >= (1 << 63) else value
+
+    @staticmethod
+    def _unsigned(value):
+        return None if value is None else value & 0xFFFFFFFFFFFFFFFF
@@ -0,0 +1,394 @@
+import fcntl
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from collections import deque
+
+
+def parse_post(line):
+    """Posts are JSON objects with at least 'text'; bare lines are treated as plain text"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        post = json.loads(line)
+    except ValueError:
+        return {'text': line}
+    if isinstance(post, str):
+        return {'text': post}
+    if isinstance(post, dict) and post.get('text'):
+        return post
+    return None
+
+
+class SourceOffsets:
+    """Byte offsets of file sources in SQLite, so a restarted source resumes instead of re-reading
+
+    Positions are saved once a post is queued for analysis: posts still queued when the
+    process stops are not re-read, and no post is analyzed twice.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        storage.register_schema(self.init_table)
+
+    def get(self, path):
+        row = self.storage.read_one("SELECT position FROM ingestion_offsets WHERE path = ?", (path,))
+        return row[0] if row else 0
+
+    def save(self, path, position):
+        self.storage.write(self._save, path, position, time.time())
+
+    @staticmethod
+    def _save(cursor, path, position, now):
+        cursor.execute(
+            "INSERT OR REPLACE INTO ingestion_offsets (path, position, updated_at) VALUES (?, ?, ?)",
+            (path, position, now)
+        )
+
+    @staticmethod
+    def init_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingestion_offsets (
+                path TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                updated_at REAL
+            )
+        """)
+
+
+class SampleSource:
+    """Emits a fixed list of posts once (the demo feed)"""
+
+    def __init__(self, posts):
+        self.posts = posts
+
+    def run(self, emit, stop):
+        for post in self.posts:
+            if stop.is_set():
+                return
+            emit(dict(post))
+
+
+class JsonlFileSource:
+    """Reads a JSONL file and keeps following it as lines are appended, resuming at the saved offset"""
+
+    def __init__(self, path, poll_interval=0.5, offsets=None):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.offsets = offsets
+
+    def run(self, emit, stop):
+        while not stop.is_set() and not os.path.exists(self.path):
+            stop.wait(self.poll_interval)
+        if stop.is_set():
+            return
+        key = os.path.abspath(self.path)
+        position = self.offsets.get(key) if self.offsets else 0
+        with open(self.path, 'rb') as f:
+            if position > os.fstat(f.fileno()).st_size:
+                # Truncated or replaced since the offset was saved
+                position = 0
+            f.seek(position)
+            partial = b''
+            while not stop.is_set():
+                line = f.readline()
+                if not line:
+                    stop.wait(self.poll_interval)
+                    continue
+                partial += line
+                if not partial.endswith(b'\n'):
+                    continue
+                position += len(partial)
+                post = parse_post(partial.decode('utf-8', errors='replace'))
+                partial = b''
+                if post:
+                    emit(post)
+                    if self.offsets:
+                        self.offsets.save(key, position)
+
+
+class DirectorySource:
+    """Reads every .jsonl/.json/.txt file dropped into a directory, once each, across restarts"""
+
+    def __init__(self, path, poll_interval=1.0, offsets=None):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.offsets = offsets
+        self.seen = set()
+
+    def run(self, emit, stop):
+        while not stop.is_set():
+            try:
+                names = sorted(os.listdir(self.path))
+            except OSError:
+                names = []
+            for name in names:
+                if name in self.seen or not name.endswith(('.jsonl', '.json', '.txt')):
+                    continue
+                self.seen.add(name)
+                if not self._read_file(os.path.join(self.path, name), emit, stop):
+                    return
+            stop.wait(self.poll_interval)
+
+    def _read_file(self, path, emit, stop):
+        """Emit the posts of one file from its saved offset; returns False if stopped part-way"""
+        key = os.path.abspath(path)
+        position = self.offsets.get(key) if self.offsets else 0
+        with open(path, 'rb') as f:
+            f.seek(position)
+            for line in f:
+                if stop.is_set():
+                    return False
+                position += len(line)
+                post = parse_post(line.decode('utf-8', errors='replace'))
+                if post:
+                    emit(post)
+                    if self.offsets:
+                        self.offsets.save(key, position)
+        return True
+
+
+class SocketSource:
+    """Line-delimited JSON over TCP; a full pipeline queue blocks the sender (backpressure)"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    def run(self, emit, stop):
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    if stop.is_set():
+                        return
+                    post = parse_post(raw.decode('utf-8', errors='replace'))
+                    if post:
+                        emit(post)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        with socketserver.ThreadingTCPServer((self.host, self.port), Handler) as server:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            stop.wait()
+            server.shutdown()
+
+
+def sources_from_spec(spec, offsets=None):
+    """Build sources from 'jsonl:/path,dir:/path,socket:host:port'; file sources resume from offsets"""
+    sources = []
+    for entry in filter(None, (part.strip() for part in (spec or '').split(','))):
+        kind, _, target = entry.partition(':')
+        if kind == 'jsonl':
+            sources.append(JsonlFileSource(target, offsets=offsets))
+        elif kind == 'dir':
+            sources.append(DirectorySource(target, offsets=offsets))
+        elif kind == 'socket':
+            host, _, port = target.rpartition(':')
+            sources.append(SocketSource(host or '0.0.0.0', int(port)))
+        else:
+            raise ValueError(f"Unknown stream source: {entry}")
+    return sources
+
+
+class Broadcaster:
+    """Ring buffer of events that any number of subscribers read without extra work per viewer"""
+
+    def __init__(self, buffer_size=200):
+        self._events = deque(maxlen=buffer_size)
+        self._next_seq = 1
+        self._condition = threading.Condition()
+
+    def publish(self, event, seq=None):
+        """Append an event; seq pins its id (it must be above every id published so far)"""
+        with self._condition:
+            if seq is not None:
+                self._next_seq = seq
+            event = dict(event, id=self._next_seq)
+            self._events.append(event)
+            self._next_seq += 1
+            self._condition.notify_all()
+
+    def events_after(self, last_seq, timeout):
+        """Events with id > last_seq, waiting up to timeout for the first one"""
+        with self._condition:
+            if self._next_seq - 1 <= last_seq:
+                self._condition.wait(timeout)
+            # Slow subscribers skip whatever has already left the buffer
+            return [event for event in self._events if event['id'] > last_seq]
+
+    @property
+    def last_seq(self):
+        with self._condition:
+            return self._next_seq - 1
+
+
+class IngestionPipeline:
+    """Sources feed a bounded queue, a worker pool analyzes posts, results are broadcast once
+
+    With storage and a lock_path, only the process holding the lock (the leader) reads the
+    sources and analyzes; it stores each event in stream_events and every process relays them
+    from there, so /stream shows the same events with the same ids from any worker. The other
+    processes retry the lock and take over if the leader exits.
+    """
+
+    def __init__(self, sources, analyze_fn, workers=4, queue_size=100, buffer_size=200,
+                 storage=None, lock_path=None, poll_interval=1.0, leader_retry=5.0):
+        self.sources = sources
+        self.analyze_fn = analyze_fn
+        self.workers = workers
+        self.buffer_size = buffer_size
+        self.broadcaster = Broadcaster(buffer_size)
+        self.storage = storage
+        self.lock_path = lock_path
+        self.poll_interval = poll_interval
+        self.leader_retry = leader_retry
+        self.leader = False
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._stored = threading.Event()
+        self._started = False
+        self._lock = threading.Lock()
+        self._lock_file = None
+
+        self.counters = {
+            'ingested': 0,
+            'analyzed': 0,
+            'failed': 0
+        }
+        if storage is not None:
+            storage.register_schema(self.init_table)
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        if self.storage is not None:
+            threading.Thread(target=self._relay, name='stream-relay', daemon=True).start()
+        threading.Thread(target=self._lead, name='stream-leader', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def subscribe(self, last_seq=0, heartbeat=15):
+        """Yield events after last_seq forever; yields None as a heartbeat when idle"""
+        self.start()
+        while not self._stop.is_set():
+            events = self.broadcaster.events_after(last_seq, heartbeat)
+            if not events:
+                yield None
+                continue
+            for event in events:
+                last_seq = event['id']
+                yield event
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['leader'] = self.leader
+        stats['queue_depth'] = self._queue.qsize()
+        stats['last_event_id'] = self.broadcaster.last_seq
+        return stats
+
+    def _emit(self, post):
+        # Blocking put: when workers fall behind, sources stop reading
+        while not self._stop.is_set():
+            try:
+                self._queue.put(post, timeout=1)
+                break
+            except queue.Full:
+                continue
+        with self._lock:
+            self.counters['ingested'] += 1
+
+    def _lead(self):
+        """Wait until this process holds the ingestion lock, then start the sources and workers"""
+        while not self._stop.is_set() and not self._acquire_leadership():
+            self._stop.wait(self.leader_retry)
+        if self._stop.is_set():
+            return
+        self.leader = True
+        for index in range(self.workers):
+            threading.Thread(target=self._work, name=f'ingest-worker-{index}', daemon=True).start()
+        for source in self.sources:
+            threading.Thread(target=self._read, args=(source,), daemon=True).start()
+
+    def _acquire_leadership(self):
+        if self.lock_path is None:
+            return True
+        lock_file = open(self.lock_path, 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        # Held for the life of the process; the kernel releases it if the process dies
+        self._lock_file = lock_file
+        return True
+
+    def _relay(self):
+        """Publish stored events in id order, starting with the recent history new clients replay"""
+        row = self.storage.read_one("SELECT MAX(id) FROM stream_events")
+        last_id = max(0, (row[0] or 0) - self.buffer_size)
+        while not self._stop.is_set():
+            try:
+                rows = self.storage.read(
+                    "SELECT id, payload FROM stream_events WHERE id > ? ORDER BY id", (last_id,)
+                )
+                for event_id, payload in rows:
+                    self.broadcaster.publish(json.loads(payload), seq=event_id)
+                    last_id = event_id
+            except Exception as e:
+                print(f"Stream relay error: {e}")
+            if self._stored.wait(self.poll_interval):
+                self._stored.clear()
+
+    def _store_event(self, cursor, event):
+        event_id = cursor.execute(
+            "INSERT INTO stream_events (payload, created_at) VALUES (?, ?)",
+            (json.dumps(event, ensure_ascii=False), time.time())
+        ).lastrowid
+        # Only the replay window is kept; relays that fall further behind skip ahead
+        cursor.execute("DELETE FROM stream_events WHERE id <= ?", (event_id - self.buffer_size,))
+        return event_id
+
+    @staticmethod
+    def init_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stream_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                created_at REAL
+            )
+        """)
+
+    def _read(self, source):
+        try:
+            source.run(self._emit, self._stop)
+        except Exception as e:
+            print(f"Stream source error ({type(source).__name__}): {e}")
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                post = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                event = self.analyze_fn(post)
+                if self.storage is None:
+                    self.broadcaster.publish(event)
+                else:
+                    self.storage.write(self._store_event, event, wait=True)
+                    self._stored.set()
+                with self._lock:
+                    self.counters['analyzed'] += 1
+            except Exception as e:
+                print(f"Stream analysis error: {e}")
+                with self._lock:
+                    self.counters['failed'] += 1
@@ -0,0 +1,234 @@
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+
+DEFAULT_PATTERNS = {
+    'scripts': {
+        'hi': [0x0900, 0x097F],
+        'ta': [0x0B80, 0x0BFF],
+        'te': [0x0C00, 0x0C7F]
+    },
+    'term_sets': {
+        'viral': ['breaking', 'urgent', 'shocking', 'share', 'retweet', 'must read'],
+        'urgency': ['urgent', 'emergency', 'immediately', 'breaking', 'warning'],
+        'key_terms': {
+            'terms': ['vaccine', 'election', 'covid', 'government', 'outbreak', 'emergency', 'breaking'],
+            'word_boundary': True
+        }
+    },
+    # Each sequence matches when its terms appear in order on the same line,
+    # i.e. the equivalent of the regex 'a.*b'
+    'risk_rules': [
+        {'category': 'health', 'harm': 9, 'sequences': [['vaccine', 'autism'], ['microchip', 'vaccine']]},
+        {'category': 'politics', 'harm': 8, 'sequences': [['election', 'rigged'], ['voting', 'fraud']]},
+        {'category': 'disaster', 'harm': 9, 'sequences': [['water', 'poison'], ['outbreak', 'cover']]},
+        {'category': 'conspiracy', 'harm': 7, 'sequences': [['5g', 'coronavirus'], ['chemtrail']]}
+    ]
+}
+
+
+class KeywordEngine:
+    """Aho-Corasick scanner that extracts every heuristic feature in one pass over the text"""
+
+    def __init__(self, patterns=None, cache_size=256):
+        patterns = patterns or DEFAULT_PATTERNS
+        self.scripts = {lang: tuple(bounds) for lang, bounds in patterns.get('scripts', {}).items()}
+        self.risk_rules = patterns.get('risk_rules', [])
+
+        self.term_sets = {}
+        for name, spec in patterns.get('term_sets', {}).items():
+            if isinstance(spec, list):
+                spec = {'terms': spec}
+            self.term_sets[name] = {
+                'terms': [term.lower() for term in spec.get('terms', [])],
+                'word_boundary': bool(spec.get('word_boundary', False))
+            }
+
+        # Every distinct term gets one id no matter how many sets or rules use it
+        terms = []
+        for spec in self.term_sets.values():
+            terms.extend(spec['terms'])
+        for rule in self.risk_rules:
+            for sequence in rule['sequences']:
+                terms.extend(term.lower() for term in sequence)
+        self.terms = list(dict.fromkeys(terms))
+        self._set_members = {}
+        for name, spec in self.term_sets.items():
+            for term in spec['terms']:
+                self._set_members.setdefault(term, []).append(name)
+        self._build_automaton()
+
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, path):
+        """Load extra patterns from a JSON file with the same shape as DEFAULT_PATTERNS
+
+        Terms are appended to the default set of the same name, new sets and
+        scripts are added, and risk rules are checked after the defaults.
+        """
+        with open(path, encoding='utf-8') as f:
+            extra = json.load(f)
+
+        scripts = dict(DEFAULT_PATTERNS['scripts'])
+        scripts.update(extra.get('scripts', {}))
+
+        term_sets = {}
+        for name, spec in list(DEFAULT_PATTERNS['term_sets'].items()) + list(extra.get('term_sets', {}).items()):
+            if isinstance(spec, list):
+                spec = {'terms': spec}
+            merged = term_sets.setdefault(name, {'terms': [], 'word_boundary': False})
+            merged['terms'] = merged['terms'] + list(spec.get('terms', []))
+            merged['word_boundary'] = spec.get('word_boundary', merged['word_boundary'])
+
+        return cls({
+            'scripts': scripts,
+            'term_sets': term_sets,
+            'risk_rules': DEFAULT_PATTERNS['risk_rules'] + extra.get('risk_rules', [])
+        })
+
+    def _build_automaton(self):
+        self._goto = [{}]
+        self._output = [[]]
+        for term_id, term in enumerate(self.terms):
+            state = 0
+            for ch in term:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(term_id)
+
+        # Breadth-first failure links; depth-1 states keep the root as their failure state
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(ch, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def scan(self, text):
+        """Return script counts, term-set hits and the first matching risk rule for text"""
+        text = text or ''
+        with self._lock:
+            cached = self._cache.get(text)
+            if cached is not None:
+                self._cache.move_to_end(text)
+                return cached
+
+        result = self._scan(text)
+
+        with self._lock:
+            self._cache[text] = result
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _scan(self, text):
+        lowered = text.lower()
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        scripts = list(self.scripts.items())
+        script_counts = {lang: 0 for lang in self.scripts}
+        lowest_script = min((bounds[0] for _, bounds in scripts), default=0x110000)
+
+        matches = []
+        state = 0
+        line = 0
+        for position, ch in enumerate(lowered):
+            code = ord(ch)
+            if code >= lowest_script:
+                for lang, (low, high) in scripts:
+                    if low <= code <= high:
+                        script_counts[lang] += 1
+                        break
+
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                for term_id in output[state]:
+                    matches.append((term_id, position - len(self.terms[term_id]) + 1, position + 1, line))
+            if ch == '\n':
+                line += 1
+
+        return {
+            'script_counts': script_counts,
+            'hits': self._term_set_hits(lowered, matches),
+            'risk': self._match_risk(matches)
+        }
+
+    def _term_set_hits(self, lowered, matches):
+        """Matched terms per set in order of occurrence (duplicates kept, like re.findall)"""
+        hits = {name: [] for name in self.term_sets}
+        for term_id, start, end, _ in sorted(matches, key=lambda m: m[1]):
+            term = self.terms[term_id]
+            for name in self._set_members.get(term, []):
+                if self.term_sets[name]['word_boundary'] and not self._on_word_boundary(lowered, start, end):
+                    continue
+                hits[name].append(term)
+        return hits
+
+    @staticmethod
+    def _on_word_boundary(text, start, end):
+        def is_word(ch):
+            return ch.isalnum() or ch == '_'
+        before = start > 0 and is_word(text[start - 1])
+        after = end < len(text) and is_word(text[end])
+        return not before and not after
+
+    def _match_risk(self, matches):
+        if not self.risk_rules or not matches:
+            return None
+
+        occurrences = {}
+        for term_id, start, end, line in matches:
+            occurrences.setdefault(self.terms[term_id], []).append((start, end, line))
+
+        for rule in self.risk_rules:
+            for sequence in rule['sequences']:
+                if self._sequence_matches([term.lower() for term in sequence], occurrences):
+                    return {'category': rule['category'], 'harm': rule['harm']}
+        return None
+
+    @staticmethod
+    def _sequence_matches(sequence, occurrences):
+        if any(term not in occurrences for term in sequence):
+            return False
+        # Greedy earliest placement per line decides whether the terms occur in order
+        for start, end, line in occurrences[sequence[0]]:
+            cursor = end
+            for term in sequence[1:]:
+                following = [o for o in occurrences[term] if o[2] == line and o[0] >= cursor]
+                if not following:
+                    break
+                cursor = min(following)[1]
+            else:
+                return True
+        return False
+
+
+_default_engine = None
+_default_lock = threading.Lock()
+
+
+def default_engine():
+    """Process-wide engine, loaded from KEYWORD_PATTERNS_PATH when set"""
+    global _default_engine
+    with _default_lock:
+        if _default_engine is None:
+            path = os.environ.get('KEYWORD_PATTERNS_PATH')
+            _default_engine = KeywordEngine.from_config(path) if path else KeywordEngine()
+        return _default_engine
@@ -0,0 +1,517 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import openai
+
+from metrics import metrics
+from prompt_builder import estimate_tokens
+
+
+class LLMUnavailable(Exception):
+    """The API could not answer in time; callers should use their local fallback"""
+
+
+class CircuitOpenError(LLMUnavailable):
+    pass
+
+
+class DeadlineExceeded(LLMUnavailable):
+    pass
+
+
+class LoadShed(LLMUnavailable):
+    """Low-priority call dropped because the LLM queue is running behind"""
+
+
+# Worth another attempt; anything else (bad request, auth) fails straight away.
+# Looked up by name so a mismatched openai release (1.x has no openai.error) still imports;
+# its calls then fail at call time and fall back to the local heuristics.
+_OPENAI_ERRORS = getattr(openai, 'error', None)
+TRANSIENT_ERRORS = tuple(
+    error for error in (
+        getattr(_OPENAI_ERRORS, name, None) for name in
+        ('Timeout', 'APIError', 'APIConnectionError', 'RateLimitError', 'ServiceUnavailableError', 'TryAgain')
+    ) if isinstance(error, type)
+) + (DeadlineExceeded,)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets one probe through per cooldown"""
+
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+DEFAULT_PRIORITY = 5
+
+
+def priority_band(priority):
+    if priority >= 8:
+        return 'high'
+    return 'normal' if priority >= 4 else 'low'
+
+
+def verdict_priority(result):
+    """Queue priority (0-10) for follow-up calls on an existing verdict"""
+    return max(result.get('harm_potential') or 0, result.get('spread_risk') or 0)
+
+
+class Ticket:
+    """One admitted call; release it (or leave the with-block) to free its slot"""
+
+    def __init__(self, scheduler, tokens):
+        self.scheduler = scheduler
+        self.tokens = tokens
+        # Actual tokens used, when known, so the budget is charged for real usage
+        self.used = None
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.scheduler._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _Waiter:
+    __slots__ = ('priority', 'tokens', 'enqueued', 'state')
+
+    def __init__(self, priority, tokens, enqueued):
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued = enqueued
+        self.state = 'waiting'
+
+
+class LLMScheduler:
+    """Admits LLM calls highest priority first under a global concurrency and tokens-per-minute budget
+
+    Calls below `shed_below` raise LoadShed rather than wait more than `shed_after` seconds,
+    and are refused on arrival while the oldest queued call has already waited that long.
+    Shedding swaps LLM verdicts for heuristic ones, so it is off (shed_below=0) unless asked for.
+    """
+
+    def __init__(self, max_concurrency=16, tokens_per_minute=0, shed_after=2.0, shed_below=0):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.shed_after = shed_after
+        self.shed_below = shed_below
+        self.active = 0
+        self.tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._depth = {'high': 0, 'normal': 0, 'low': 0}
+        self._cond = threading.Condition()
+
+        self.counters = {
+            'admitted': 0,
+            'queued': 0,
+            'shed': 0,
+            'timed_out': 0
+        }
+
+    def admit(self, purpose, priority=None, tokens=0, deadline_at=None):
+        """Block until the call may run; returns a Ticket, or raises LoadShed / DeadlineExceeded"""
+        priority, band, tokens = self._request(priority, tokens)
+        sheddable = priority < self.shed_below
+
+        with self._cond:
+            now = time.monotonic()
+            if not self._depth_total() and self._fits(tokens, now):
+                return self._grant(purpose, band, tokens, 0.0)
+            if sheddable and self._behind(now):
+                self._shed(purpose, band)
+
+            waiter = _Waiter(priority, tokens, now)
+            heapq.heappush(self._queue, (-priority, next(self._sequence), waiter))
+            self._depth[band] += 1
+            self.counters['queued'] += 1
+            self._publish_depth()
+            try:
+                while True:
+                    refill_wait = self._dispatch(now)
+                    if waiter.state == 'granted':
+                        return self._grant(purpose, band, tokens, now - waiter.enqueued, queued=True)
+
+                    if deadline_at is not None and now >= deadline_at:
+                        self.counters['timed_out'] += 1
+                        raise DeadlineExceeded('Queued for the LLM past the call deadline')
+                    if sheddable and now - waiter.enqueued >= self.shed_after:
+                        self._shed(purpose, band)
+
+                    limits = [refill_wait]
+                    if deadline_at is not None:
+                        limits.append(deadline_at - now)
+                    if sheddable:
+                        limits.append(waiter.enqueued + self.shed_after - now)
+                    limits = [limit for limit in limits if limit is not None]
+                    self._cond.wait(min(limits) if limits else None)
+                    now = time.monotonic()
+            finally:
+                if waiter.state == 'waiting':
+                    waiter.state = 'cancelled'
+                    self._depth[band] -= 1
+                    self._publish_depth()
+                    # The head may have been holding the others back; let them re-check
+                    self._cond.notify_all()
+
+    def try_admit(self, purpose, priority=None, tokens=0):
+        """A Ticket if the call fits right now and nobody is queued, else None; never waits"""
+        priority, band, tokens = self._request(priority, tokens)
+        with self._cond:
+            if self._depth_total() or not self._fits(tokens, time.monotonic()):
+                return None
+            return self._grant(purpose, band, tokens, 0.0)
+
+    def _request(self, priority, tokens):
+        priority = DEFAULT_PRIORITY if priority is None else max(0, min(10, int(priority)))
+        # A call bigger than the whole budget would never fit; let it through on a full bucket
+        tokens = min(tokens, self.tokens_per_minute) if self.tokens_per_minute else 0
+        return priority, priority_band(priority), tokens
+
+    def _dispatch(self, now):
+        """Grant queued calls in priority order while the budget allows; returns seconds until
+        the head fits the token budget, or None"""
+        granted = False
+        refill_wait = None
+        while self._queue:
+            waiter = self._queue[0][2]
+            if waiter.state != 'waiting':
+                heapq.heappop(self._queue)
+                continue
+            if not self._fits(waiter.tokens, now):
+                if self.max_concurrency and self.active >= self.max_concurrency:
+                    break
+                refill_wait = (waiter.tokens - self.tokens) * 60.0 / self.tokens_per_minute
+                break
+            heapq.heappop(self._queue)
+            waiter.state = 'granted'
+            self._depth[priority_band(waiter.priority)] -= 1
+            self._reserve(waiter.tokens)
+            granted = True
+        if granted:
+            self._publish_depth()
+            self._cond.notify_all()
+        return refill_wait
+
+    def _fits(self, tokens, now):
+        if self.max_concurrency and self.active >= self.max_concurrency:
+            return False
+        if not self.tokens_per_minute:
+            return True
+        self.tokens = min(self.tokens_per_minute,
+                          self.tokens + (now - self.updated) * self.tokens_per_minute / 60.0)
+        self.updated = now
+        return self.tokens >= tokens
+
+    def _reserve(self, tokens):
+        self.active += 1
+        self.tokens -= tokens
+
+    def _grant(self, purpose, band, tokens, waited, queued=False):
+        if not queued:
+            self._reserve(tokens)
+        self.counters['admitted'] += 1
+        metrics.observe('crisis_llm_queue_wait_seconds', waited, band=band)
+        metrics.set('crisis_llm_in_flight', self.active)
+        return Ticket(self, tokens)
+
+    def _shed(self, purpose, band):
+        self.counters['shed'] += 1
+        metrics.inc('crisis_llm_shed_total', purpose=purpose, band=band)
+        raise LoadShed(f'LLM queue is behind; shedding {band}-priority {purpose} call')
+
+    def _behind(self, now):
+        oldest = min((entry[2].enqueued for entry in self._queue if entry[2].state == 'waiting'), default=now)
+        return now - oldest >= self.shed_after
+
+    def _release(self, ticket):
+        with self._cond:
+            self.active -= 1
+            if self.tokens_per_minute and ticket.used is not None:
+                # Reservations are estimates; settle the difference against real usage
+                self.tokens = min(self.tokens_per_minute, self.tokens + ticket.tokens - ticket.used)
+            metrics.set('crisis_llm_in_flight', self.active)
+            self._dispatch(time.monotonic())
+
+    def _depth_total(self):
+        return sum(self._depth.values())
+
+    def _publish_depth(self):
+        for band, depth in self._depth.items():
+            metrics.set('crisis_llm_queue_depth', depth, band=band)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self.counters)
+            stats['in_flight'] = self.active
+            stats['queue_depth'] = dict(self._depth)
+            stats['tokens_available'] = round(self.tokens) if self.tokens_per_minute else None
+        for band in self._depth:
+            wait = metrics.mean('crisis_llm_queue_wait_seconds', band=band)
+            stats.setdefault('mean_wait_seconds', {})[band] = None if wait is None else round(wait, 4)
+        return stats
+
+
+class LLMClient:
+    """Shared ChatCompletion caller with deadlines, jittered retries, hedging and a circuit breaker"""
+
+    def __init__(self, timeout=20.0, retries=2, backoff=0.5, hedge_after=6.0,
+                 failure_threshold=5, cooldown=30.0, max_workers=64, scheduler=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # Seconds to wait on the first attempt before racing a duplicate; 0 disables hedging
+        self.hedge_after = hedge_after
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        # Decides who goes first when calls outnumber the concurrency / token budget
+        self.scheduler = scheduler or LLMScheduler(max_concurrency=0)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm')
+
+        self.counters = {
+            'calls': 0,
+            'retries': 0,
+            'hedges': 0,
+            'hedges_skipped': 0,
+            'hedge_wins': 0,
+            'deadline_exceeded': 0,
+            'circuit_rejections': 0,
+            'streams': 0
+        }
+        self._lock = threading.Lock()
+
+    def chat(self, purpose, messages, deadline=None, priority=None, **params):
+        """ChatCompletion.create within `deadline` seconds, or raise (LLMUnavailable when degraded)
+
+        `priority` (0-10, higher first) orders the call in the scheduler queue; time spent queued
+        counts against the deadline.
+        """
+        deadline_at = time.monotonic() + (deadline or self.timeout)
+        budget = self._token_budget(messages, params)
+        with self.scheduler.admit(purpose, priority, budget, deadline_at) as ticket:
+            response = self._call(
+                purpose, lambda: self._attempt(messages, params, deadline_at, purpose, priority, budget), deadline_at
+            )
+            ticket.used = (response.get('usage') or {}).get('total_tokens')
+        metrics.record_openai(purpose, response)
+        return response
+
+    def stream(self, purpose, messages, deadline=None, priority=None, **params):
+        """Yield completion text pieces as they arrive; retries only happen before the first one"""
+        deadline_at = time.monotonic() + (deadline or self.timeout)
+
+        def open_stream():
+            chunks = iter(self._create(messages, dict(params, stream=True), deadline_at))
+            return self._next_delta(chunks), chunks
+
+        # The slot is held until the stream ends, like any other call in flight
+        with self.scheduler.admit(purpose, priority, self._token_budget(messages, params), deadline_at) as ticket:
+            yield from self._stream(purpose, messages, open_stream, deadline_at, ticket)
+
+    def _stream(self, purpose, messages, open_stream, deadline_at, ticket):
+        first, chunks = self._call(purpose, open_stream, deadline_at)
+        self._count('streams')
+        pieces = [first]
+        try:
+            if first:
+                yield first
+            while True:
+                if time.monotonic() > deadline_at:
+                    self._count('deadline_exceeded')
+                    raise DeadlineExceeded('OpenAI stream exceeded its deadline')
+                delta = self._next_delta(chunks)
+                if not delta:
+                    break
+                pieces.append(delta)
+                yield delta
+        except Exception:
+            metrics.record_openai(purpose, outcome='error')
+            raise
+
+        # Streamed responses carry no usage block, so tokens are estimated locally
+        usage = {
+            'prompt_tokens': estimate_tokens(' '.join(message['content'] for message in messages)),
+            'completion_tokens': estimate_tokens(''.join(pieces))
+        }
+        ticket.used = usage['prompt_tokens'] + usage['completion_tokens']
+        metrics.record_openai(purpose, {'usage': usage})
+
+    @staticmethod
+    def _token_budget(messages, params):
+        """Tokens to reserve up front: the prompt plus the most the completion may use"""
+        return estimate_tokens(' '.join(message['content'] for message in messages)) + params.get('max_tokens', 0)
+
+    @staticmethod
+    def _next_delta(chunks):
+        """Next non-empty content delta from a chunk iterator, or '' at the end"""
+        for chunk in chunks:
+            choices = chunk.get('choices') or [{}]
+            content = (choices[0].get('delta') or {}).get('content')
+            if content:
+                return content
+        return ''
+
+    def _call(self, purpose, call, deadline_at):
+        """Run call() under the breaker with jittered retries on transient errors"""
+        self._count('calls')
+        if not self.breaker.allow():
+            self._count('circuit_rejections')
+            metrics.record_openai(purpose, outcome='circuit_open')
+            raise CircuitOpenError('OpenAI circuit breaker is open')
+
+        attempt = 0
+        while True:
+            try:
+                result = call()
+            except TRANSIENT_ERRORS as e:
+                self.breaker.record_failure()
+                metrics.record_openai(purpose, outcome='error')
+                remaining = deadline_at - time.monotonic()
+                if attempt >= self.retries or remaining <= 0:
+                    raise
+                if self.breaker.state == 'open':
+                    raise CircuitOpenError(f'OpenAI circuit breaker opened: {e}')
+                # Full jitter keeps retrying workers from stampeding the API together
+                time.sleep(min(remaining, random.uniform(0, self.backoff * 2 ** attempt)))
+                attempt += 1
+                self._count('retries')
+                continue
+            except Exception:
+                # The API answered, just not usefully; that says nothing about its health
+                self.breaker.record_success()
+                metrics.record_openai(purpose, outcome='error')
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    def _attempt(self, messages, params, deadline_at, purpose, priority, budget):
+        futures = [self._pool.submit(self._create, messages, params, deadline_at)]
+        first = futures[0]
+        hedged = not self.hedge_after
+        while True:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                self._count('deadline_exceeded')
+                raise DeadlineExceeded('OpenAI call exceeded its deadline')
+
+            done, _ = wait(futures, timeout=remaining if hedged else min(remaining, self.hedge_after),
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                futures.remove(future)
+                if future.exception() is None:
+                    if future is not first:
+                        self._count('hedge_wins')
+                    return future.result()
+                if not futures:
+                    raise future.exception()
+
+            if not done and not hedged:
+                # A slow first attempt races a duplicate; the loser finishes unobserved
+                hedged = True
+                # The duplicate needs its own slot and tokens, and is skipped rather than queued
+                # when the scheduler has none to spare
+                ticket = self.scheduler.try_admit(purpose, priority, budget)
+                if ticket is None:
+                    self._count('hedges_skipped')
+                    continue
+                self._count('hedges')
+                hedge = self._pool.submit(self._create, messages, params, deadline_at)
+                hedge.add_done_callback(lambda future: self._settle(ticket, future))
+                futures.append(hedge)
+
+    @staticmethod
+    def _settle(ticket, future):
+        if not future.cancelled() and future.exception() is None:
+            ticket.used = (future.result().get('usage') or {}).get('total_tokens')
+        ticket.release()
+
+    @staticmethod
+    def _create(messages, params, deadline_at):
+        return openai.ChatCompletion.create(
+            messages=messages,
+            request_timeout=max(0.5, deadline_at - time.monotonic()),
+            **params
+        )
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['circuit_state'] = self.breaker.state
+        stats['circuit_opened'] = self.breaker.times_opened
+        stats['scheduler'] = self.scheduler.stats()
+        return stats
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def default_client():
+    """Process-wide client configured from LLM_* environment variables"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = LLMClient(
+                timeout=float(os.environ.get('LLM_TIMEOUT', 20)),
+                retries=int(os.environ.get('LLM_RETRIES', 2)),
+                hedge_after=float(os.environ.get('LLM_HEDGE_AFTER', 6)),
+                failure_threshold=int(os.environ.get('LLM_BREAKER_THRESHOLD', 5)),
+                cooldown=float(os.environ.get('LLM_BREAKER_COOLDOWN', 30)),
+                scheduler=LLMScheduler(
+                    max_concurrency=int(os.environ.get('LLM_MAX_CONCURRENCY', 16)),
+                    tokens_per_minute=int(os.environ.get('LLM_TOKENS_PER_MINUTE', 0)),
+                    shed_after=float(os.environ.get('LLM_SHED_AFTER', 2)),
+                    shed_below=int(os.environ.get('LLM_SHED_BELOW', 0))
+                )
+            )
+        return _default_client
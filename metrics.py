@@ -0,0 +1,167 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans sub-millisecond local stages up to slow GPT-4 calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DESCRIPTIONS = {
+    'crisis_http_request_duration_seconds': ('histogram', 'Time to build a response, by Flask endpoint'),
+    'crisis_stage_duration_seconds': ('histogram', 'Time spent in each pipeline stage'),
+    'crisis_openai_requests_total': ('counter', 'OpenAI call attempts by purpose and outcome (ok/error/circuit_open)'),
+    'crisis_openai_tokens_total': ('counter', 'OpenAI tokens used by purpose, kind and originating endpoint'),
+    'crisis_prompt_tokens_trimmed_total': ('counter', 'Estimated claim tokens cut to fit prompt budgets'),
+    'crisis_verdict_lookups_total': ('counter', 'Where each verdict came from'),
+    'crisis_fallbacks_total': ('counter', 'Local heuristic fallbacks used instead of an LLM answer'),
+    'crisis_alerts_total': ('counter', 'Emergency alerts delivered to authorities or dead-lettered'),
+    'crisis_llm_queue_depth': ('gauge', 'LLM calls waiting for admission, by priority band'),
+    'crisis_llm_in_flight': ('gauge', 'LLM calls admitted and not yet finished'),
+    'crisis_llm_queue_wait_seconds': ('histogram', 'Time LLM calls waited for admission, by priority band'),
+    'crisis_llm_shed_total': ('counter', 'Low-priority LLM calls shed to local fallbacks while the queue was behind')
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram; callers hold the registry lock"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Process-wide counters and latency histograms, exported in Prometheus text format"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._scope = threading.local()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, stage):
+        """Time a block into crisis_stage_duration_seconds{stage=...}, even if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('crisis_stage_duration_seconds', time.perf_counter() - start, stage=stage)
+
+    def set_endpoint(self, endpoint):
+        """Attribute OpenAI usage on this thread to an endpoint until reset with None"""
+        self._scope.endpoint = endpoint
+
+    def current_endpoint(self):
+        return getattr(self._scope, 'endpoint', None) or 'background'
+
+    @contextmanager
+    def endpoint_scope(self, endpoint):
+        previous = getattr(self._scope, 'endpoint', None)
+        self._scope.endpoint = endpoint
+        try:
+            yield
+        finally:
+            self._scope.endpoint = previous
+
+    def bind_endpoint(self, fn):
+        """Wrap fn so work handed to a pool thread is attributed to the submitting endpoint"""
+        endpoint = self.current_endpoint()
+
+        def bound(*args, **kwargs):
+            with self.endpoint_scope(endpoint):
+                return fn(*args, **kwargs)
+        return bound
+
+    def record_openai(self, purpose, response=None, outcome='ok'):
+        """Count one chat completion attempt and the tokens it reports"""
+        self.inc('crisis_openai_requests_total', purpose=purpose, outcome=outcome)
+        usage = response.get('usage') if response is not None else None
+        if usage:
+            endpoint = self.current_endpoint()
+            for kind in ('prompt', 'completion'):
+                self.inc('crisis_openai_tokens_total', usage.get(f'{kind}_tokens', 0),
+                         purpose=purpose, kind=kind, endpoint=endpoint)
+
+    def mean(self, name, **labels):
+        """Average observed value for one labelled histogram, or None before any observation"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if not histogram or not histogram.count:
+                return None
+            return histogram.sum / histogram.count
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(
+                (key, list(h.counts), h.sum, h.count) for key, h in self._histograms.items()
+            )
+
+        lines = []
+        described = set()
+
+        def header(name):
+            if name not in described and name in DESCRIPTIONS:
+                kind, text = DESCRIPTIONS[name]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+            described.add(name)
+
+        for (name, labels), value in counters + gauges:
+            header(name)
+            lines.append(f"{name}{self._format_labels(labels)} {value}")
+
+        for (name, labels), counts, total, count in histograms:
+            header(name)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{self._format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{self._format_labels(labels)} {total}")
+            lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ''
+        escaped = (
+            (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for key, value in labels
+        )
+        return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+metrics = Metrics()
@@ -0,0 +1,187 @@
+"""Local stand-in for the OpenAI chat completions API, for load tests without network access
+
+    python mock_openai_server.py --port 8089 --latency 0.8 --jitter 0.3 --error-rate 0.02
+
+Point the app at it with OPENAI_API_BASE=http://127.0.0.1:8089/v1 and any OPENAI_API_KEY.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DETECTION_VERDICT = {
+    'is_misinformation': True,
+    'confidence': 87,
+    'credibility_score': 22,
+    'spread_risk': 7,
+    'harm_potential': 8,
+    'indicators': ['emotional_language', 'unverified_claim'],
+    'explanation': 'Mock verdict: the claim contradicts official guidance.',
+    'sources': [],
+    'category': 'health',
+    'language_detected': 'en',
+    'manipulation_type': 'fake_urgency',
+    'recommended_action': 'alert',
+    'crisis_level': 7
+}
+
+BENIGN_VERDICT = dict(
+    DETECTION_VERDICT,
+    is_misinformation=False, confidence=82, credibility_score=85, spread_risk=2, harm_potential=1,
+    indicators=[], explanation='Mock verdict: routine, verifiable information.', category='other',
+    manipulation_type='none', recommended_action='ignore', crisis_level=1
+)
+
+COUNTER_NARRATIVE = (
+    "Official health and emergency authorities have found no evidence for this claim. "
+    "Please rely on verified sources and avoid forwarding unconfirmed messages."
+)
+
+BENIGN_MARKERS = ('weather', 'forecast', 'university', 'study', 'schedule', 'bulletin')
+
+
+class MockOpenAI:
+    """Latency, jitter and error injection settings plus request counters"""
+
+    def __init__(self, latency=0.5, jitter=0.2, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'errors': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+    def delay(self):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.latency + jitter)
+
+    def should_fail(self):
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def reply_for(self, messages):
+        prompt = messages[-1].get('content', '') if messages else ''
+        if 'Respond with just the number' in prompt:
+            return '7'
+        if 'Respond in JSON format' in prompt:
+            content = prompt.split('Content:', 1)[-1][:500].lower()
+            verdict = BENIGN_VERDICT if any(marker in content for marker in BENIGN_MARKERS) else DETECTION_VERDICT
+            return json.dumps(verdict)
+        if 'alert message' in prompt:
+            return 'ALERT: Mock alert for emergency responders. Verify and counter immediately.'
+        return COUNTER_NARRATIVE
+
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            with mock.lock:
+                mock.counters['requests'] += 1
+
+            time.sleep(mock.delay())
+
+            if not self.path.endswith('/chat/completions'):
+                return self._json(404, {'error': {'message': 'not found', 'type': 'invalid_request_error'}})
+            if mock.should_fail():
+                with mock.lock:
+                    mock.counters['errors'] += 1
+                return self._json(503, {'error': {'message': 'mock overload', 'type': 'server_error'}})
+
+            messages = body.get('messages', [])
+            content = mock.reply_for(messages)
+            prompt_tokens = sum(len(m.get('content', '')) for m in messages) // 4
+            completion_tokens = max(1, len(content) // 4)
+            with mock.lock:
+                mock.counters['prompt_tokens'] += prompt_tokens
+                mock.counters['completion_tokens'] += completion_tokens
+
+            if body.get('stream'):
+                return self._stream(body, content)
+
+            self._json(200, {
+                'id': f'chatcmpl-mock-{mock.counters["requests"]}',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'gpt-4'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens
+                }
+            })
+
+        def do_GET(self):
+            if self.path == '/stats':
+                with mock.lock:
+                    return self._json(200, dict(mock.counters))
+            self._json(404, {'error': {'message': 'not found'}})
+
+        def _json(self, status, payload):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, body, content):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            for word in content.split(' '):
+                chunk = {
+                    'object': 'chat.completion.chunk',
+                    'model': body.get('model', 'gpt-4'),
+                    'choices': [{'index': 0, 'delta': {'content': word + ' '}, 'finish_reason': None}]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(mock.latency / 50)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+    return Handler
+
+
+def start_mock_server(port=0, **settings):
+    """Start the mock in a background thread; returns (server, mock, base_url)"""
+    mock = MockOpenAI(**settings)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(mock))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, mock, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.5, help='mean seconds per completion')
+    parser.add_argument('--jitter', type=float, default=0.2, help='uniform +/- seconds around the mean')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server, mock, base_url = start_mock_server(
+        args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed
+    )
+    print(f"Mock OpenAI listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,228 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+
+class CounterNarrativeWorker:
+    """Generates counter-narratives off the request thread and stores them per analysis
+
+    Generation is streamed: followers of a pending analysis see the text grow piece by piece,
+    and every analysis sharing the claim shares that one stream.
+    """
+
+    def __init__(self, response_gen, storage, max_workers=4, max_cached_claims=1024, poll_interval=1.0):
+        self.response_gen = response_gen
+        self.storage = storage
+        self.max_cached_claims = max_cached_claims
+        # Generations in other worker processes send no wake-up, so waiters re-read their status
+        self.poll_interval = poll_interval
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='narrative')
+        self._condition = threading.Condition()
+        self._claim_cache = OrderedDict()
+        self._recent = OrderedDict()
+        self._inflight = {}
+        # claim_key -> pieces streamed so far, for generations running in this process;
+        # the list object itself identifies the generation that owns the entry
+        self._live = {}
+        self._live_claims = {}
+        storage.register_schema(self.init_table)
+
+        self.counters = {
+            'submitted': 0,
+            'generated': 0,
+            'reused': 0,
+            'failed': 0
+        }
+
+    def submit(self, analysis_id, text, detection_result, claim_key, matched_analysis_id=None):
+        """Queue generation for an analysis; returns the narrative straight away if the claim has one"""
+        if matched_analysis_id is not None:
+            claim_key = self._claim_key_of(matched_analysis_id) or claim_key
+
+        narrative = self._cached_narrative(claim_key)
+        if narrative is not None:
+            self._store([analysis_id], claim_key, 'ready', narrative)
+            with self._condition:
+                self.counters['reused'] += 1
+            return {'status': 'ready', 'counter_narrative': narrative}
+
+        self._store([analysis_id], claim_key, 'pending', None)
+        with self._condition:
+            self.counters['submitted'] += 1
+            # Analyses of a claim already being generated share that generation
+            self._live_claims[analysis_id] = claim_key
+            waiters = self._inflight.get(claim_key)
+            if waiters is not None:
+                waiters.append(analysis_id)
+                return {'status': 'pending', 'counter_narrative': None}
+            pieces = []
+            self._inflight[claim_key] = [analysis_id]
+            self._live[claim_key] = pieces
+
+        self._pool.submit(metrics.bind_endpoint(self._generate), claim_key, pieces, text, detection_result)
+        return {'status': 'pending', 'counter_narrative': None}
+
+    def get(self, analysis_id):
+        """Current {'status', 'counter_narrative'} for an analysis, or None if nothing was queued"""
+        with self._condition:
+            entry = self._recent.get(analysis_id)
+        if entry is not None:
+            return dict(entry)
+
+        row = self.storage.read_one(
+            "SELECT status, counter_narrative FROM counter_narratives WHERE analysis_id = ?", (analysis_id,)
+        )
+        if not row:
+            return None
+        return {'status': row[0], 'counter_narrative': row[1]}
+
+    def wait(self, analysis_id, timeout, poll_interval=None):
+        """Block until the narrative for analysis_id is no longer pending or timeout elapses"""
+        poll_interval = poll_interval or self.poll_interval
+        deadline = time.time() + timeout
+        entry = self.get(analysis_id)
+        while entry is not None and entry['status'] == 'pending':
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            with self._condition:
+                recent = self._recent.get(analysis_id)
+                if recent is None or recent['status'] == 'pending':
+                    self._condition.wait(min(poll_interval, remaining))
+            entry = self.get(analysis_id)
+        return entry
+
+    def follow(self, analysis_id, timeout, keepalive=15):
+        """Yield ('piece', text) as the narrative streams in, None every `keepalive` idle seconds,
+        then ('done', entry) once it is finished, failed or the timeout elapses"""
+        deadline = time.time() + timeout
+        sent = 0
+        last_output = time.time()
+        while True:
+            with self._condition:
+                claim_key = self._live_claims.get(analysis_id)
+                pieces = self._live.get(claim_key) if claim_key is not None else None
+                if pieces is not None and len(pieces) == sent and time.time() < deadline:
+                    self._condition.wait(min(keepalive, max(0, deadline - time.time())))
+                # A generation that finished meanwhile still holds its last pieces in this list
+                running = pieces is not None and self._live.get(claim_key) is pieces
+                fresh = pieces[sent:] if pieces is not None else []
+            if fresh:
+                sent += len(fresh)
+                last_output = time.time()
+                yield 'piece', ''.join(fresh)
+            elif running and time.time() - last_output >= keepalive:
+                last_output = time.time()
+                yield None
+            if not running or time.time() >= deadline:
+                break
+
+        # Finished here, or generated in another worker process: poll the stored status,
+        # keeping the client alive, until it is no longer pending
+        while True:
+            entry = self.wait(analysis_id, min(keepalive, max(0, deadline - time.time())), keepalive)
+            if entry is None or entry['status'] != 'pending' or time.time() >= deadline:
+                break
+            yield None
+        yield 'done', entry
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self.counters)
+            stats['in_flight'] = len(self._inflight)
+        return stats
+
+    def _generate(self, claim_key, pieces, text, detection_result):
+        try:
+            for piece in self.response_gen.stream_counter_narrative(text, detection_result):
+                with self._condition:
+                    pieces.append(piece)
+                    self._condition.notify_all()
+            narrative = ''.join(pieces).strip()
+            status = 'ready' if narrative else 'failed'
+        except Exception as e:
+            print(f"Counter-narrative Error: {e}")
+            narrative = None
+            status = 'failed'
+
+        with self._condition:
+            # Waiters and live buffer go together, so a submit landing after this starts a fresh
+            # generation instead of joining (or losing its buffer to) the one that just finished
+            analysis_ids = []
+            if self._live.get(claim_key) is pieces:
+                del self._live[claim_key]
+                analysis_ids = self._inflight.pop(claim_key, [])
+            for analysis_id in analysis_ids:
+                self._live_claims.pop(analysis_id, None)
+            if status == 'ready':
+                self.counters['generated'] += 1
+                self._claim_cache[claim_key] = narrative
+                self._claim_cache.move_to_end(claim_key)
+                while len(self._claim_cache) > self.max_cached_claims:
+                    self._claim_cache.popitem(last=False)
+            else:
+                self.counters['failed'] += 1
+
+        self._store(analysis_ids, claim_key, status, narrative)
+        with self._condition:
+            self._condition.notify_all()
+
+    def _cached_narrative(self, claim_key):
+        with self._condition:
+            narrative = self._claim_cache.get(claim_key)
+            if narrative is not None:
+                self._claim_cache.move_to_end(claim_key)
+                return narrative
+
+        row = self.storage.read_one("""
+            SELECT counter_narrative FROM counter_narratives
+            WHERE claim_key = ? AND status = 'ready'
+            ORDER BY completed_at DESC LIMIT 1
+        """, (claim_key,))
+        return row[0] if row else None
+
+    def _claim_key_of(self, analysis_id):
+        row = self.storage.read_one(
+            "SELECT claim_key FROM counter_narratives WHERE analysis_id = ?", (analysis_id,)
+        )
+        return row[0] if row else None
+
+    def _store(self, analysis_ids, claim_key, status, narrative):
+        completed_at = None if status == 'pending' else time.time()
+        with self._condition:
+            for analysis_id in analysis_ids:
+                self._recent[analysis_id] = {'status': status, 'counter_narrative': narrative}
+                self._recent.move_to_end(analysis_id)
+            while len(self._recent) > 4 * self.max_cached_claims:
+                self._recent.popitem(last=False)
+
+        self.storage.write(self._persist, [
+            (analysis_id, claim_key, status, narrative, completed_at) for analysis_id in analysis_ids
+        ])
+
+    @staticmethod
+    def _persist(cursor, rows):
+        cursor.executemany("""
+            INSERT OR REPLACE INTO counter_narratives
+                (analysis_id, claim_key, status, counter_narrative, completed_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
+
+    @staticmethod
+    def init_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS counter_narratives (
+                analysis_id INTEGER PRIMARY KEY,
+                claim_key TEXT NOT NULL,
+                status TEXT NOT NULL,
+                counter_narrative TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                completed_at REAL,
+                FOREIGN KEY (analysis_id) REFERENCES analyses (id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_counter_narratives_claim ON counter_narratives (claim_key, status)")
@@ -0,0 +1,93 @@
+import re
+import threading
+
+from metrics import metrics
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Input budget for the claim text and output cap, per kind of call
+BUDGETS = {
+    'detection': {'claim': 700, 'output': 1000},
+    'crisis': {'claim': 300, 'output': 10},
+    'counter_narrative': {'claim': 400, 'output': 250},
+    'alert': {'claim': 250, 'output': 150}
+}
+
+# The only detection fields each downstream prompt actually uses
+ANALYSIS_FIELDS = {
+    'crisis': ['is_misinformation', 'confidence', 'category', 'harm_potential', 'spread_risk',
+               'manipulation_type', 'explanation'],
+    'counter_narrative': ['category', 'manipulation_type', 'explanation', 'sources']
+}
+
+EXPLANATION_TOKENS = 80
+MAX_SOURCES = 2
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Token count via tiktoken when installed, otherwise a script-aware estimate"""
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is not None:
+        with _encoding_lock:
+            if _encoding is None:
+                _encoding = tiktoken.get_encoding('cl100k_base')
+        return len(_encoding.encode(text))
+    # ~4 ASCII characters per token; Indic scripts come out near one token per character
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+class PromptBuilder:
+    """Fits the variable parts of each prompt into a per-call token budget"""
+
+    def __init__(self, budgets=None):
+        self.budgets = budgets or BUDGETS
+
+    def claim(self, text, purpose):
+        """Claim text squeezed to the purpose's budget, keeping its beginning and end"""
+        text = re.sub(r'[ \t]+', ' ', text or '')
+        text = re.sub(r'\s*\n\s*', '\n', text).strip()
+        budget = self.budgets[purpose]['claim']
+        tokens = estimate_tokens(text)
+        if tokens <= budget:
+            return text
+
+        # Forwards state the claim up front and the call to action at the end
+        keep = int(len(text) * budget / tokens)
+        head = text[:keep * 2 // 3].rsplit(' ', 1)[0]
+        tail = text[len(text) - keep // 3:].split(' ', 1)[-1]
+        metrics.inc('crisis_prompt_tokens_trimmed_total', tokens - budget, purpose=purpose)
+        return f"{head} [...] {tail}"
+
+    def analysis(self, detection_result, purpose):
+        """Only the detection fields the purpose needs, as compact key: value lines"""
+        lines = []
+        for field in ANALYSIS_FIELDS[purpose]:
+            value = detection_result.get(field)
+            if value is None or value == [] or value == '':
+                continue
+            if field == 'explanation':
+                value = self._shorten(value, EXPLANATION_TOKENS)
+            elif field == 'sources':
+                value = ', '.join(value[:MAX_SOURCES])
+            lines.append(f"{field}: {value}")
+        return '\n'.join(lines)
+
+    def max_tokens(self, purpose):
+        return self.budgets[purpose]['output']
+
+    @staticmethod
+    def _shorten(text, budget):
+        text = str(text)
+        tokens = estimate_tokens(text)
+        if tokens <= budget:
+            return text
+        return text[:int(len(text) * budget / tokens)].rsplit(' ', 1)[0] + '...'
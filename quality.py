@@ -0,0 +1,206 @@
+import time
+
+HOUR = 3600
+
+ROLLING_WINDOWS = {
+    '24h': 24 * HOUR,
+    '7d': 7 * 24 * HOUR,
+    '30d': 30 * 24 * HOUR
+}
+# Feedback types that say whether the verdict itself was right
+VERDICT_FEEDBACK = {'correct': 1, 'incorrect': 0}
+# Slices kept in quality_counts; 'source' and 'scoring' show whether triage, caching or fused prompts cost accuracy
+SLICES = ('all', 'category', 'source', 'scoring')
+
+
+class QualityTracker:
+    """Accuracy, per-category precision/recall and calibration, updated as verdict feedback arrives
+
+    Misinformation is the positive class. Each analysis counts once: its latest correct/incorrect
+    feedback replaces any earlier one, so the counts never need a rescan of user_feedback.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        storage.register_schema(self.init_table)
+
+    @staticmethod
+    def init_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS feedback_labels (
+                analysis_id INTEGER PRIMARY KEY,
+                correct INTEGER NOT NULL,
+                bucket INTEGER NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS quality_counts (
+                slice_kind TEXT NOT NULL,
+                slice TEXT NOT NULL,
+                tp INTEGER NOT NULL DEFAULT 0,
+                fp INTEGER NOT NULL DEFAULT 0,
+                tn INTEGER NOT NULL DEFAULT 0,
+                fn INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (slice_kind, slice)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS calibration_buckets (
+                bucket INTEGER PRIMARY KEY,
+                judged INTEGER NOT NULL DEFAULT 0,
+                correct INTEGER NOT NULL DEFAULT 0,
+                confidence_sum REAL NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS quality_rollups (
+                bucket INTEGER PRIMARY KEY,
+                judged INTEGER NOT NULL DEFAULT 0,
+                correct INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+    def record(self, cursor, analysis_id, feedback_type, timestamp=None):
+        """Fold one piece of feedback in; call inside the transaction that stores it"""
+        correct = VERDICT_FEEDBACK.get(feedback_type)
+        if correct is None:
+            return
+        analysis = cursor.execute("""
+            SELECT is_misinformation, confidence, category, verdict_source, scoring_mode
+            FROM analyses WHERE id = ?
+        """, (analysis_id,)).fetchone()
+        if analysis is None:
+            return
+
+        previous = cursor.execute(
+            "SELECT correct, bucket FROM feedback_labels WHERE analysis_id = ?", (analysis_id,)
+        ).fetchone()
+        if previous is not None:
+            if previous[0] == correct:
+                return
+            # A changed mind: take the earlier label back out before counting the new one
+            self._apply(cursor, analysis, previous[0], previous[1], -1)
+
+        bucket = int((timestamp or time.time()) // HOUR) * HOUR
+        self._apply(cursor, analysis, correct, bucket, 1)
+        cursor.execute(
+            "INSERT OR REPLACE INTO feedback_labels (analysis_id, correct, bucket) VALUES (?, ?, ?)",
+            (analysis_id, correct, bucket)
+        )
+
+    @staticmethod
+    def _apply(cursor, analysis, correct, bucket, delta):
+        is_misinformation, confidence, category, verdict_source, scoring_mode = analysis
+        predicted = bool(is_misinformation)
+        actual = predicted if correct else not predicted
+        cell = ('tp' if actual else 'fp') if predicted else ('fn' if actual else 'tn')
+
+        slices = {
+            'all': 'all',
+            'category': category or 'unknown',
+            'source': verdict_source or 'unknown',
+            'scoring': scoring_mode or 'unknown'
+        }
+        for kind in SLICES:
+            cursor.execute(f"""
+                INSERT INTO quality_counts (slice_kind, slice, {cell}) VALUES (?, ?, ?)
+                ON CONFLICT (slice_kind, slice) DO UPDATE SET {cell} = {cell} + excluded.{cell}
+            """, (kind, slices[kind], delta))
+
+        confidence = confidence or 0
+        cursor.execute("""
+            INSERT INTO calibration_buckets (bucket, judged, correct, confidence_sum) VALUES (?, ?, ?, ?)
+            ON CONFLICT (bucket) DO UPDATE SET
+                judged = judged + excluded.judged,
+                correct = correct + excluded.correct,
+                confidence_sum = confidence_sum + excluded.confidence_sum
+        """, (min(9, max(0, int(confidence) // 10)), delta, delta * correct, delta * confidence))
+        cursor.execute("""
+            INSERT INTO quality_rollups (bucket, judged, correct) VALUES (?, ?, ?)
+            ON CONFLICT (bucket) DO UPDATE SET
+                judged = judged + excluded.judged,
+                correct = correct + excluded.correct
+        """, (bucket, delta, delta * correct))
+
+    def summary(self, now=None):
+        """Everything the dashboard shows; reads a few hundred rows at most"""
+        now = now or time.time()
+        with self.storage.reader() as conn:
+            counts = conn.execute("SELECT slice_kind, slice, tp, fp, tn, fn FROM quality_counts").fetchall()
+            calibration = conn.execute(
+                "SELECT bucket, judged, correct, confidence_sum FROM calibration_buckets WHERE judged > 0 ORDER BY bucket"
+            ).fetchall()
+            rolling = {
+                name: conn.execute(
+                    "SELECT COALESCE(SUM(judged), 0), COALESCE(SUM(correct), 0) FROM quality_rollups WHERE bucket >= ?",
+                    (now - seconds,)
+                ).fetchone()
+                for name, seconds in ROLLING_WINDOWS.items()
+            }
+
+        slices = {kind: {} for kind in SLICES}
+        for kind, name, tp, fp, tn, fn in counts:
+            if tp + fp + tn + fn:
+                slices[kind][name] = self._scores(tp, fp, tn, fn)
+        overall = slices['all'].get('all') or self._scores(0, 0, 0, 0)
+
+        judged = sum(row[1] for row in calibration)
+        buckets = []
+        calibration_error = 0.0
+        for bucket, bucket_judged, correct, confidence_sum in calibration:
+            mean_confidence = confidence_sum / bucket_judged
+            accuracy = 100.0 * correct / bucket_judged
+            # Expected calibration error: confidence/accuracy gap weighted by each bucket's share
+            calibration_error += abs(mean_confidence - accuracy) * bucket_judged / judged
+            buckets.append({
+                'confidence': f'{bucket * 10}-{bucket * 10 + 10}',
+                'judged': bucket_judged,
+                'mean_confidence': round(mean_confidence, 1),
+                'accuracy': round(accuracy, 1)
+            })
+
+        return {
+            'judged': overall['judged'],
+            'accuracy': overall['accuracy'],
+            'precision': overall['precision'],
+            'recall': overall['recall'],
+            'rolling': {
+                name: {'judged': window_judged, 'accuracy': self._rate(window_correct, window_judged)}
+                for name, (window_judged, window_correct) in rolling.items()
+            },
+            'categories': slices['category'],
+            'verdict_sources': slices['source'],
+            'scoring_modes': slices['scoring'],
+            'calibration': buckets,
+            'calibration_error': round(calibration_error, 1) if judged else None
+        }
+
+    @classmethod
+    def _scores(cls, tp, fp, tn, fn):
+        return {
+            'judged': tp + fp + tn + fn,
+            'accuracy': cls._rate(tp + tn, tp + fp + tn + fn),
+            'precision': cls._rate(tp, tp + fp),
+            'recall': cls._rate(tp, tp + fn)
+        }
+
+    @staticmethod
+    def _rate(numerator, denominator):
+        return round(100.0 * numerator / denominator, 1) if denominator else None
+
+    def backfill(self):
+        """Replay existing verdict feedback the first time the tables are empty"""
+        if self.storage.read_one("SELECT 1 FROM feedback_labels LIMIT 1"):
+            return
+        if not self.storage.read_one(
+                "SELECT 1 FROM user_feedback WHERE feedback_type IN ('correct', 'incorrect') LIMIT 1"):
+            return
+        self.storage.write(self._backfill, wait=True)
+
+    def _backfill(self, cursor):
+        rows = cursor.execute("""
+            SELECT analysis_id, feedback_type, CAST(strftime('%s', timestamp) AS INTEGER) FROM user_feedback
+            WHERE feedback_type IN ('correct', 'incorrect') ORDER BY id
+        """).fetchall()
+        for analysis_id, feedback_type, timestamp in rows:
+            self.record(cursor, analysis_id, feedback_type, timestamp)
@@ -0,0 +1,281 @@
+"""Re-score stored analyses or a JSONL corpus with the current prompts and models
+
+    python rescore.py --source db --output rescored.jsonl --diffs diffs.jsonl --processes 4 --rate 10
+    python rescore.py --source posts.jsonl --output rescored.jsonl --diffs diffs.jsonl --scoring fused
+
+Items stream through a bounded window of chunks, so memory stays flat however large the corpus is.
+Progress is checkpointed after every chunk written; rerunning the same command resumes where an
+interrupted run stopped. JSONL inputs may carry the old verdict ('is_misinformation', 'crisis_level',
+'category') to be diffed against; the db source diffs against the stored analyses.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from storage import Storage, DB_PATH
+
+DIFF_FIELDS = ('is_misinformation', 'crisis_level', 'category')
+
+_detector = None
+_crisis_handler = None
+_threads = 1
+
+
+def db_items(storage, after_id=0, page_size=1000):
+    """(position, item) for every stored analysis after `after_id`, read in keyset-paginated pages"""
+    while True:
+        rows = storage.read("""
+            SELECT a.id, t.text, a.is_misinformation, a.crisis_level, a.category
+            FROM analyses a JOIN analysis_texts t ON t.id = a.id
+            WHERE a.id > ? ORDER BY a.id LIMIT ?
+        """, (after_id, page_size))
+        if not rows:
+            return
+        for analysis_id, text, is_misinformation, crisis_level, category in rows:
+            stored = {
+                'is_misinformation': None if is_misinformation is None else bool(is_misinformation),
+                'crisis_level': crisis_level,
+                'category': category
+            }
+            yield analysis_id, {'id': analysis_id, 'text': text, 'context': 'social_media', 'stored': stored}
+        after_id = rows[-1][0]
+
+
+def jsonl_items(path, offset=0, line_number=0):
+    """(position, item) per non-empty line, where position is (line number, byte offset after it)"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for raw in f:
+            offset += len(raw)
+            line_number += 1
+            line = raw.decode('utf-8').strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = {'text': line}
+            if isinstance(record, str):
+                record = {'text': record}
+            if not isinstance(record, dict) or not record.get('text'):
+                continue
+            stored = {field: record[field] for field in DIFF_FIELDS if field in record}
+            yield (line_number, offset), {
+                'id': record.get('id', line_number),
+                'text': record['text'],
+                'context': record.get('context', 'social_media'),
+                'stored': stored or None
+            }
+
+
+def init_worker(scoring, threads):
+    """Build one detector per worker process, reused for every chunk it scores"""
+    global _detector, _crisis_handler, _threads
+    from detection import MisinformationDetector
+    from crisis_handler import CrisisHandler
+    from fact_index import FactCheckIndex
+
+    # Every worker maps the same segment files, so the index is loaded once in the page cache
+    fact_index = FactCheckIndex(os.environ.get('FACTCHECK_INDEX_DIR', 'factcheck_index'))
+    _detector = MisinformationDetector(crisis_scoring=scoring, fact_index=fact_index)
+    _crisis_handler = CrisisHandler(llm=_detector.llm)
+    _threads = threads
+
+
+def score_chunk(items):
+    """Detection plus crisis level for a list of {'text', 'context'}; results in input order"""
+    detections = _detector.analyze_many(items, max_workers=_threads)
+    with ThreadPoolExecutor(max_workers=_threads) as pool:
+        levels = list(pool.map(
+            lambda pair: _crisis_handler.assess_crisis(pair[0]['text'], pair[1]), zip(items, detections)
+        ))
+    return [{
+        'is_misinformation': detection['is_misinformation'],
+        'confidence': detection['confidence'],
+        'category': detection.get('category', 'unknown'),
+        'crisis_level': crisis_level,
+        'emergency_level': detection.get('emergency_level', 'low'),
+        'is_fallback': bool(detection.get('is_fallback'))
+    } for detection, crisis_level in zip(detections, levels)]
+
+
+def diff_verdict(stored, result):
+    """{field: [old, new]} for every field that changed, or None"""
+    if not stored:
+        return None
+    changes = {}
+    for field in DIFF_FIELDS:
+        if field in stored and stored[field] != result[field]:
+            changes[field] = [stored[field], result[field]]
+    return changes or None
+
+
+class Checkpoint:
+    """Last fully written position plus output sizes, replaced atomically after every chunk"""
+
+    def __init__(self, path, run):
+        self.path = path
+        self.state = {'run': run, 'position': None, 'outputs': {}, 'totals': {}}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get('run') != run:
+                raise SystemExit(f"{path} belongs to a different run ({saved.get('run')}); remove it to start over")
+            self.state = saved
+
+    def save(self):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+
+
+def open_output(path, checkpoint):
+    """Open an output for appending, cut back to what the checkpoint says was committed"""
+    size = checkpoint.state['outputs'].get(path, 0)
+    handle = open(path, 'ab')
+    handle.truncate(size)
+    handle.seek(size)
+    return handle
+
+
+class Pacer:
+    """Spaces out submissions so the run stays under `rate` items per second"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.next_at = time.monotonic()
+
+    def wait(self, count):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + count / self.rate
+
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run(args):
+    run_id = {'source': args.source, 'scoring': args.scoring, 'output': args.output, 'diffs': args.diffs}
+    checkpoint = Checkpoint(args.checkpoint or args.output + '.checkpoint', run_id)
+    position = checkpoint.state['position']
+    totals = checkpoint.state['totals'] or {'scored': 0, 'changed': 0, 'fallbacks': 0, 'flipped': 0}
+
+    if args.source == 'db':
+        items = db_items(Storage(args.db), after_id=position or 0)
+    else:
+        line_number, offset = position or (0, 0)
+        items = jsonl_items(args.source, offset=offset, line_number=line_number)
+    if args.limit:
+        items = (item for index, item in zip(range(args.limit), items))
+
+    outputs = {'results': open_output(args.output, checkpoint)}
+    if args.diffs:
+        outputs['diffs'] = open_output(args.diffs, checkpoint)
+
+    started = time.monotonic()
+    resumed_from = totals['scored']
+    pacer = Pacer(args.rate)
+    in_flight = {}
+    finished = {}
+    next_index = 0
+
+    def commit(chunk, results):
+        """Append one chunk's results and diffs, then move the checkpoint past it"""
+        result_lines = []
+        diff_lines = []
+        for (item_position, item), result in zip(chunk, results):
+            result_lines.append(json.dumps({'id': item['id'], **result}, ensure_ascii=False))
+            totals['scored'] += 1
+            if result['is_fallback']:
+                # A heuristic fallback says nothing about the new prompts; leave it out of the diffs
+                totals['fallbacks'] += 1
+                continue
+            changes = diff_verdict(item['stored'], result)
+            if changes:
+                totals['changed'] += 1
+                totals['flipped'] += 'is_misinformation' in changes
+                diff_lines.append(json.dumps({'id': item['id'], 'changes': changes}, ensure_ascii=False))
+
+        outputs['results'].write(('\n'.join(result_lines) + '\n').encode('utf-8'))
+        if 'diffs' in outputs and diff_lines:
+            outputs['diffs'].write(('\n'.join(diff_lines) + '\n').encode('utf-8'))
+        for name, handle in outputs.items():
+            handle.flush()
+            os.fsync(handle.fileno())
+            checkpoint.state['outputs'][args.output if name == 'results' else args.diffs] = handle.tell()
+        checkpoint.state['position'] = chunk[-1][0]
+        checkpoint.state['totals'] = totals
+        checkpoint.save()
+
+    def settle(block):
+        """Collect finished chunks and write them strictly in input order"""
+        nonlocal next_index
+        done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED) if block else (
+            [future for future in in_flight if future.done()], None)
+        for future in done:
+            index, chunk = in_flight.pop(future)
+            finished[index] = (chunk, future.result())
+        while next_index in finished:
+            commit(*finished.pop(next_index))
+            next_index += 1
+            if next_index % args.progress_every == 0:
+                elapsed = time.monotonic() - started
+                rate = (totals['scored'] - resumed_from) / elapsed if elapsed else 0
+                print(f"scored {totals['scored']} ({rate:.1f}/s), changed {totals['changed']}, "
+                      f"fallbacks {totals['fallbacks']}", file=sys.stderr)
+
+    # A bounded window of chunks in flight keeps memory flat on any corpus size
+    window = args.processes * 2
+    with ProcessPoolExecutor(max_workers=args.processes, initializer=init_worker,
+                             initargs=(args.scoring, args.threads)) as pool:
+        for index, chunk in enumerate(chunked(items, args.chunk_size)):
+            while len(in_flight) >= window:
+                settle(block=True)
+            pacer.wait(len(chunk))
+            payload = [{'text': item['text'], 'context': item['context']} for _, item in chunk]
+            in_flight[pool.submit(score_chunk, payload)] = (index, chunk)
+            settle(block=False)
+        while in_flight:
+            settle(block=True)
+
+    for handle in outputs.values():
+        handle.close()
+    return totals
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', default='db', help="'db' for stored analyses, or a JSONL file path")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--output', required=True, help='JSONL file of new verdicts')
+    parser.add_argument('--diffs', help='JSONL file of verdicts that changed')
+    parser.add_argument('--checkpoint', help='defaults to <output>.checkpoint')
+    parser.add_argument('--scoring', choices=['separate', 'fused'],
+                        default=os.environ.get('CRISIS_SCORING_MODE', 'separate'))
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='concurrent OpenAI calls per process')
+    parser.add_argument('--chunk-size', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=0, help='max items per second across all processes (0 = unlimited)')
+    parser.add_argument('--limit', type=int, help='stop after this many items (this invocation)')
+    parser.add_argument('--progress-every', type=int, default=20, help='chunks between progress lines')
+    args = parser.parse_args()
+
+    totals = run(args)
+    print(json.dumps(totals))
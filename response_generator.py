@@ -1,12 +1,19 @@
-import openai
+import time
+
+from metrics import metrics
+from llm_client import default_client, verdict_priority
+from prompt_builder import PromptBuilder
 
 class ResponseGenerator:
-    def __init__(self):
+    def __init__(self, llm=None, prompts=None):
+        self.llm = llm or default_client()
+        self.prompts = prompts or PromptBuilder()
         self.counter_narrative_prompt = """
 You are a crisis communication expert. Generate a factual counter-narrative to address this misinformation:
 
 Original misinformation: "{text}"
-Analysis: {analysis}
+Analysis:
+{analysis}
 
 Create a clear, factual response that:
 1. Addresses the false claims directly
@@ -32,38 +39,71 @@ Create a brief alert (under 100 words) that includes:
 Alert:
 """
 
-    def generate_counter_narrative(self, text, analysis):
+    def generate_counter_narrative(self, text, analysis, raise_errors=False):
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[{
-                    "role": "user",
-                    "content": self.counter_narrative_prompt.format(
-                        text=text,
-                        analysis=str(analysis)
-                    )
-                }],
-                temperature=0.3,
-                max_tokens=250
-            )
+            with metrics.span('counter_narrative_llm'):
+                response = self.llm.chat(
+                    'counter_narrative',
+                    model="gpt-4",
+                    messages=self._counter_narrative_messages(text, analysis),
+                    temperature=0.3,
+                    max_tokens=self.prompts.max_tokens('counter_narrative'),
+                    priority=verdict_priority(analysis)
+                )
             return response.choices[0].message.content.strip()
         except Exception as e:
+            if raise_errors:
+                raise
             return f"Unable to generate counter-narrative. Error: {str(e)}"
 
-    def generate_alert_message(self, text, crisis_level):
-        try:
-            response = openai.ChatCompletion.create(
+    def stream_counter_narrative(self, text, analysis):
+        """Yield the counter-narrative piece by piece as GPT-4 produces it; errors propagate"""
+        started = time.perf_counter()
+        first = True
+        with metrics.span('counter_narrative_llm'):
+            for piece in self.llm.stream(
+                'counter_narrative',
                 model="gpt-4",
-                messages=[{
-                    "role": "user",
-                    "content": self.alert_message_prompt.format(
-                        text=text,
-                        crisis_level=crisis_level
-                    )
-                }],
-                temperature=0.2,
-                max_tokens=150
+                messages=self._counter_narrative_messages(text, analysis),
+                temperature=0.3,
+                max_tokens=self.prompts.max_tokens('counter_narrative'),
+                priority=verdict_priority(analysis)
+            ):
+                if first:
+                    metrics.observe('crisis_stage_duration_seconds', time.perf_counter() - started,
+                                    stage='counter_narrative_first_token')
+                    first = False
+                yield piece
+
+    def _counter_narrative_messages(self, text, analysis):
+        return [{
+            "role": "user",
+            "content": self.counter_narrative_prompt.format(
+                text=self.prompts.claim(text, 'counter_narrative'),
+                analysis=self.prompts.analysis(analysis, 'counter_narrative')
             )
+        }]
+
+    def generate_alert_message(self, text, crisis_level, raise_errors=False):
+        try:
+            with metrics.span('alert_llm'):
+                response = self.llm.chat(
+                    'alert',
+                    model="gpt-4",
+                    messages=[{
+                        "role": "user",
+                        "content": self.alert_message_prompt.format(
+                            text=self.prompts.claim(text, 'alert'),
+                            crisis_level=crisis_level
+                        )
+                    }],
+                    temperature=0.2,
+                    max_tokens=self.prompts.max_tokens('alert'),
+                    # Alerts go ahead of everything else
+                    priority=10
+                )
             return response.choices[0].message.content.strip()
         except Exception as e:
+            if raise_errors:
+                raise
             return f"Unable to generate alert. Error: {str(e)}"
@@ -0,0 +1,155 @@
+import math
+import time
+
+MINUTE = 60
+HOUR = 3600
+
+WINDOWS = {
+    '1h': HOUR,
+    '24h': 24 * HOUR,
+    '7d': 7 * 24 * HOUR
+}
+
+
+class DashboardRollups:
+    """Per-minute and per-hour aggregates of analyses, maintained as rows are written"""
+
+    def __init__(self, storage, minute_retention=8 * 24 * HOUR):
+        self.storage = storage
+        self.minute_retention = minute_retention
+        self._last_prune = 0
+        storage.register_schema(self.init_table)
+
+    @staticmethod
+    def init_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_rollups (
+                granularity INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                analyses INTEGER NOT NULL DEFAULT 0,
+                misinformation INTEGER NOT NULL DEFAULT 0,
+                confidence_sum REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (granularity, bucket)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS category_rollups (
+                granularity INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                category TEXT NOT NULL,
+                analyses INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (granularity, bucket, category)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS category_totals (
+                category TEXT PRIMARY KEY,
+                analyses INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+    def record(self, cursor, detection_result, timestamp=None):
+        """Fold one analysis into the rollups; call inside the transaction that inserts it"""
+        timestamp = timestamp or time.time()
+        category = detection_result.get('category', 'unknown')
+        misinformation = 1 if detection_result['is_misinformation'] else 0
+        confidence = detection_result['confidence'] or 0
+
+        for granularity in (MINUTE, HOUR):
+            bucket = int(timestamp // granularity) * granularity
+            cursor.execute("""
+                INSERT INTO analysis_rollups (granularity, bucket, analyses, misinformation, confidence_sum)
+                VALUES (?, ?, 1, ?, ?)
+                ON CONFLICT (granularity, bucket) DO UPDATE SET
+                    analyses = analyses + 1,
+                    misinformation = misinformation + excluded.misinformation,
+                    confidence_sum = confidence_sum + excluded.confidence_sum
+            """, (granularity, bucket, misinformation, confidence))
+            cursor.execute("""
+                INSERT INTO category_rollups (granularity, bucket, category, analyses)
+                VALUES (?, ?, ?, 1)
+                ON CONFLICT (granularity, bucket, category) DO UPDATE SET analyses = analyses + 1
+            """, (granularity, bucket, category))
+
+        cursor.execute("""
+            INSERT INTO category_totals (category, analyses) VALUES (?, 1)
+            ON CONFLICT (category) DO UPDATE SET analyses = analyses + 1
+        """, (category,))
+
+        # Hourly rows cover long windows, so minute rows only need to outlive the longest one
+        if timestamp - self._last_prune >= HOUR:
+            cutoff = timestamp - self.minute_retention
+            cursor.execute("DELETE FROM analysis_rollups WHERE granularity = ? AND bucket < ?", (MINUTE, cutoff))
+            cursor.execute("DELETE FROM category_rollups WHERE granularity = ? AND bucket < ?", (MINUTE, cutoff))
+            # A rolled-back prune is retried by the next analysis rather than an hour later
+            self.storage.after_commit(lambda: self._pruned(timestamp))
+
+    def _pruned(self, timestamp):
+        self._last_prune = max(self._last_prune, timestamp)
+
+    def window(self, seconds, now=None):
+        """Totals for the trailing window, reading at most ~120 minute rows plus one row per hour"""
+        now = now or time.time()
+        where, params = self._window_filter(now - seconds, now)
+
+        with self.storage.reader() as conn:
+            analyses, misinformation, confidence_sum = conn.execute(
+                f"SELECT COALESCE(SUM(analyses), 0), COALESCE(SUM(misinformation), 0), "
+                f"COALESCE(SUM(confidence_sum), 0) FROM analysis_rollups WHERE {where}", params
+            ).fetchone()
+            categories = dict(conn.execute(
+                f"SELECT category, SUM(analyses) FROM category_rollups WHERE {where} GROUP BY category", params
+            ).fetchall())
+
+        return {
+            'analyses': analyses,
+            'misinformation': misinformation,
+            'avg_confidence': round(confidence_sum / analyses, 1) if analyses else 0,
+            'categories': categories
+        }
+
+    def category_totals(self):
+        return dict(self.storage.read("SELECT category, analyses FROM category_totals"))
+
+    def _window_filter(self, start, end):
+        # Whole hours come from hourly buckets, the ragged edges from minute buckets
+        hour_start = math.ceil(start / HOUR) * HOUR
+        hour_end = int(end // HOUR) * HOUR
+        minute_start = int(start // MINUTE) * MINUTE
+
+        if hour_start < hour_end:
+            segments = [
+                (MINUTE, minute_start, hour_start),
+                (HOUR, hour_start, hour_end),
+                (MINUTE, hour_end, end + MINUTE)
+            ]
+        else:
+            segments = [(MINUTE, minute_start, end + MINUTE)]
+
+        where = ' OR '.join('(granularity = ? AND bucket >= ? AND bucket < ?)' for _ in segments)
+        params = [value for segment in segments for value in segment]
+        return where, params
+
+    def backfill(self):
+        """Build rollups from existing analyses the first time the tables are empty"""
+        if self.storage.read_one("SELECT 1 FROM category_totals LIMIT 1"):
+            return
+        self.storage.write(self._backfill, wait=True)
+
+    def _backfill(self, cursor):
+        for granularity in (MINUTE, HOUR):
+            cursor.execute("""
+                INSERT INTO analysis_rollups (granularity, bucket, analyses, misinformation, confidence_sum)
+                SELECT ?, (CAST(strftime('%s', timestamp) AS INTEGER) / ?) * ?, COUNT(*),
+                       SUM(CASE WHEN is_misinformation THEN 1 ELSE 0 END), COALESCE(SUM(confidence), 0)
+                FROM analyses GROUP BY 2
+            """, (granularity, granularity, granularity))
+            cursor.execute("""
+                INSERT INTO category_rollups (granularity, bucket, category, analyses)
+                SELECT ?, (CAST(strftime('%s', timestamp) AS INTEGER) / ?) * ?, COALESCE(category, 'unknown'), COUNT(*)
+                FROM analyses GROUP BY 2, 3
+            """, (granularity, granularity, granularity))
+        cursor.execute("""
+            INSERT INTO category_totals (category, analyses)
+            SELECT COALESCE(category, 'unknown'), COUNT(*) FROM analyses GROUP BY 1
+        """)
@@ -0,0 +1,188 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+
+# Lane width used to accumulate 64 per-bit weight sums inside one big integer
+LANE_BITS = 24
+LANE_MASK = (1 << LANE_BITS) - 1
+MAX_TEXT_CHARS = 100000
+BYTE_LANES = [
+    sum(((byte >> bit) & 1) << (LANE_BITS * bit) for bit in range(8))
+    for byte in range(256)
+]
+
+BOILERPLATE_PHRASES = [
+    'forwarded as received',
+    'forwarded many times',
+    'received as forwarded',
+    'please share',
+    'share with everyone',
+    'share this',
+    'must read',
+    'fwd'
+]
+# Only verdicts the LLM produced are reused for look-alikes; fallbacks, triage calls and
+# copies of earlier verdicts would spread a weaker verdict to every paraphrase
+INDEXED_SOURCES = ('llm', 'segmented')
+
+
+class SimilarityIndex:
+    """SimHash fingerprints with banded lookup for near-duplicate claims"""
+
+    def __init__(self, storage, max_distance=3, min_features=8):
+        self.storage = storage
+        self.max_distance = max_distance
+        self.min_features = min_features
+
+        # Pigeonhole: with max_distance + 1 bands, any fingerprint within
+        # max_distance bits agrees exactly with the query on at least one band
+        band_count = max_distance + 1
+        widths = [64 // band_count + (1 if i < 64 % band_count else 0) for i in range(band_count)]
+        self.bands = []
+        shift = 0
+        for width in widths:
+            self.bands.append((shift, (1 << width) - 1))
+            shift += width
+
+        self._ids = array('q')
+        self._fingerprints = array('Q')
+        self._buckets = [{} for _ in self.bands]
+        self._lock = threading.Lock()
+        self._boilerplate = re.compile('|'.join(re.escape(p) for p in BOILERPLATE_PHRASES))
+        storage.register_schema(self.init_table)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def normalize_text(self, text):
+        """Drop emojis, punctuation and forwarding boilerplate; keep letters, marks and digits of any script"""
+        # Cap the input so per-bit weight sums never overflow a lane
+        text = unicodedata.normalize('NFKC', (text or '')[:MAX_TEXT_CHARS]).casefold()
+        text = self._boilerplate.sub(' ', text)
+        chars = [ch if unicodedata.category(ch)[0] in 'LMN' else ' ' for ch in text]
+        return ''.join(chars).split()
+
+    def fingerprint(self, text):
+        """64-bit SimHash over word-internal character trigrams, or None for very short texts"""
+        features = Counter()
+        for word in self.normalize_text(text):
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                features[padded[i:i + 3]] += 1
+
+        if len(features) < self.min_features:
+            return None
+
+        lanes = 0
+        total = 0
+        for feature, weight in features.items():
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            expanded = 0
+            for position, byte in enumerate(digest):
+                expanded |= BYTE_LANES[byte] << (LANE_BITS * 8 * position)
+            lanes += weight * expanded
+            total += weight
+
+        fingerprint = 0
+        half = total / 2
+        for bit in range(64):
+            if ((lanes >> (LANE_BITS * bit)) & LANE_MASK) > half:
+                fingerprint |= 1 << bit
+        return fingerprint
+
+    def add(self, analysis_id, fingerprint):
+        if fingerprint is None:
+            return
+        with self._lock:
+            position = len(self._ids)
+            self._ids.append(analysis_id)
+            self._fingerprints.append(fingerprint)
+            for buckets, (shift, mask) in zip(self._buckets, self.bands):
+                band = (fingerprint >> shift) & mask
+                bucket = buckets.get(band)
+                if bucket is None:
+                    bucket = buckets[band] = array('I')
+                bucket.append(position)
+
+    def find(self, fingerprint):
+        """Return (analysis_id, similarity) of the closest indexed text within max_distance, or None"""
+        if fingerprint is None:
+            return None
+
+        best = None
+        with self._lock:
+            seen = set()
+            for buckets, (shift, mask) in zip(self._buckets, self.bands):
+                bucket = buckets.get((fingerprint >> shift) & mask)
+                if not bucket:
+                    continue
+                for position in bucket:
+                    if position in seen:
+                        continue
+                    seen.add(position)
+                    distance = (self._fingerprints[position] ^ fingerprint).bit_count()
+                    if distance <= self.max_distance and (best is None or distance < best[1]):
+                        best = (position, distance)
+            if best is None:
+                return None
+            analysis_id = self._ids[best[0]]
+
+        return analysis_id, round(1 - best[1] / 64, 3)
+
+    def load(self, batch_size=5000):
+        """Load persisted fingerprints and backfill any LLM-judged analyses that lack one"""
+        placeholders = ','.join('?' * len(INDEXED_SOURCES))
+        with self.storage.reader() as conn:
+            for analysis_id, stored in conn.execute(f"""
+                    SELECT f.analysis_id, f.simhash FROM analysis_fingerprints f
+                    JOIN analyses s ON s.id = f.analysis_id
+                    WHERE s.verdict_source IN ({placeholders}) ORDER BY f.analysis_id
+                    """, INDEXED_SOURCES):
+                self.add(analysis_id, stored & 0xFFFFFFFFFFFFFFFF)
+
+        last_id = 0
+        while True:
+            missing = self.storage.read(f"""
+                SELECT a.id, a.text FROM analysis_texts a
+                JOIN analyses s ON s.id = a.id
+                LEFT JOIN analysis_fingerprints f ON f.analysis_id = a.id
+                WHERE f.analysis_id IS NULL AND a.id > ? AND s.verdict_source IN ({placeholders})
+                ORDER BY a.id LIMIT ?
+            """, (last_id, *INDEXED_SOURCES, batch_size))
+            if not missing:
+                break
+
+            rows = []
+            for analysis_id, text in missing:
+                fingerprint = self.fingerprint(text)
+                self.add(analysis_id, fingerprint)
+                if fingerprint is not None:
+                    rows.append((analysis_id, self.to_signed(fingerprint)))
+            self.storage.write(self.persist_many, rows, wait=True)
+            last_id = missing[-1][0]
+
+        return len(self)
+
+    @staticmethod
+    def persist_many(cursor, rows):
+        cursor.executemany(
+            "INSERT OR REPLACE INTO analysis_fingerprints (analysis_id, simhash) VALUES (?, ?)", rows
+        )
+
+    @staticmethod
+    def init_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_fingerprints (
+                analysis_id INTEGER PRIMARY KEY,
+                simhash INTEGER NOT NULL,
+                FOREIGN KEY (analysis_id) REFERENCES analyses (id)
+            )
+        """)
+
+    @staticmethod
+    def to_signed(fingerprint):
+        """SQLite integers are signed 64-bit"""
+        return fingerprint - (1 << 64) if fingerprint >= (1 << 63) else fingerprint
@@ -0,0 +1,232 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+DB_PATH = os.environ.get('CRISIS_DB_PATH', 'crisis_data.db')
+
+_STOP = object()
+
+
+class Storage:
+    """Pooled SQLite connections in WAL mode with a group-committing background writer"""
+
+    def __init__(self, db_path=DB_PATH, pool_size=8, max_batch=512):
+        self.db_path = db_path
+        self.max_batch = max_batch
+
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._schema = []
+        self._schema_ready = threading.Event()
+        self._schema_lock = threading.Lock()
+        self._closed = False
+        # Callbacks registered by the write operation now running; only the writer thread touches it
+        self._op_hooks = None
+
+        self.counters = {
+            'writes': 0,
+            'commits': 0,
+            'failed_writes': 0
+        }
+        atexit.register(self.close)
+
+    def register_schema(self, init_fn):
+        """Register init_fn(cursor) to create tables; runs now if the schema is already initialized"""
+        self._schema.append(init_fn)
+        if self._schema_ready.is_set():
+            self.write(init_fn, wait=True)
+
+    def init_schema(self):
+        """Run every registered schema function once, in order, inside one writer transaction"""
+        with self._schema_lock:
+            if self._schema_ready.is_set():
+                return
+            self.write(self._run_schema, wait=True)
+            self._schema_ready.set()
+
+    def _run_schema(self, cursor):
+        for init_fn in list(self._schema):
+            init_fn(cursor)
+
+    @contextmanager
+    def reader(self):
+        """Check a read connection out of the pool"""
+        if not self._schema_ready.is_set():
+            self.init_schema()
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        try:
+            yield conn
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def read(self, sql, params=()):
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def read_one(self, sql, params=()):
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def write(self, operation, *args, wait=False):
+        """Queue operation(cursor, *args) for the writer; returns a Future, or the result if wait=True"""
+        if self._closed:
+            raise RuntimeError('storage is closed')
+        self._ensure_writer()
+        future = Future()
+        self._queue.put((operation, args, future))
+        if wait:
+            return future.result()
+        future.add_done_callback(self._report_failure)
+        return future
+
+    def after_commit(self, callback):
+        """Run callback() once the current write operation has committed; call from inside one
+
+        Nothing runs if the operation or its batch rolls back, so in-memory caches filled this
+        way never point at rows that were not committed.
+        """
+        self._op_hooks.append(callback)
+
+    def execute(self, sql, params=(), wait=False):
+        """Queue a single statement; the result is the cursor's lastrowid"""
+        return self.write(_execute, sql, params, wait=wait)
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been committed"""
+        if self._writer is None:
+            return
+        future = Future()
+        self._queue.put((None, (), future))
+        future.result(timeout)
+
+    def close(self):
+        """Flush pending writes and stop the writer; registered with atexit"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            self._writer.join()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['queue_depth'] = self._queue.qsize()
+        return stats
+
+    def _open(self):
+        # check_same_thread=False: pooled connections move between request threads
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, cached_statements=256)
+        # Only takes effect on a new database; lets the archiver return freed pages to the OS
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name='storage-writer', daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        conn = self._open()
+        conn.isolation_level = None
+        cursor = conn.cursor()
+        stopping = False
+
+        while not stopping:
+            batch = [self._queue.get()]
+            # Group commit: everything already queued rides in the same transaction
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = [item for item in batch if item is not _STOP]
+                # Drain whatever was queued behind the stop marker too
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                batch = [item for item in batch if item is not _STOP]
+
+            results = []
+            hooks = []
+            try:
+                # Take the write lock up front: a deferred transaction that reads first and
+                # another process commits in between fails the whole batch with SQLITE_BUSY
+                cursor.execute("BEGIN IMMEDIATE")
+                for operation, args, future in batch:
+                    if operation is None:
+                        results.append((future, None, None))
+                        continue
+                    cursor.execute("SAVEPOINT op")
+                    self._op_hooks = []
+                    try:
+                        result = operation(cursor, *args)
+                        cursor.execute("RELEASE op")
+                        results.append((future, result, None))
+                        hooks.extend(self._op_hooks)
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO op")
+                        cursor.execute("RELEASE op")
+                        results.append((future, None, e))
+                    finally:
+                        self._op_hooks = None
+                cursor.execute("COMMIT")
+            except sqlite3.Error as e:
+                print(f"Storage commit error: {e}")
+                if conn.in_transaction:
+                    cursor.execute("ROLLBACK")
+                results = [(future, None, e) for _, _, future in batch]
+                hooks = []
+
+            for hook in hooks:
+                try:
+                    hook()
+                except Exception as e:
+                    print(f"Storage after-commit error: {e}")
+
+            self.counters['commits'] += 1
+            for future, result, error in results:
+                self.counters['writes'] += 1
+                if error is not None:
+                    self.counters['failed_writes'] += 1
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+        conn.close()
+
+    @staticmethod
+    def _report_failure(future):
+        error = future.exception()
+        if error is not None:
+            print(f"Storage write error: {error}")
+
+
+def _execute(cursor, sql, params):
+    return cursor.execute(sql, params).lastrowid
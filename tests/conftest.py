@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The app is a set of top-level modules, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import Storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    store = Storage(str(tmp_path / 'test.db'))
+    yield store
+    store.close()
+
+
+def wait_until(condition, timeout=5.0):
+    """Poll condition() until it is true; fails the test if it never gets there"""
+    import time
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not reached in time')
+        time.sleep(0.005)
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from alert_dispatcher import QUEUE_COLUMNS, AlertDispatcher, FileSink, sinks_from_spec
+
+
+def create_alerts(cursor):
+    columns = ', '.join(f'{column} {column_type}' for column, column_type in QUEUE_COLUMNS)
+    cursor.execute(f"""
+        CREATE TABLE emergency_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, analysis_id INTEGER, alert_level TEXT, alert_message TEXT,
+            authorities_notified BOOLEAN DEFAULT FALSE, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, {columns}
+        )
+    """)
+    cursor.execute("CREATE VIEW analysis_texts AS SELECT NULL AS id, NULL AS text")
+
+
+def queue_alert(storage, category):
+    return storage.write(AlertDispatcher.enqueue, 1, 'claim', category, 9, 'ready message', wait=True)
+
+
+def alert_row(storage, alert_id):
+    return storage.read_one(
+        "SELECT status, attempts, authorities_notified, last_error FROM emergency_alerts WHERE id = ?", (alert_id,)
+    )
+
+
+@pytest.fixture
+def prepared(storage):
+    storage.register_schema(create_alerts)
+    storage.init_schema()
+    return storage
+
+
+def test_batch_no_sink_accepts_stays_queued(prepared, tmp_path):
+    sink = FileSink(str(tmp_path / 'police.jsonl'), authorities={'police'})
+    dispatcher = AlertDispatcher(None, prepared, [sink])
+    alert_id = queue_alert(prepared, 'health')
+
+    dispatcher._dispatch_due()
+    prepared.flush(5)
+
+    status, attempts, notified, error = alert_row(prepared, alert_id)
+    assert (status, attempts, notified) == ('queued', 1, 0)
+    assert 'health_department' in error
+    assert (dispatcher.counters['alerts_sent'], dispatcher.counters['retries']) == (0, 1)
+
+
+def test_matching_sink_marks_the_alert_sent(prepared, tmp_path):
+    path = tmp_path / 'alerts.jsonl'
+    dispatcher = AlertDispatcher(None, prepared, [FileSink(str(path))])
+    alert_id = queue_alert(prepared, 'health')
+
+    dispatcher._dispatch_due()
+    prepared.flush(5)
+
+    assert alert_row(prepared, alert_id)[:3] == ('sent', 1, 1)
+    assert (dispatcher.counters['batches_sent'], dispatcher.counters['alerts_sent']) == (1, 1)
+    assert json.loads(path.read_text(encoding='utf-8'))['alerts'][0]['alert_id'] == alert_id
+
+
+def test_without_sinks_the_dispatcher_never_starts(prepared):
+    dispatcher = AlertDispatcher(None, prepared, sinks_from_spec(None))
+    dispatcher.notify()
+    assert dispatcher._thread is None
+
+
+@pytest.mark.parametrize('spec', ['', ' , ', 'smtp:ops@example.org', 'file:alerts.jsonl,bogus'])
+def test_unusable_sink_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        sinks_from_spec(spec)
+
+
+def test_file_sink_paths_are_resolved_up_front(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sink, = sinks_from_spec('file:alerts.jsonl')
+    assert sink.path == str(tmp_path / 'alerts.jsonl')
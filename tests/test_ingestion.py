@@ -0,0 +1,97 @@
+import json
+import threading
+
+import pytest
+
+from conftest import wait_until
+from ingestion import DirectorySource, IngestionPipeline, JsonlFileSource, SourceOffsets
+
+
+@pytest.fixture
+def offsets(storage):
+    source_offsets = SourceOffsets(storage)
+    storage.init_schema()
+    return source_offsets
+
+
+def write_posts(path, texts, mode='w'):
+    with open(path, mode, encoding='utf-8') as f:
+        for text in texts:
+            f.write(json.dumps({'text': text}, ensure_ascii=False) + '\n')
+
+
+def read_until(source, storage, count):
+    """Run a source until it has emitted count posts, then stop it like a shutdown would"""
+    emitted = []
+    stop = threading.Event()
+    thread = threading.Thread(target=source.run, args=(lambda post: emitted.append(post['text']), stop))
+    thread.start()
+    wait_until(lambda: len(emitted) >= count)
+    stop.set()
+    thread.join(5)
+    storage.flush(5)
+    return emitted
+
+
+def test_jsonl_source_resumes_after_a_restart(tmp_path, storage, offsets):
+    path = tmp_path / 'posts.jsonl'
+    write_posts(path, ['पहला पोस्ट', 'second'])
+    assert read_until(JsonlFileSource(str(path), poll_interval=0.01, offsets=offsets), storage, 2) == [
+        'पहला पोस्ट', 'second'
+    ]
+
+    write_posts(path, ['third'], mode='a')
+    assert read_until(JsonlFileSource(str(path), poll_interval=0.01, offsets=offsets), storage, 1) == ['third']
+
+
+def test_jsonl_source_starts_over_when_the_file_shrank(tmp_path, storage, offsets):
+    path = tmp_path / 'posts.jsonl'
+    write_posts(path, ['a long first post', 'another long post'])
+    read_until(JsonlFileSource(str(path), poll_interval=0.01, offsets=offsets), storage, 2)
+
+    write_posts(path, ['new'])
+    assert read_until(JsonlFileSource(str(path), poll_interval=0.01, offsets=offsets), storage, 1) == ['new']
+
+
+def test_directory_source_reads_each_file_once_across_restarts(tmp_path, storage, offsets):
+    inbox = tmp_path / 'inbox'
+    inbox.mkdir()
+    write_posts(inbox / 'a.jsonl', ['one', 'two'])
+    assert read_until(DirectorySource(str(inbox), poll_interval=0.01, offsets=offsets), storage, 2) == ['one', 'two']
+
+    write_posts(inbox / 'b.jsonl', ['three'])
+    assert read_until(DirectorySource(str(inbox), poll_interval=0.01, offsets=offsets), storage, 1) == ['three']
+
+
+class ListSource:
+    def __init__(self, texts):
+        self.texts = texts
+        self.runs = 0
+
+    def run(self, emit, stop):
+        self.runs += 1
+        for text in self.texts:
+            emit({'text': text})
+
+
+def test_only_the_lock_holder_ingests_and_every_process_relays(tmp_path, storage):
+    lock_path = str(tmp_path / 'stream.lock')
+    pipelines = [
+        IngestionPipeline([ListSource(['a', 'b'])], lambda post: {'text': post['text']},
+                          workers=1, storage=storage, lock_path=lock_path, poll_interval=0.05)
+        for _ in range(2)
+    ]
+    storage.init_schema()
+    try:
+        for pipeline in pipelines:
+            pipeline.start()
+        wait_until(lambda: all(pipeline.broadcaster.last_seq == 2 for pipeline in pipelines))
+
+        assert [pipeline.leader for pipeline in pipelines].count(True) == 1
+        assert sum(pipeline.sources[0].runs for pipeline in pipelines) == 1
+        for pipeline in pipelines:
+            events = pipeline.broadcaster.events_after(0, 0)
+            assert [(event['id'], event['text']) for event in events] == [(1, 'a'), (2, 'b')]
+    finally:
+        for pipeline in pipelines:
+            pipeline.stop()
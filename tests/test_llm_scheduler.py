@@ -0,0 +1,133 @@
+import threading
+import time
+
+import pytest
+
+from conftest import wait_until
+from llm_client import DeadlineExceeded, LLMClient, LLMScheduler, LoadShed
+
+
+def queued(scheduler):
+    return sum(scheduler.stats()['queue_depth'].values())
+
+
+def test_queued_calls_are_admitted_highest_priority_first():
+    scheduler = LLMScheduler(max_concurrency=1)
+    holder = scheduler.admit('detection')
+    order = []
+
+    def call(priority):
+        with scheduler.admit('detection', priority=priority):
+            order.append(priority)
+
+    threads = []
+    for priority in (1, 9, 5):
+        thread = threading.Thread(target=call, args=(priority,))
+        thread.start()
+        threads.append(thread)
+        # One at a time, so arrival order differs from priority order
+        wait_until(lambda: queued(scheduler) == len(threads))
+
+    holder.release()
+    for thread in threads:
+        thread.join(5)
+
+    assert order == [9, 5, 1]
+    assert scheduler.stats()['in_flight'] == 0
+
+
+def test_concurrency_cap_is_never_exceeded():
+    scheduler = LLMScheduler(max_concurrency=3)
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def call():
+        with scheduler.admit('detection'):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=call) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert peak[0] == 3
+    assert scheduler.stats()['admitted'] == 12
+
+
+def test_token_budget_holds_calls_until_the_deadline():
+    # 600 tokens a minute refills 10 a second
+    scheduler = LLMScheduler(max_concurrency=0, tokens_per_minute=600)
+    scheduler.admit('detection', tokens=600).release()
+
+    assert scheduler.try_admit('detection', tokens=100) is None
+    with pytest.raises(DeadlineExceeded):
+        scheduler.admit('detection', tokens=100, deadline_at=time.monotonic() + 0.05)
+    assert scheduler.stats()['timed_out'] == 1
+
+
+def test_release_settles_the_budget_against_real_usage():
+    scheduler = LLMScheduler(max_concurrency=0, tokens_per_minute=600)
+    ticket = scheduler.admit('detection', tokens=500)
+    ticket.used = 100
+    ticket.release()
+
+    # The unused 400 tokens went back into the bucket
+    assert scheduler.try_admit('detection', tokens=450) is not None
+
+
+def test_shedding_is_off_unless_configured():
+    scheduler = LLMScheduler(max_concurrency=1, shed_after=0.01)
+    holder = scheduler.admit('detection')
+    with pytest.raises(DeadlineExceeded):
+        scheduler.admit('detection', priority=0, deadline_at=time.monotonic() + 0.1)
+    holder.release()
+    assert scheduler.stats()['shed'] == 0
+
+
+def test_low_priority_calls_are_shed_when_the_queue_is_behind():
+    scheduler = LLMScheduler(max_concurrency=1, shed_after=0.02, shed_below=4)
+    holder = scheduler.admit('detection')
+    with pytest.raises(LoadShed):
+        scheduler.admit('detection', priority=1, deadline_at=time.monotonic() + 5)
+
+    # High-priority calls still wait their turn instead
+    high = threading.Thread(target=lambda: scheduler.admit('alert', priority=9).release())
+    high.start()
+    time.sleep(0.05)
+    holder.release()
+    high.join(5)
+    assert scheduler.stats()['shed'] == 1
+    assert scheduler.stats()['admitted'] == 2
+
+
+def fake_completion(calls, first_delay):
+    def create(messages, params, deadline_at):
+        calls.append(time.monotonic())
+        time.sleep(first_delay if len(calls) == 1 else 0.01)
+        return {'usage': {'total_tokens': 10}, 'choices': [{'message': {'content': 'ok'}}]}
+    return create
+
+
+def test_hedges_only_run_when_the_scheduler_has_room(monkeypatch):
+    calls = []
+    monkeypatch.setattr(LLMClient, '_create', staticmethod(fake_completion(calls, 0.3)))
+
+    full = LLMClient(hedge_after=0.05, scheduler=LLMScheduler(max_concurrency=1))
+    full.chat('detection', [{'role': 'user', 'content': 'claim'}])
+    assert len(calls) == 1
+    assert full.stats()['hedges_skipped'] == 1
+
+    calls.clear()
+    roomy = LLMClient(hedge_after=0.05, scheduler=LLMScheduler(max_concurrency=2))
+    roomy.chat('detection', [{'role': 'user', 'content': 'claim'}])
+    assert len(calls) == 2
+    assert roomy.stats()['hedge_wins'] == 1
+    # The losing first attempt still holds nothing once it finishes
+    wait_until(lambda: roomy.scheduler.stats()['in_flight'] == 0)
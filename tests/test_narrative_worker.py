@@ -0,0 +1,137 @@
+import threading
+
+import pytest
+
+from conftest import wait_until
+from narrative_worker import CounterNarrativeWorker
+
+
+class FakeResponses:
+    """Streams a fixed narrative once `release` is set, counting generations"""
+
+    def __init__(self, pieces=('Verified ', 'facts.'), fail=False):
+        self.pieces = pieces
+        self.fail = fail
+        self.calls = 0
+        self.release = threading.Event()
+        # Set to an Event to pause the stream after its first piece
+        self.midway = None
+
+    def stream_counter_narrative(self, text, detection_result):
+        self.calls += 1
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError('llm down')
+        for index, piece in enumerate(self.pieces):
+            if index == 1 and self.midway is not None:
+                self.midway.wait(5)
+            yield piece
+
+
+@pytest.fixture
+def responses():
+    return FakeResponses()
+
+
+@pytest.fixture
+def worker(responses, storage):
+    narrative_worker = CounterNarrativeWorker(responses, storage, max_workers=4)
+    storage.init_schema()
+    return narrative_worker
+
+
+def test_concurrent_submits_for_one_claim_share_a_generation(worker, responses):
+    threads = [
+        threading.Thread(target=worker.submit, args=(analysis_id, 'claim', {}, 'claimA'))
+        for analysis_id in range(1, 6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    responses.release.set()
+
+    for analysis_id in range(1, 6):
+        assert worker.wait(analysis_id, 5) == {'status': 'ready', 'counter_narrative': 'Verified facts.'}
+    assert responses.calls == 1
+    assert worker.stats()['in_flight'] == 0
+
+
+def test_submit_while_a_generation_is_storing_starts_cleanly(worker, responses):
+    # Land a second submit for the same claim in the window between the first
+    # generation finishing and its result being stored
+    store = worker._store
+    raced = []
+
+    def racing_store(analysis_ids, claim_key, status, narrative):
+        if analysis_ids == [1] and status != 'pending' and not raced:
+            raced.append(worker.submit(2, 'claim', {}, claim_key))
+        return store(analysis_ids, claim_key, status, narrative)
+
+    worker._store = racing_store
+    worker.submit(1, 'claim', {}, 'claimA')
+    responses.release.set()
+
+    assert worker.wait(1, 5)['status'] == 'ready'
+    assert raced
+    assert worker.wait(2, 5) == {'status': 'ready', 'counter_narrative': 'Verified facts.'}
+    assert worker._inflight == {}
+    assert worker._live == {}
+
+
+def test_repeat_submit_for_a_finished_claim_reuses_it(worker, responses):
+    responses.release.set()
+    worker.submit(1, 'claim', {}, 'claimA')
+    assert worker.wait(1, 5)['status'] == 'ready'
+
+    assert worker.submit(2, 'claim', {}, 'claimA') == {'status': 'ready', 'counter_narrative': 'Verified facts.'}
+    assert responses.calls == 1
+    assert worker.stats()['reused'] == 1
+
+
+def test_failed_generation_resolves_every_waiting_analysis(storage):
+    responses = FakeResponses(fail=True)
+    worker = CounterNarrativeWorker(responses, storage)
+    storage.init_schema()
+    worker.submit(1, 'claim', {}, 'claimA')
+    worker.submit(2, 'claim', {}, 'claimA')
+    responses.release.set()
+
+    assert worker.wait(1, 5)['status'] == 'failed'
+    assert worker.wait(2, 5)['status'] == 'failed'
+    assert worker.stats() == {'submitted': 2, 'generated': 0, 'reused': 0, 'failed': 1, 'in_flight': 0}
+
+
+def test_follow_streams_pieces_then_the_final_entry(worker, responses):
+    responses.midway = threading.Event()
+    worker.submit(1, 'claim', {}, 'claimA')
+    responses.release.set()
+    wait_until(lambda: worker._live.get('claimA') == ['Verified '])
+
+    events = []
+    follower = threading.Thread(target=lambda: events.extend(worker.follow(1, timeout=5, keepalive=1)))
+    follower.start()
+    responses.midway.set()
+    follower.join(5)
+
+    streamed = ''.join(payload for kind, payload in (e for e in events if e) if kind == 'piece')
+    assert streamed == 'Verified facts.'
+    assert events[-1] == ('done', {'status': 'ready', 'counter_narrative': 'Verified facts.'})
+
+
+def test_other_processes_see_a_generation_finish_through_storage(worker, responses, storage):
+    # A second worker on the same database stands in for another gunicorn process
+    other = CounterNarrativeWorker(responses, storage, poll_interval=0.05)
+    worker.submit(1, 'claim', {}, 'claimA')
+    storage.flush(5)
+
+    events = []
+    follower = threading.Thread(target=lambda: events.extend(other.follow(1, timeout=5, keepalive=0.05)))
+    follower.start()
+    wait_until(lambda: None in events)
+    responses.release.set()
+    follower.join(5)
+
+    assert not follower.is_alive()
+    assert events[-1] == ('done', {'status': 'ready', 'counter_narrative': 'Verified facts.'})
+    assert other.wait(1, 5) == {'status': 'ready', 'counter_narrative': 'Verified facts.'}
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from rescore import Checkpoint, chunked, diff_verdict, jsonl_items, open_output
+
+
+def write_corpus(path, texts):
+    with open(path, 'w', encoding='utf-8') as f:
+        for text in texts:
+            f.write(json.dumps({'text': text, 'is_misinformation': False}) + '\n')
+
+
+def test_resume_continues_after_the_last_checkpointed_chunk(tmp_path):
+    corpus = tmp_path / 'posts.jsonl'
+    write_corpus(corpus, [f'post {i}' for i in range(10)])
+    output = str(tmp_path / 'out.jsonl')
+    run = {'source': str(corpus), 'output': output}
+
+    # First run: commits one chunk of four, then dies mid-way through writing the next
+    checkpoint = Checkpoint(output + '.checkpoint', run)
+    handle = open_output(output, checkpoint)
+    first_chunk = next(chunked(jsonl_items(str(corpus)), 4))
+    handle.write(''.join(json.dumps({'id': item['id']}) + '\n' for _, item in first_chunk).encode('utf-8'))
+    handle.flush()
+    checkpoint.state['outputs'][output] = handle.tell()
+    checkpoint.state['position'] = first_chunk[-1][0]
+    checkpoint.save()
+    handle.write(b'{"id": 5, "half-writ')
+    handle.close()
+
+    # Second run: the torn line is cut off and the corpus picks up at item five
+    resumed = Checkpoint(output + '.checkpoint', run)
+    handle = open_output(output, resumed)
+    handle.close()
+    line_number, offset = resumed.state['position']
+    remaining = [item['text'] for _, item in jsonl_items(str(corpus), offset=offset, line_number=line_number)]
+
+    assert remaining == [f'post {i}' for i in range(4, 10)]
+    with open(output, encoding='utf-8') as f:
+        assert [json.loads(line)['id'] for line in f] == [1, 2, 3, 4]
+
+
+def test_checkpoint_refuses_a_different_run(tmp_path):
+    path = str(tmp_path / 'run.checkpoint')
+    Checkpoint(path, {'source': 'db', 'scoring': 'separate'}).save()
+    with pytest.raises(SystemExit):
+        Checkpoint(path, {'source': 'db', 'scoring': 'fused'})
+
+
+def test_diff_verdict_reports_only_changed_fields():
+    stored = {'is_misinformation': False, 'crisis_level': 3}
+    result = {'is_misinformation': True, 'crisis_level': 3, 'category': 'health'}
+    assert diff_verdict(stored, result) == {'is_misinformation': [False, True]}
+    assert diff_verdict(None, result) is None
@@ -0,0 +1,46 @@
+import pytest
+
+from rollups import HOUR, MINUTE, DashboardRollups
+
+
+@pytest.fixture
+def rollups(storage):
+    dashboard_rollups = DashboardRollups(storage, minute_retention=HOUR)
+    storage.init_schema()
+    return dashboard_rollups
+
+
+def record(rollups, timestamp, fail=False):
+    def operation(cursor):
+        rollups.record(cursor, {'category': 'health', 'is_misinformation': True, 'confidence': 80}, timestamp)
+        if fail:
+            raise ValueError('rolled back')
+    return rollups.storage.write(operation, wait=True)
+
+
+def minute_buckets(storage):
+    return [row[0] for row in storage.read(
+        "SELECT bucket FROM analysis_rollups WHERE granularity = ? ORDER BY bucket", (MINUTE,)
+    )]
+
+
+def test_rolled_back_analysis_leaves_no_counts_and_no_prune_mark(rollups, storage):
+    start = 10 * 24 * HOUR
+    with pytest.raises(ValueError):
+        record(rollups, start, fail=True)
+    assert rollups.window(HOUR, now=start + 1)['analyses'] == 0
+    assert rollups._last_prune == 0
+
+    record(rollups, start)
+    assert rollups._last_prune == start
+    assert rollups.window(HOUR, now=start + 1) == {
+        'analyses': 1, 'misinformation': 1, 'avg_confidence': 80.0, 'categories': {'health': 1}
+    }
+
+
+def test_prune_drops_minute_rows_past_retention(rollups, storage):
+    start = 10 * 24 * HOUR
+    record(rollups, start)
+    record(rollups, start + 2 * HOUR)
+    assert minute_buckets(storage) == [start + 2 * HOUR]
+    assert rollups.category_totals() == {'health': 2}
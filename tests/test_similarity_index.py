@@ -0,0 +1,93 @@
+import pytest
+
+from similarity_index import SimilarityIndex
+
+CLAIM = "Drinking hot water with salt every hour cures covid completely, doctors confirm"
+HINDI_CLAIM = "गर्म पानी में नमक मिलाकर हर घंटे पीने से कोरोना पूरी तरह ठीक हो जाता है"
+TAMIL_CLAIM = "தடுப்பூசி போட்டவர்கள் இரண்டு ஆண்டுகளில் இறந்துவிடுவார்கள் என்று பகிரப்படுகிறது"
+
+
+@pytest.fixture
+def index(storage):
+    similarity_index = SimilarityIndex(storage, max_distance=3)
+    storage.init_schema()
+    return similarity_index
+
+
+def test_matches_within_the_distance_threshold_only(index):
+    fingerprint = index.fingerprint(CLAIM)
+    index.add(1, fingerprint)
+
+    # Three flipped bits spread over different bands still match; a fourth does not
+    near = fingerprint ^ (1 << 0) ^ (1 << 20) ^ (1 << 40)
+    assert index.find(near) == (1, round(1 - 3 / 64, 3))
+    assert index.find(near ^ (1 << 60)) is None
+    assert index.find(fingerprint) == (1, 1.0)
+
+
+def test_closest_of_several_candidates_wins(index):
+    fingerprint = index.fingerprint(CLAIM)
+    index.add(1, fingerprint ^ 0b11)
+    index.add(2, fingerprint ^ 0b1)
+    assert index.find(fingerprint) == (2, round(1 - 1 / 64, 3))
+
+
+def test_forward_boilerplate_and_punctuation_are_ignored(index):
+    forwarded = f"Forwarded as received!!\n{CLAIM.upper()}... 🙏🙏 Please share!! FWD"
+    assert index.normalize_text(forwarded) == index.normalize_text(CLAIM)
+    assert index.fingerprint(forwarded) == index.fingerprint(CLAIM)
+
+
+def test_indic_scripts_keep_their_vowel_signs(index):
+    # Marks (matras, viramas) stay inside words, so a lightly edited forward still matches
+    assert index.normalize_text('कोरोना ठीक')[0] == 'कोरोना'
+    hindi = index.fingerprint(HINDI_CLAIM)
+    assert index.fingerprint(f"फॉरवर्ड: {HINDI_CLAIM}!!! 😱") is not None
+    index.add(1, hindi)
+    assert index.find(index.fingerprint(HINDI_CLAIM + '।'))[0] == 1
+    assert index.find(index.fingerprint(TAMIL_CLAIM)) is None
+
+
+def test_short_texts_have_no_fingerprint(index):
+    assert index.fingerprint('fake!') is None
+    assert index.find(None) is None
+    index.add(1, None)
+    assert len(index) == 0
+
+
+def create_analyses(cursor):
+    cursor.execute("""
+        CREATE TABLE analyses (id INTEGER PRIMARY KEY, text TEXT, text_id INTEGER, verdict_source TEXT)
+    """)
+    cursor.execute("CREATE VIEW analysis_texts AS SELECT id, text, NULL AS is_misinformation FROM analyses")
+
+
+def test_load_restores_persisted_and_backfills_missing_llm_verdicts(storage):
+    storage.register_schema(create_analyses)
+    index = SimilarityIndex(storage)
+    storage.init_schema()
+
+    rows = [
+        (1, CLAIM, 'llm'),
+        (2, HINDI_CLAIM, 'llm'),
+        (3, TAMIL_CLAIM, 'fallback')
+    ]
+    storage.write(lambda cursor: cursor.executemany(
+        "INSERT INTO analyses (id, text, verdict_source) VALUES (?, ?, ?)", rows
+    ), wait=True)
+    # Only the first analysis was fingerprinted before the restart
+    storage.write(SimilarityIndex.persist_many, [(1, SimilarityIndex.to_signed(index.fingerprint(CLAIM)))], wait=True)
+
+    reloaded = SimilarityIndex(storage)
+    assert reloaded.load() == 2
+    assert reloaded.find(reloaded.fingerprint(CLAIM))[0] == 1
+    assert reloaded.find(reloaded.fingerprint(HINDI_CLAIM))[0] == 2
+    # Fallback verdicts are never offered for reuse
+    assert reloaded.find(reloaded.fingerprint(TAMIL_CLAIM)) is None
+    assert storage.read_one("SELECT COUNT(*) FROM analysis_fingerprints")[0] == 2
+
+
+def test_fingerprints_round_trip_through_signed_storage(index):
+    fingerprint = (1 << 63) | 12345
+    assert SimilarityIndex.to_signed(fingerprint) < 0
+    assert SimilarityIndex.to_signed(fingerprint) & 0xFFFFFFFFFFFFFFFF == fingerprint
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+
+def create_items(cursor):
+    cursor.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, name TEXT UNIQUE)")
+
+
+def insert(cursor, name):
+    cursor.execute("INSERT INTO items (name) VALUES (?)", (name,))
+
+
+def names(storage):
+    return sorted(row[0] for row in storage.read("SELECT name FROM items"))
+
+
+def hold_writer(storage):
+    """Park the writer inside an operation so everything queued next lands in one batch"""
+    entered = threading.Event()
+    release = threading.Event()
+
+    def blocker(cursor):
+        entered.set()
+        release.wait(5)
+
+    storage.write(blocker)
+    assert entered.wait(5)
+    return release
+
+
+def test_group_commit_keeps_every_queued_write(storage):
+    storage.register_schema(create_items)
+    storage.init_schema()
+    release = hold_writer(storage)
+    commits = storage.counters['commits']
+
+    futures = [storage.write(insert, f'item-{i}') for i in range(50)]
+    release.set()
+    for future in futures:
+        future.result(5)
+
+    assert len(names(storage)) == 50
+    # The blocked batch plus one batch for everything queued behind it
+    assert storage.counters['commits'] - commits <= 2
+
+
+def test_failed_operation_only_rolls_back_itself(storage):
+    storage.register_schema(create_items)
+    storage.init_schema()
+    release = hold_writer(storage)
+
+    first = storage.write(insert, 'a')
+    duplicate = storage.write(insert, 'a')
+    last = storage.write(insert, 'b')
+    release.set()
+
+    first.result(5)
+    last.result(5)
+    with pytest.raises(Exception):
+        duplicate.result(5)
+    assert names(storage) == ['a', 'b']
+
+
+def test_after_commit_runs_only_for_committed_operations(storage):
+    storage.register_schema(create_items)
+    storage.init_schema()
+    published = []
+
+    def remember(cursor, name, fail):
+        insert(cursor, name)
+        storage.after_commit(lambda: published.append(name))
+        if fail:
+            raise ValueError('rolled back')
+
+    storage.write(remember, 'kept', False, wait=True)
+    with pytest.raises(ValueError):
+        storage.write(remember, 'dropped', True, wait=True)
+
+    assert published == ['kept']
+    assert names(storage) == ['kept']
+
+
+def test_flush_waits_for_queued_writes(storage):
+    storage.register_schema(create_items)
+    storage.init_schema()
+    for i in range(20):
+        storage.write(insert, f'item-{i}')
+    storage.flush(5)
+    assert len(names(storage)) == 20
@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+from conftest import wait_until
+from verdict_cache import VerdictCache
+
+
+@pytest.fixture
+def cache(storage):
+    verdict_cache = VerdictCache(storage)
+    storage.init_schema()
+    return verdict_cache
+
+
+def run_concurrently(count, target):
+    results = [None] * count
+    errors = [None] * count
+
+    def call(index):
+        try:
+            results[index] = target()
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_compute_runs_once_for_concurrent_callers(cache):
+    calls = []
+    release = threading.Event()
+
+    def detect():
+        calls.append(1)
+        release.wait(5)
+        return {'is_misinformation': True}, 7
+
+    threads, results, errors = run_concurrently(8, lambda: cache.compute('claim', detect))
+    # Every follower has joined the leader's flight before it finishes
+    wait_until(lambda: cache.stats()['shared_flights'] == 7)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert errors == [None] * 8
+    assert all(result == ({'is_misinformation': True}, 7) for result in results)
+
+
+def test_compute_shares_the_leaders_error_then_retries(cache):
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise RuntimeError('llm down')
+
+    threads, results, errors = run_concurrently(3, lambda: cache.compute('claim', failing))
+    wait_until(lambda: cache.stats()['shared_flights'] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    # The failed flight is gone, so the next caller computes afresh
+    assert cache.compute('claim', lambda: ('ok', 1)) == ('ok', 1)
+
+
+def test_compute_keeps_different_keys_apart(cache):
+    release = threading.Event()
+    calls = []
+
+    def detect(key):
+        calls.append(key)
+        release.wait(5)
+        return key
+
+    first = threading.Thread(target=lambda: cache.compute('a', lambda: detect('a')))
+    first.start()
+    wait_until(lambda: calls == ['a'])
+    assert cache.compute('b', lambda: 'b') == 'b'
+    release.set()
+    first.join(5)
+    assert cache.stats()['shared_flights'] == 0
+
+
+def test_put_then_get_round_trips_through_both_tiers(cache, storage):
+    key = cache.make_key('Drinking  hot water cures COVID')
+    assert key == cache.make_key('drinking hot water cures covid')
+    cache.put(key, {'is_misinformation': True}, 6)
+    assert cache.get(key) == {'detection_result': {'is_misinformation': True}, 'crisis_level': 6}
+
+    storage.flush(5)
+    cache._memory.clear()
+    assert cache.get(key)['crisis_level'] == 6
+    assert cache.stats()['db_hits'] == 1
@@ -0,0 +1,155 @@
+import math
+import threading
+import unicodedata
+import zlib
+
+HASH_BUCKETS = 1 << 18
+
+
+class TriageStage:
+    """Local prefilter that resolves confident cases before they reach GPT-4
+
+    A hashed-feature logistic regression, trained online from LLM verdicts, is
+    combined with the keyword-engine signals the fallback heuristics use. Only
+    items the model is confident about AND the heuristics agree with are
+    resolved locally; everything else is escalated to the LLM.
+    """
+
+    def __init__(self, keywords, mode='off', benign_threshold=0.1, hoax_threshold=0.9,
+                 min_examples=200, learning_rate=0.1, l2=1e-6):
+        # mode: 'off' always escalates, 'shadow' decides but still escalates, 'on' resolves locally
+        self.keywords = keywords
+        self.mode = mode
+        self.benign_threshold = benign_threshold
+        self.hoax_threshold = hoax_threshold
+        self.min_examples = min_examples
+        self.learning_rate = learning_rate
+        self.l2 = l2
+
+        self.weights = {}
+        self.bias = 0.0
+        self.examples = 0
+        self._lock = threading.Lock()
+
+        self.counters = {
+            'evaluated': 0,
+            'escalated': 0,
+            'resolved_benign': 0,
+            'resolved_hoax': 0,
+            'shadow_benign': 0,
+            'shadow_hoax': 0
+        }
+
+    def evaluate(self, text):
+        """Return 'benign', 'hoax' or 'escalate' along with the model probability and scan"""
+        scan = self.keywords.scan(text)
+        probability = self.predict(text, scan)
+        decision = self._decide(probability, scan)
+
+        with self._lock:
+            self.counters['evaluated'] += 1
+            if self.mode == 'on' and decision != 'escalate':
+                self.counters[f'resolved_{decision}'] += 1
+            else:
+                if self.mode == 'shadow' and decision != 'escalate':
+                    self.counters[f'shadow_{decision}'] += 1
+                self.counters['escalated'] += 1
+
+        if self.mode != 'on':
+            decision = 'escalate'
+        return {'decision': decision, 'probability': probability, 'scan': scan}
+
+    def _decide(self, probability, scan):
+        if self.mode == 'off' or self.examples < self.min_examples:
+            return 'escalate'
+
+        hits = scan['hits']
+        alarming = scan['risk'] or hits.get('viral') or hits.get('urgency')
+        if probability <= self.benign_threshold and not alarming:
+            return 'benign'
+        # Known hoaxes need both a matching risk rule and a confident model
+        if probability >= self.hoax_threshold and scan['risk']:
+            return 'hoax'
+        return 'escalate'
+
+    def predict(self, text, scan=None):
+        features = self._features(text, scan or self.keywords.scan(text))
+        with self._lock:
+            score = self.bias + sum(self.weights.get(index, 0.0) * value for index, value in features)
+        return 1 / (1 + math.exp(-max(-30.0, min(30.0, score))))
+
+    def learn(self, text, is_misinformation):
+        """One SGD step on an LLM-labelled example"""
+        features = self._features(text, self.keywords.scan(text))
+        label = 1.0 if is_misinformation else 0.0
+        with self._lock:
+            score = self.bias + sum(self.weights.get(index, 0.0) * value for index, value in features)
+            error = 1 / (1 + math.exp(-max(-30.0, min(30.0, score)))) - label
+            step = self.learning_rate / math.sqrt(1 + self.examples / 1000)
+            for index, value in features:
+                weight = self.weights.get(index, 0.0)
+                self.weights[index] = weight - step * (error * value + self.l2 * weight)
+            self.bias -= step * error
+            self.examples += 1
+
+    def train_from_storage(self, storage, limit=20000, epochs=2):
+        """Bootstrap the model from the most recent stored LLM verdicts
+
+        Triage's own verdicts, heuristic fallbacks and cache or near-duplicate copies are left
+        out so the model never learns from its own mistakes or from the heuristics.
+        """
+        rows = storage.read("""
+            SELECT t.text, a.is_misinformation FROM analyses a JOIN analysis_texts t ON t.id = a.id
+            WHERE a.verdict_source = 'llm' AND a.is_misinformation IS NOT NULL
+            ORDER BY a.id DESC LIMIT ?
+        """, (limit,))
+        for _ in range(epochs):
+            for text, is_misinformation in reversed(rows):
+                self.learn(text, bool(is_misinformation))
+        return len(rows)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['mode'] = self.mode
+            stats['training_examples'] = self.examples
+        evaluated = stats['evaluated']
+        stats['escalation_rate'] = round(100.0 * stats['escalated'] / evaluated, 1) if evaluated else 0.0
+        return stats
+
+    def _features(self, text, scan):
+        features = {}
+        for token in self._tokens(text):
+            index = zlib.crc32(token.encode('utf-8')) % HASH_BUCKETS
+            features[index] = features.get(index, 0.0) + 1.0
+
+        # Normalize token counts so long forwards do not dominate
+        norm = math.sqrt(sum(value * value for value in features.values())) or 1.0
+        vector = [(index, value / norm) for index, value in features.items()]
+
+        hits = scan['hits']
+        signals = {
+            '__risk__': 1.0 if scan['risk'] else 0.0,
+            '__risk_harm__': (scan['risk']['harm'] / 10.0) if scan['risk'] else 0.0,
+            '__viral__': min(1.0, len(set(hits.get('viral', []))) / 3.0),
+            '__urgency__': min(1.0, len(set(hits.get('urgency', []))) / 3.0),
+            '__key_terms__': min(1.0, len(hits.get('key_terms', [])) / 3.0)
+        }
+        for name, value in signals.items():
+            if value:
+                vector.append((zlib.crc32(name.encode('utf-8')) % HASH_BUCKETS, value))
+        return vector
+
+    @staticmethod
+    def _tokens(text):
+        words = []
+        current = []
+        for ch in (text or '').lower():
+            if unicodedata.category(ch)[0] in 'LMN':
+                current.append(ch)
+            elif current:
+                words.append(''.join(current))
+                current = []
+        if current:
+            words.append(''.join(current))
+        return words
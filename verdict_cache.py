@@ -0,0 +1,174 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+class VerdictCache:
+    """Two-tier cache of detection verdicts keyed on normalized content"""
+
+    def __init__(self, storage, max_memory_items=2048, max_db_items=100000, ttl_seconds=6 * 3600):
+        self.storage = storage
+        self.max_memory_items = max_memory_items
+        self.max_db_items = max_db_items
+        self.ttl_seconds = ttl_seconds
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        # Misses being computed right now, so concurrent requests for one claim share the work
+        self._flights = {}
+        storage.register_schema(self.init_table)
+
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'memory_hits': 0,
+            'db_hits': 0,
+            'evictions': 0,
+            'shared_flights': 0
+        }
+
+    def make_key(self, text, context='social_media', image_data=None):
+        """Content-addressed key from normalized text, context and image hash"""
+        normalized = self.normalize_text(text)
+        image_hash = hashlib.sha256(image_data.encode('utf-8')).hexdigest() if image_data else ''
+        material = f"{normalized}\x1f{(context or '').strip().lower()}\x1f{image_hash}"
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def normalize_text(self, text):
+        """Collapse case, unicode forms and whitespace so trivial variants share a key"""
+        text = unicodedata.normalize('NFKC', text or '')
+        return re.sub(r'\s+', ' ', text).strip().casefold()
+
+    def get(self, key):
+        """Return {'detection_result', 'crisis_level'} or None"""
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry['created_at'] <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.counters['hits'] += 1
+                    self.counters['memory_hits'] += 1
+                    return entry['value']
+                del self._memory[key]
+
+        entry = self._db_get(key, now)
+        with self._lock:
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            self.counters['hits'] += 1
+            self.counters['db_hits'] += 1
+            self._remember(key, entry)
+        return entry['value']
+
+    def put(self, key, detection_result, crisis_level):
+        entry = {
+            'value': {'detection_result': detection_result, 'crisis_level': crisis_level},
+            'created_at': time.time()
+        }
+        with self._lock:
+            self._remember(key, entry)
+        self._db_put(key, entry)
+
+    def compute(self, key, fn):
+        """Run fn() once per key at a time; concurrent callers with the same key wait and share its result"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = {'done': threading.Event(), 'result': None, 'error': None}
+            else:
+                self.counters['shared_flights'] += 1
+
+        if not leader:
+            flight['done'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return flight['result']
+
+        try:
+            flight['result'] = fn()
+            return flight['result']
+        except Exception as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight['done'].set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_size'] = len(self._memory)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(100.0 * stats['hits'] / lookups, 1) if lookups else 0.0
+        return stats
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def init_table(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS verdict_cache (
+                cache_key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_verdict_cache_created ON verdict_cache (created_at)")
+
+    def _db_get(self, key, now):
+        try:
+            row = self.storage.read_one(
+                "SELECT payload, created_at FROM verdict_cache WHERE cache_key = ?", (key,)
+            )
+        except sqlite3.Error as e:
+            print(f"Verdict cache read error: {e}")
+            return None
+
+        if row and now - row[1] > self.ttl_seconds:
+            self.storage.execute("DELETE FROM verdict_cache WHERE cache_key = ?", (key,))
+            row = None
+        if not row:
+            return None
+        return {'value': json.loads(row[0]), 'created_at': row[1]}
+
+    def _db_put(self, key, entry):
+        # Amortize eviction: sweep expired and over-capacity rows every 100 writes
+        with self._lock:
+            self._puts_since_evict += 1
+            should_evict = self._puts_since_evict >= 100
+            if should_evict:
+                self._puts_since_evict = 0
+
+        self.storage.execute(
+            "INSERT OR REPLACE INTO verdict_cache (cache_key, payload, created_at) VALUES (?, ?, ?)",
+            (key, json.dumps(entry['value']), entry['created_at'])
+        )
+        if should_evict:
+            self.storage.write(self._evict, entry['created_at'])
+
+    def _evict(self, cursor, now):
+        cursor.execute("DELETE FROM verdict_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        evicted = cursor.rowcount
+        cursor.execute("""
+            DELETE FROM verdict_cache WHERE cache_key IN (
+                SELECT cache_key FROM verdict_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_db_items,))
+        evicted += cursor.rowcount
+        with self._lock:
+            self.counters['evictions'] += evicted